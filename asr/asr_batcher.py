@@ -0,0 +1,166 @@
+"""
+Batching of ASR requests from many sessions.
+
+When several sessions finish an utterance at about the same time, their
+`transcribe_np` calls would each run a full decode on their own. `BatchedASR`
+collects the requests that arrive within `max_wait_ms` of each other and runs
+them as one `transcribe_batch_np` call, for backends that decode a batch in
+one pass (`supports_batching`). Every request gets its own result through a
+future.
+
+All calls on the wrapped model run in the worker thread of the batcher, one
+at a time, so the model is never used by two threads at once.
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable
+import numpy as np
+from loguru import logger
+
+from .asr_interface import ASRInterface
+from .streaming_asr import StreamingASRSession, WindowedStreamingSession
+
+
+class BatchedASR(ASRInterface):
+    """An ASR that transcribes the utterances of concurrent callers in batches."""
+
+    def __init__(self, asr: ASRInterface, max_batch: int = 8, max_wait_ms: float = 10.0):
+        """
+        Parameters:
+            asr (ASRInterface): The model to wrap.
+            max_batch (int): The largest number of utterances in one decode.
+            max_wait_ms (float): How long the first request of a batch waits for others.
+        """
+        self.asr = asr
+        self.SAMPLE_RATE = asr.SAMPLE_RATE
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        # (audio, future) of transcribe_np, or (callable, future) of any other call
+        self._pending: list[tuple[np.ndarray | Callable[[], Any], Future]] = []
+        self._condition = threading.Condition()
+        self._worker: threading.Thread | None = None
+        self._closed = False
+        self.batches = 0
+        self.requests = 0
+
+    @classmethod
+    def from_config(cls, asr: ASRInterface, batching_config: dict) -> ASRInterface:
+        """
+        Wrap the model as configured in the ASR_BATCHING section of conf.yaml.
+        Returns the model itself if batching is off or the backend cannot batch.
+        """
+        if not batching_config.get("ENABLED", False):
+            return asr
+        if not asr.supports_batching:
+            logger.info(f"{type(asr).__module__} does not support batching, ASR_BATCHING is ignored")
+            return asr
+        return cls(
+            asr,
+            max_batch=batching_config.get("MAX_BATCH", 8),
+            max_wait_ms=batching_config.get("MAX_WAIT_MS", 10.0),
+        )
+
+    def __getattr__(self, name):
+        # Backend specific attributes
+        if name == "asr":
+            raise AttributeError(name)
+        return getattr(self.asr, name)
+
+    def transcribe_np(self, audio: np.ndarray) -> str:
+        """Transcribe the utterance in the next batch and wait for it."""
+        return self._submit(np.asarray(audio, dtype=np.float32))
+
+    def transcribe_batch_np(self, audios: list[np.ndarray]) -> list[str]:
+        futures = [self._submit_async(np.asarray(audio, dtype=np.float32)) for audio in audios]
+        return [future.result() for future in futures]
+
+    def transcribe_segments_np(self, audio: np.ndarray) -> list[tuple[float, float, str]]:
+        return self._submit(lambda: self.asr.transcribe_segments_np(audio))
+
+    def create_streaming_session(self, **kwargs) -> StreamingASRSession:
+        if type(self.asr).create_streaming_session is ASRInterface.create_streaming_session:
+            # re-decodes through this batcher
+            return WindowedStreamingSession(self, **kwargs)
+        # the backend's own streaming model
+        return self.asr.create_streaming_session(**kwargs)
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+    def _submit(self, job: np.ndarray | Callable[[], Any]) -> Any:
+        return self._submit_async(job).result()
+
+    def _submit_async(self, job: np.ndarray | Callable[[], Any]) -> Future:
+        future: Future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The ASR batcher is closed.")
+            self._pending.append((job, future))
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name="asr-batcher", daemon=True
+                )
+                self._worker.start()
+            self._condition.notify()
+        return future
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if self._closed and not self._pending:
+                    return
+                if isinstance(self._pending[0][0], np.ndarray):
+                    # give the other sessions a moment to join the batch
+                    deadline = time.monotonic() + self.max_wait
+                    while len(self._pending) < self.max_batch and not self._closed:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._condition.wait(remaining)
+                batch = self._take_batch()
+
+            if callable(batch[0][0]):
+                self._run_call(*batch[0])
+            else:
+                self._run_batch(batch)
+
+    def _take_batch(self) -> list[tuple[np.ndarray | Callable[[], Any], Future]]:
+        """
+        Take the next call, or up to `max_batch` pending utterances.
+        Called with the lock held.
+        """
+        if callable(self._pending[0][0]):
+            return [self._pending.pop(0)]
+        batch = []
+        remaining = []
+        for item in self._pending:
+            if len(batch) < self.max_batch and isinstance(item[0], np.ndarray):
+                batch.append(item)
+            else:
+                remaining.append(item)
+        self._pending = remaining
+        return batch
+
+    def _run_call(self, call: Callable[[], Any], future: Future) -> None:
+        try:
+            future.set_result(call())
+        except Exception as e:
+            future.set_exception(e)
+
+    def _run_batch(self, batch: list[tuple[np.ndarray, Future]]) -> None:
+        try:
+            texts = self.asr.transcribe_batch_np([audio for audio, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.requests += len(batch)
+        for (_, future), text in zip(batch, texts):
+            future.set_result(text)
@@ -34,6 +34,7 @@ class ASRFactory:
                 device=kwargs.get("device"),
                 language=kwargs.get("language"),
                 use_itn=kwargs.get("use_itn"),
+                streaming_model=kwargs.get("streaming_model"),
                 # sample_rate=kwargs.get("sample_rate"),
             )
         elif system_name == "AzureASR":
@@ -1,11 +1,14 @@
 import abc
 import numpy as np
 from .asr_with_vad import VoiceRecognitionVAD
+from .streaming_asr import StreamingASRSession, WindowedStreamingSession
 
 
 class ASRInterface(metaclass=abc.ABCMeta):
 
     asr_with_vad: VoiceRecognitionVAD = None
+    # True if `transcribe_batch_np` decodes several utterances faster than one at a time
+    supports_batching: bool = False
     SAMPLE_RATE = 16000
     NUM_CHANNELS = 1
     SAMPLE_WIDTH = 2
@@ -31,6 +34,34 @@ class ASRInterface(metaclass=abc.ABCMeta):
         """
         raise NotImplementedError
 
+    def transcribe_batch_np(self, audios: list[np.ndarray]) -> list[str]:
+        """Transcribe several utterances and return their transcriptions, in order.
+
+        Backends that can decode a batch in one pass should override this and set
+        `supports_batching`. The default transcribes them one at a time.
+        """
+        return [self.transcribe_np(audio) for audio in audios]
+
+    def transcribe_segments_np(
+        self, audio: np.ndarray
+    ) -> list[tuple[float, float, str]]:
+        """Transcribe speech audio and return its segments as (start, end, text), in seconds.
+
+        Backends that know segment timestamps should override this, so that streaming
+        sessions can cut committed segments from their window. The default returns the
+        whole audio as one segment.
+        """
+        text = self.transcribe_np(audio)
+        return [(0.0, len(audio) / self.SAMPLE_RATE, text)] if text else []
+
+    def create_streaming_session(self, **kwargs) -> StreamingASRSession:
+        """Create a session that transcribes an utterance incrementally while it is spoken.
+
+        The default re-decodes a sliding window with `transcribe_segments_np`.
+        Keyword arguments are passed to `WindowedStreamingSession`.
+        """
+        return WindowedStreamingSession(self, **kwargs)
+
     def nparray_to_audio_file(
         self, audio: np.ndarray, sample_rate: int, file_path: str
     ) -> None:
@@ -32,9 +32,8 @@ This modified version is also distributed under the MIT License.
 """
 
 import threading
-import queue
 from pathlib import Path
-from typing import Callable, List
+from typing import Callable
 
 import numpy as np
 from loguru import logger
@@ -54,10 +53,69 @@ VAD_SIZE = 50  # Milliseconds of sample for Voice Activity Detection (VAD)
 VAD_THRESHOLD = 0.7  # Threshold for VAD detection
 BUFFER_SIZE = 600  # Milliseconds of buffer before VAD detection
 PAUSE_LIMIT = 1300  # Milliseconds of pause allowed before processing
+RING_BUFFER_SECONDS = 10  # Audio the capture ring buffer can hold while VAD lags behind
+MAX_UTTERANCE_SECONDS = 60  # Longer utterances are processed when the buffer is full
 WAKE_WORD = "computer"  # Wake word for activation
 SIMILARITY_THRESHOLD = 2  # Threshold for wake word similarity
 
 
+class AudioRingBuffer:
+    """
+    A single-producer single-consumer ring buffer of float32 samples.
+
+    The audio callback writes, one other thread reads. Each side only moves its
+    own index, and the write index is published after the samples are copied,
+    so neither side takes a lock. When the reader falls behind by the whole
+    capacity, new samples are dropped and counted in `overflows`.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self._buffer = np.zeros(capacity, dtype=np.float32)
+        self._write = 0  # total samples written, only changed by the producer
+        self._read = 0  # total samples read, only changed by the consumer
+        self._data_ready = threading.Event()
+        self.overflows = 0
+
+    def available(self) -> int:
+        return self._write - self._read
+
+    def write(self, samples: np.ndarray) -> None:
+        """Producer side: copy the samples into the ring."""
+        count = len(samples)
+        free = self.capacity - (self._write - self._read)
+        if count > free:
+            self.overflows += 1
+            count = free
+        start = self._write % self.capacity
+        first = min(count, self.capacity - start)
+        self._buffer[start : start + first] = samples[:first]
+        self._buffer[: count - first] = samples[first:count]
+        self._write += count
+        self._data_ready.set()
+
+    def read_into(self, out: np.ndarray) -> bool:
+        """Consumer side: fill `out` with the oldest samples. Returns False if not enough are available."""
+        count = len(out)
+        if self.available() < count:
+            return False
+        start = self._read % self.capacity
+        first = min(count, self.capacity - start)
+        out[:first] = self._buffer[start : start + first]
+        out[first:] = self._buffer[: count - first]
+        self._read += count
+        return True
+
+    def wait(self, timeout: float | None = None) -> None:
+        """Consumer side: wait until the producer writes again."""
+        self._data_ready.wait(timeout)
+        self._data_ready.clear()
+
+    def clear(self) -> None:
+        """Consumer side: discard everything written so far."""
+        self._read = self._write
+
+
 class VoiceRecognitionVAD:
     def __init__(
         self,
@@ -66,13 +124,16 @@ class VoiceRecognitionVAD:
         function: Callable = print,
     ) -> None:
         """
-        Initializes the VoiceRecognition class, setting up necessary models, streams, and queues.
+        Initializes the VoiceRecognition class, setting up necessary models, streams, and buffers.
 
         This class is not thread-safe, so you should only use it from one thread. It works like this:
-        1. The audio stream is continuously listening for input.
-        2. The audio is buffered until voice activity is detected. This is to make sure that the
-            entire sentence is captured, including before voice activity is detected.
-        2. While voice activity is detected, the audio is stored, together with the buffered audio.
+        1. The audio stream is continuously listening for input. Its callback only copies the
+            audio into a ring buffer, so a slow VAD never makes the input overflow.
+        2. The listening thread takes the audio from the ring buffer in VAD_SIZE frames and runs
+            the VAD on them. The last BUFFER_SIZE of audio is kept until voice activity is detected,
+            to make sure that the entire sentence is captured.
+        2. While voice activity is detected, the audio is stored in a preallocated utterance
+            buffer, after the buffered audio.
         3. When voice activity is not detected after a short time (the PAUSE_LIMIT), the audio is
             transcribed. If voice is detected again during this time, the timer is reset and the
             recording continues.
@@ -91,10 +152,18 @@ class VoiceRecognitionVAD:
         self._setup_vad_model()
         self.transcribe = asr_transcribe_func
 
-        # Initialize sample queues and state flags
-        self.samples = []
-        self.sample_queue = queue.Queue()
-        self.buffer = queue.Queue(maxsize=BUFFER_SIZE // VAD_SIZE)
+        # Preallocated buffers and state flags
+        self.frame_size = int(SAMPLE_RATE * VAD_SIZE / 1000)
+        self.ring_buffer = AudioRingBuffer(SAMPLE_RATE * RING_BUFFER_SECONDS)
+        self._frame = np.empty(self.frame_size, dtype=np.float32)
+        # the last BUFFER_SIZE ms before activation, as a ring of frames
+        self.pre_activation_frames = BUFFER_SIZE // VAD_SIZE
+        self._pre_activation = np.zeros(
+            (self.pre_activation_frames, self.frame_size), dtype=np.float32
+        )
+        self._pre_activation_count = 0
+        self._utterance = np.empty(SAMPLE_RATE * MAX_UTTERANCE_SECONDS, dtype=np.float32)
+        self._utterance_length = 0
         self.recording_started = False
         self.gap_counter = 0
         self.wake_word = wake_word
@@ -107,6 +176,7 @@ class VoiceRecognitionVAD:
         self.input_stream = sd.InputStream(
             samplerate=SAMPLE_RATE,
             channels=1,
+            dtype="float32",
             callback=self.audio_callback,
             blocksize=int(SAMPLE_RATE * VAD_SIZE / 1000),
         )
@@ -119,12 +189,10 @@ class VoiceRecognitionVAD:
 
     def audio_callback(self, indata, frames, time, status):
         """
-        Callback function for the audio stream, processing incoming data.
+        Callback function for the audio stream. It runs on the PortAudio thread,
+        so it only copies the first channel into the ring buffer.
         """
-        data = indata.copy()
-        data = data.squeeze()  # Reduce to single channel if necessary
-        vad_confidence = self.vad_model.process_chunk(data) > VAD_THRESHOLD
-        self.sample_queue.put((data, vad_confidence))
+        self.ring_buffer.write(indata[:, 0])
 
     def start(self):
         """
@@ -154,17 +222,22 @@ class VoiceRecognitionVAD:
         Listens for audio input and responds appropriately when the wake word is detected.
         """
         logger.info("Listening...")
+        overflows = self.ring_buffer.overflows
         while True:  # Loop forever, but is 'paused' when new samples are not available
-            sample, vad_confidence = self.sample_queue.get()
-            result = self._handle_audio_sample(sample, vad_confidence)
+            if not self.ring_buffer.read_into(self._frame):
+                self.ring_buffer.wait(timeout=VAD_SIZE / 1000)
+                continue
+            if self.ring_buffer.overflows != overflows:
+                overflows = self.ring_buffer.overflows
+                logger.warning("VAD is falling behind the microphone, audio was dropped.")
+
+            vad_confidence = self.vad_model.process_chunk(self._frame) > VAD_THRESHOLD
+            result = self._handle_audio_sample(self._frame, vad_confidence)
 
             if result:
+                self.reset()
                 if returnText:
-                    # if we return the text and are not starting the listening again, we can reset the recorder without blocking
-                    threading.Thread(target=self.reset).start()
-                    # self.reset()
                     return result
-                self.reset()
                 self.input_stream.start()
 
     def _handle_audio_sample(self, sample, vad_confidence):
@@ -180,12 +253,17 @@ class VoiceRecognitionVAD:
         """
         Manages the buffer of audio samples before activation (i.e., before the voice is detected).
         """
-        if self.buffer.full():
-            self.buffer.get()  # Discard the oldest sample to make room for new ones
-        self.buffer.put(sample)
+        # Overwrite the oldest frame to make room for the new one
+        self._pre_activation[self._pre_activation_count % self.pre_activation_frames] = sample
+        self._pre_activation_count += 1
 
         if vad_confidence:  # Voice activity detected
-            self.samples = list(self.buffer.queue)
+            # Copy the buffered frames, oldest first, to the start of the utterance
+            kept = min(self._pre_activation_count, self.pre_activation_frames)
+            oldest = (self._pre_activation_count - kept) % self.pre_activation_frames
+            order = np.roll(np.arange(self.pre_activation_frames), -oldest)[:kept]
+            self._utterance_length = kept * self.frame_size
+            self._utterance[: self._utterance_length] = self._pre_activation[order].reshape(-1)
             self.recording_started = True
 
     def _process_activated_audio(self, sample: np.ndarray, vad_confidence: bool):
@@ -196,7 +274,12 @@ class VoiceRecognitionVAD:
         ensure that the entire sentence is captured before processing, including slight gaps.
         """
 
-        self.samples.append(sample)
+        end = self._utterance_length + len(sample)
+        if end > len(self._utterance):
+            logger.warning("Utterance buffer is full, processing it now.")
+            return self._process_detected_audio()
+        self._utterance[self._utterance_length : end] = sample
+        self._utterance_length = end
 
         if not vad_confidence:
             self.gap_counter += 1
@@ -226,7 +309,7 @@ class VoiceRecognitionVAD:
         logger.info("Stopping listening...")
         self.input_stream.stop()
 
-        detected_text = self.asr(self.samples)
+        detected_text = self.asr(self._utterance[: self._utterance_length])
 
         if detected_text:
             logger.info(f"Detected: '{detected_text}'")
@@ -237,13 +320,12 @@ class VoiceRecognitionVAD:
         # self.reset()
         # self.input_stream.start()
 
-    def asr(self, samples: List[np.ndarray]) -> str:
+    def asr(self, samples: np.ndarray) -> str:
         """
         Performs automatic speech recognition on the collected samples.
+        `samples` is a view of the utterance buffer, it is not copied.
         """
-        audio = np.concatenate(samples)
-
-        detected_text = self.transcribe(audio)
+        detected_text = self.transcribe(samples)
         return detected_text
 
     def reset(self):
@@ -252,7 +334,9 @@ class VoiceRecognitionVAD:
         """
         logger.info("Resetting recorder...")
         self.recording_started = False
-        self.samples.clear()
+        self._utterance_length = 0
         self.gap_counter = 0
-        with self.buffer.mutex:
-            self.buffer.queue.clear()
+        self._pre_activation_count = 0
+        self.vad_model.reset()
+        # the stream is stopped, drop what it captured before
+        self.ring_buffer.clear()
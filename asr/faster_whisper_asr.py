@@ -6,6 +6,9 @@ from .asr_interface import ASRInterface
 class VoiceRecognition(ASRInterface):
 
     BEAM_SEARCH = True
+    supports_batching = True
+    # Whisper decodes 30 s windows; longer utterances are transcribed on their own
+    BATCH_MAX_SECONDS = 30
     # SAMPLE_RATE # Defined in asr_interface.py
 
     def __init__(
@@ -44,3 +47,59 @@ class VoiceRecognition(ASRInterface):
             return ""
         else:
             return "".join(text)
+
+    def transcribe_batch_np(self, audios: list[np.ndarray]) -> list[str]:
+        """
+        Decode the utterances of up to 30 s as one batch: their log-mel features are
+        stacked, encoded in one pass and decoded with one batched CTranslate2 `generate`.
+        Needs a fixed language, because the language is detected per utterance otherwise.
+        """
+        if len(audios) == 1 or not self.LANG:
+            return [self.transcribe_np(audio) for audio in audios]
+
+        from faster_whisper.audio import pad_or_trim
+        from faster_whisper.tokenizer import Tokenizer
+
+        texts = [""] * len(audios)
+        batch = []
+        for index, audio in enumerate(audios):
+            if len(audio) > self.BATCH_MAX_SECONDS * self.SAMPLE_RATE:
+                texts[index] = self.transcribe_np(audio)
+            elif len(audio) > 0:
+                batch.append(index)
+        if not batch:
+            return texts
+
+        features = np.stack(
+            [pad_or_trim(self.model.feature_extractor(audios[index])) for index in batch]
+        )
+        tokenizer = Tokenizer(
+            self.model.hf_tokenizer,
+            self.model.model.is_multilingual,
+            task="transcribe",
+            language=self.LANG,
+        )
+        prompt = self.model.get_prompt(tokenizer, [], without_timestamps=True)
+        encoder_output = self.model.encode(features)
+        results = self.model.model.generate(
+            encoder_output,
+            [prompt] * len(batch),
+            beam_size=5 if self.BEAM_SEARCH else 1,
+            max_length=self.model.max_length,
+        )
+        for index, result in zip(batch, results):
+            texts[index] = tokenizer.decode(result.sequences_ids[0]).strip()
+        return texts
+
+    def transcribe_segments_np(
+        self, audio: np.ndarray
+    ) -> list[tuple[float, float, str]]:
+
+        segments, info = self.model.transcribe(
+            audio,
+            beam_size=5 if self.BEAM_SEARCH else 1,
+            language=self.LANG,
+            condition_on_previous_text=False,
+        )
+
+        return [(segment.start, segment.end, segment.text) for segment in segments]
@@ -1,10 +1,12 @@
 import io
 import re
+import threading
 import torch
 import numpy as np
 import soundfile as sf
 from funasr import AutoModel
 from .asr_interface import ASRInterface
+from .streaming_asr import StreamingASRSession
 
 
 # paraformer-zh is a multi-functional asr model
@@ -13,6 +15,8 @@ from .asr_interface import ASRInterface
 
 class VoiceRecognition(ASRInterface):
 
+    supports_batching = True
+
     def __init__(
         self,
         model_name: str = "iic/SenseVoiceSmall",
@@ -25,6 +29,7 @@ class VoiceRecognition(ASRInterface):
         disable_update: bool = True,
         sample_rate: int = 16000,
         use_itn: bool = False,
+        streaming_model: str | None = None,
     ) -> None:
 
         self.model = AutoModel(
@@ -41,6 +46,21 @@ class VoiceRecognition(ASRInterface):
         self.use_itn = use_itn
         self.language = language
 
+        # The online model (e.g. "paraformer-zh-streaming") for ASR_STREAMING.
+        # Loaded here, with the other models, rather than on the event loop by the first session.
+        self.streaming_model_name = streaming_model
+        self._streaming_model = None
+        if streaming_model:
+            self._streaming_model = AutoModel(
+                model=streaming_model,
+                ncpu=ncpu,
+                hub=hub,
+                device=device,
+                disable_update=disable_update,
+            )
+        # the sessions of all connections share the one online model
+        self._streaming_lock = threading.Lock()
+
         self.asr_with_vad = None
 
     # Implemented in asr_interface.py
@@ -57,8 +77,23 @@ class VoiceRecognition(ASRInterface):
             language=self.language,
         )
 
-        full_text = res[0]["text"]
+        return self._clean_text(res[0]["text"])
+
+    def transcribe_batch_np(self, audios: list[np.ndarray]) -> list[str]:
+        """Decode all utterances with one `generate` call on a list input."""
+        if len(audios) == 1:
+            return [self.transcribe_np(audios[0])]
+
+        res = self.model.generate(
+            input=[torch.tensor(audio, dtype=torch.float32) for audio in audios],
+            batch_size_s=300,
+            use_itn=self.use_itn,
+            language=self.language,
+        )
+        return [self._clean_text(result["text"]) for result in res]
 
+    @staticmethod
+    def _clean_text(full_text: str) -> str:
         # SenseVoiceSmall may spits out some tags
         # like this: '<|zh|><|NEUTRAL|><|Speech|><|woitn|>欢迎大家来体验达摩院推出的语音识别模型'
         # we should remove those tags from the result
@@ -70,6 +105,12 @@ class VoiceRecognition(ASRInterface):
 
         return full_text.strip()
 
+    def create_streaming_session(self, **kwargs) -> StreamingASRSession:
+        """Use the online paraformer if `streaming_model` is set, the sliding window otherwise."""
+        if self._streaming_model is None:
+            return super().create_streaming_session(**kwargs)
+        return ParaformerStreamingSession(self._streaming_model, self._streaming_lock)
+
     def _numpy_to_wav_in_memory(self, numpy_array: np.ndarray, sample_rate):
 
         memory_file = io.BytesIO()
@@ -77,3 +118,58 @@ class VoiceRecognition(ASRInterface):
         memory_file.seek(0)
 
         return memory_file
+
+
+class ParaformerStreamingSession(StreamingASRSession):
+    """
+    Incremental recognition with FunASR's online paraformer.
+    Audio is fed in chunks of `chunk_size[1]` * 60 ms, the model keeps its state in `cache`.
+    The sessions sharing a model take turns with `lock`.
+    """
+
+    def __init__(
+        self,
+        model,
+        lock: threading.Lock,
+        chunk_size: tuple[int, int, int] = (0, 10, 5),
+        encoder_chunk_look_back: int = 4,
+        decoder_chunk_look_back: int = 1,
+    ) -> None:
+        self.model = model
+        self.lock = lock
+        self.chunk_size = list(chunk_size)
+        self.encoder_chunk_look_back = encoder_chunk_look_back
+        self.decoder_chunk_look_back = decoder_chunk_look_back
+        # 60 ms per unit at 16 kHz
+        self.chunk_stride = chunk_size[1] * 960
+        self.cache = {}
+        self._buffer = np.empty(0, dtype=np.float32)
+        self._text = ""
+
+    def accept(self, audio: np.ndarray) -> str | None:
+        self._buffer = np.concatenate([self._buffer, np.asarray(audio, dtype=np.float32)])
+        updated = False
+        while len(self._buffer) >= self.chunk_stride:
+            chunk = self._buffer[: self.chunk_stride]
+            self._buffer = self._buffer[self.chunk_stride :]
+            updated |= self._generate(chunk, is_final=False)
+        return self._text if updated else None
+
+    def finish(self) -> str:
+        self._generate(self._buffer, is_final=True)
+        self._buffer = np.empty(0, dtype=np.float32)
+        return self._text.strip()
+
+    def _generate(self, chunk: np.ndarray, is_final: bool) -> bool:
+        with self.lock:
+            res = self.model.generate(
+                input=chunk,
+                cache=self.cache,
+                is_final=is_final,
+                chunk_size=self.chunk_size,
+                encoder_chunk_look_back=self.encoder_chunk_look_back,
+                decoder_chunk_look_back=self.decoder_chunk_look_back,
+            )
+        text = res[0]["text"] if res else ""
+        self._text += text
+        return bool(text)
@@ -0,0 +1,141 @@
+"""
+Server-side voice activity detection of a microphone stream from the WebSocket.
+
+`StreamVAD` cuts a continuous stream into utterances with the Silero VAD,
+like `VoiceRecognitionVAD` does for the local microphone:
+- Before speech starts, only the last `pre_speech_ms` of audio are kept.
+  Silence is never buffered for the ASR.
+- Speech starts with the first frame above the threshold, together with the
+  audio kept before it.
+- Speech ends after `pause_ms` without voice.
+"""
+
+from collections import deque
+from typing import Literal
+import numpy as np
+
+from .asr_with_vad import (
+    BUFFER_SIZE,
+    PAUSE_LIMIT,
+    SAMPLE_RATE,
+    VAD_MODEL_PATH,
+    VAD_SIZE,
+    VAD_THRESHOLD,
+)
+from .vad import VAD, VADStream, get_vad_service
+
+# "speech-start" and "speech" carry audio of the utterance, "speech-end" carries None
+VADEvent = tuple[Literal["speech-start", "speech", "speech-end"], np.ndarray | None]
+
+
+class StreamVAD:
+    """Segments the microphone stream of one WebSocket connection into utterances."""
+
+    def __init__(
+        self,
+        vad_model: VAD | VADStream | None = None,
+        threshold: float = VAD_THRESHOLD,
+        frame_ms: int = VAD_SIZE,
+        pre_speech_ms: int = BUFFER_SIZE,
+        pause_ms: int = PAUSE_LIMIT,
+        sample_rate: int = SAMPLE_RATE,
+    ) -> None:
+        """
+        Parameters:
+            vad_model (VAD | VADStream, optional): The Silero VAD of this stream, e.g. a stream
+                of the shared `VADService`. A new VAD on asr/models/silero_vad.onnx if None.
+                It keeps the state of the stream, so it must not be shared with other streams.
+            threshold (float): Speech probability above which a frame is voice.
+            frame_ms (int): The length of the frames given to the VAD.
+            pre_speech_ms (int): Audio kept from before the speech starts.
+            pause_ms (int): Silence that ends the utterance.
+            sample_rate (int): The sample rate of the stream.
+        """
+        self.vad_model = vad_model or VAD(model_path=VAD_MODEL_PATH)
+        self.threshold = threshold
+        self.frame_frames = int(sample_rate * frame_ms / 1000)
+        self.pause_frames = max(1, pause_ms // frame_ms)
+        self._pre_speech: deque[np.ndarray] = deque(maxlen=max(1, pre_speech_ms // frame_ms))
+        self._remainder = np.empty(0, dtype=np.float32)
+        self.speaking = False
+        self._gap_counter = 0
+
+    @classmethod
+    def from_config(cls, vad_config: dict, **kwargs) -> "StreamVAD":
+        """
+        Create a stream VAD from the SERVER_VAD section of conf.yaml.
+        With BATCHED, its chunks are batched with those of all other streams
+        in the process-wide `VADService`.
+        """
+        threads = dict(
+            intra_op_threads=vad_config.get("INTRA_OP_THREADS", 1),
+            inter_op_threads=vad_config.get("INTER_OP_THREADS", 1),
+        )
+        if vad_config.get("BATCHED", True):
+            service = get_vad_service(
+                VAD_MODEL_PATH,
+                max_batch=vad_config.get("MAX_BATCH", 64),
+                max_wait_ms=vad_config.get("MAX_WAIT_MS", 2.0),
+                **threads,
+            )
+            kwargs.setdefault("vad_model", service.create_stream())
+        else:
+            kwargs.setdefault("vad_model", VAD(model_path=VAD_MODEL_PATH, **threads))
+        return cls(
+            threshold=vad_config.get("THRESHOLD", VAD_THRESHOLD),
+            pre_speech_ms=vad_config.get("PRE_SPEECH_MS", BUFFER_SIZE),
+            pause_ms=vad_config.get("PAUSE_MS", PAUSE_LIMIT),
+            **kwargs,
+        )
+
+    def process(self, samples: np.ndarray) -> list[VADEvent]:
+        """
+        Add the next float32 samples of the stream.
+
+        Returns:
+            list[VADEvent]: What happened in these samples, in order.
+        """
+        samples = np.concatenate(
+            [self._remainder, np.asarray(samples, dtype=np.float32).reshape(-1)]
+        )
+        usable = len(samples) - len(samples) % self.frame_frames
+        self._remainder = samples[usable:]
+
+        events: list[VADEvent] = []
+        speech: list[np.ndarray] = []
+        for start in range(0, usable, self.frame_frames):
+            frame = samples[start : start + self.frame_frames]
+            is_voice = self.vad_model.process_chunk(frame) > self.threshold
+            if not self.speaking:
+                self._pre_speech.append(frame)
+                if is_voice:
+                    self.speaking = True
+                    self._gap_counter = 0
+                    events.append(("speech-start", np.concatenate(self._pre_speech)))
+                    self._pre_speech.clear()
+                continue
+
+            speech.append(frame)
+            if is_voice:
+                self._gap_counter = 0
+                continue
+            self._gap_counter += 1
+            if self._gap_counter >= self.pause_frames:
+                events.append(("speech", np.concatenate(speech)))
+                events.append(("speech-end", None))
+                speech = []
+                self.speaking = False
+                self._gap_counter = 0
+                self.vad_model.reset()
+
+        if speech:
+            events.append(("speech", np.concatenate(speech)))
+        return events
+
+    def reset(self) -> None:
+        """Forget the stream, e.g. when the microphone is turned off."""
+        self._pre_speech.clear()
+        self._remainder = np.empty(0, dtype=np.float32)
+        self.speaking = False
+        self._gap_counter = 0
+        self.vad_model.reset()
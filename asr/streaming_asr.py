@@ -0,0 +1,198 @@
+"""
+Incremental speech recognition while the user is still speaking.
+
+A `StreamingASRSession` takes the audio of one utterance in chunks as it
+arrives and returns partial hypotheses. `finish` returns the final text as
+soon as the user stops speaking, because most of the utterance has already
+been decoded by then.
+
+`WindowedStreamingSession` works with any `ASRInterface`. It re-decodes a
+sliding window of audio and uses the local agreement policy: a segment is
+committed when two consecutive decodes agree on it and it does not end too
+close to the end of the window. Committed segments are cut from the window,
+so the window stays short. Backends that report segment timestamps
+(`transcribe_segments_np`) benefit most; for the others the window grows to
+the whole utterance.
+
+`StreamingTranscriber` runs a session for one WebSocket connection without
+blocking the event loop.
+"""
+
+import abc
+import asyncio
+from typing import TYPE_CHECKING, Awaitable, Callable
+import numpy as np
+from loguru import logger
+
+if TYPE_CHECKING:
+    from .asr_interface import ASRInterface
+
+
+class StreamingASRSession(metaclass=abc.ABCMeta):
+    """The incremental recognition of one utterance."""
+
+    @abc.abstractmethod
+    def accept(self, audio: np.ndarray) -> str | None:
+        """
+        Add the next chunk of float32 audio.
+
+        Returns:
+            str | None: The new partial hypothesis, or None if it was not updated.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def finish(self) -> str:
+        """Decode what is left of the utterance and return the final text."""
+        raise NotImplementedError
+
+
+class WindowedStreamingSession(StreamingASRSession):
+    """Re-decode a sliding window with any ASR and commit the segments two decodes agree on."""
+
+    def __init__(
+        self,
+        asr: "ASRInterface",
+        step_seconds: float = 1.0,
+        guard_seconds: float = 1.0,
+        max_window_seconds: float = 25.0,
+    ) -> None:
+        """
+        Parameters:
+            asr (ASRInterface): The ASR used to decode the window.
+            step_seconds (float): Decode again after this much new audio.
+            guard_seconds (float): Segments that end this close to the end of the window
+                are never committed, because the next words may still change them.
+            max_window_seconds (float): When the window gets longer, every segment but the
+                last one is committed even without agreement. Whisper cannot see more than 30s.
+        """
+        self.asr = asr
+        self.sample_rate = asr.SAMPLE_RATE
+        self.step_frames = int(step_seconds * self.sample_rate)
+        self.guard_seconds = guard_seconds
+        self.max_window_seconds = max_window_seconds
+
+        self._window = np.empty(0, dtype=np.float32)
+        self._pending: list[np.ndarray] = []
+        self._pending_frames = 0
+        self._committed: list[str] = []
+        self._hypothesis: list[tuple[float, float, str]] = []
+
+    def accept(self, audio: np.ndarray) -> str | None:
+        audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+        if len(audio) == 0:
+            return None
+        self._pending.append(audio)
+        self._pending_frames += len(audio)
+        if self._pending_frames < self.step_frames:
+            return None
+        self._decode()
+        return self.text()
+
+    def finish(self) -> str:
+        if self._pending_frames:
+            self._decode()
+        return self.text()
+
+    def text(self) -> str:
+        """The committed text followed by the current hypothesis."""
+        return "".join(
+            self._committed + [text for _, _, text in self._hypothesis]
+        ).strip()
+
+    def _decode(self) -> None:
+        self._window = np.concatenate([self._window] + self._pending)
+        self._pending = []
+        self._pending_frames = 0
+
+        segments = self.asr.transcribe_segments_np(self._window)
+        window_seconds = len(self._window) / self.sample_rate
+
+        # Local agreement: the longest common prefix of this decode and the previous one
+        agreed = 0
+        for (_, end, text), (_, _, previous_text) in zip(segments, self._hypothesis):
+            if text != previous_text or end > window_seconds - self.guard_seconds:
+                break
+            agreed += 1
+        if agreed == 0 and window_seconds > self.max_window_seconds:
+            agreed = len(segments) - 1
+
+        if agreed > 0:
+            self._committed.extend(text for _, _, text in segments[:agreed])
+            cut = segments[agreed - 1][1]
+            self._window = self._window[int(cut * self.sample_rate) :]
+            segments = [
+                (start - cut, end - cut, text) for start, end, text in segments[agreed:]
+            ]
+        self._hypothesis = segments
+
+
+class StreamingTranscriber:
+    """
+    Feed the audio of a WebSocket connection to a streaming session in a worker
+    thread, and report partial hypotheses.
+
+    Chunks that arrive while a decode is running are decoded together, so a
+    burst of audio costs one decode, not one per chunk.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], StreamingASRSession],
+        on_partial: Callable[[str], Awaitable[None]] | None = None,
+    ) -> None:
+        """
+        Parameters:
+            session_factory (Callable): Creates the session of the next utterance.
+            on_partial (Callable, optional): Coroutine function called with each new partial.
+        """
+        self.session_factory = session_factory
+        self.on_partial = on_partial
+        self._session: StreamingASRSession | None = None
+        self._pending: list[np.ndarray] = []
+        self._worker: asyncio.Task | None = None
+        self._last_partial = ""
+
+    def feed(self, audio: np.ndarray) -> None:
+        """Add audio of the current utterance. Must be called from the event loop thread."""
+        if len(audio) == 0:
+            return
+        self._pending.append(audio)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._drain())
+
+    async def finish(self) -> str:
+        """Wait for the decodes in progress and return the final text of the utterance."""
+        if self._worker is not None:
+            await self._worker
+        session = self._session
+        self._session = None
+        self._last_partial = ""
+        if session is None:
+            return ""
+        return await asyncio.to_thread(session.finish)
+
+    def reset(self) -> None:
+        """Drop the current utterance."""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        self._pending = []
+        self._session = None
+        self._last_partial = ""
+
+    async def _drain(self) -> None:
+        while self._pending:
+            audio = np.concatenate(self._pending)
+            self._pending = []
+            if self._session is None:
+                self._session = self.session_factory()
+            try:
+                partial = await asyncio.to_thread(self._session.accept, audio)
+            except Exception as e:
+                logger.error(f"Streaming ASR failed: {e}")
+                continue
+            if partial and partial != self._last_partial:
+                self._last_partial = partial
+                if self.on_partial is not None:
+                    await self.on_partial(partial)
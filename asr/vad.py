@@ -1,24 +1,62 @@
 # Original code by David Ng in [GlaDOS](https://github.com/dnhkng/GlaDOS), licensed under the MIT License
-# https://opensource.org/licenses/MIT# 
+# https://opensource.org/licenses/MIT#
 # Modifications by Yi-Ting Chiu as part of OpenLLM-VTuber, licensed under the MIT License
 # https://opensource.org/licenses/MIT
-# 
+#
 #
 
+import threading
+import time
+from concurrent.futures import Future
 import numpy as np
 import onnxruntime as ort
 
 SAMPLE_RATE = 16000
 
+_sessions: dict[tuple, ort.InferenceSession] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_shared_session(
+    model_path, intra_op_threads: int = 1, inter_op_threads: int = 1
+) -> ort.InferenceSession:
+    """
+    Return the ONNX session of the Silero VAD, shared by everyone asking for the
+    same model with the same thread settings.
+
+    The VAD model is tiny, so one intra-op thread is usually fastest. Use more
+    when large batches are run.
+    """
+    key = (str(model_path), intra_op_threads, inter_op_threads)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = intra_op_threads
+            options.inter_op_num_threads = inter_op_threads
+            options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+            session = ort.InferenceSession(
+                str(model_path), sess_options=options, providers=["CPUExecutionProvider"]
+            )
+            _sessions[key] = session
+        return session
+
 
 class VAD:
     _initial_h = np.zeros((2, 1, 64)).astype("float32")
     _initial_c = np.zeros((2, 1, 64)).astype("float32")
 
-    def __init__(self, model_path, window_size_samples: int = int(SAMPLE_RATE / 10)):
-        self.ort_sess = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+    def __init__(
+        self,
+        model_path,
+        window_size_samples: int = int(SAMPLE_RATE / 10),
+        intra_op_threads: int = 1,
+        inter_op_threads: int = 1,
+    ):
+        self.ort_sess = get_shared_session(model_path, intra_op_threads, inter_op_threads)
         self.window_size_samples = window_size_samples
         self.sr = SAMPLE_RATE
+        self._sr = np.array(self.sr, dtype="int64")
         self._h = self._initial_h
         self._c = self._initial_c
 
@@ -31,7 +69,7 @@ class VAD:
             "input": np.expand_dims(chunk, 0),
             "h": self._h,
             "c": self._c,
-            "sr": np.array(self.sr, dtype="int64"),
+            "sr": self._sr,
         }
         out, self._h, self._c = self.ort_sess.run(None, ort_inputs)
         return np.squeeze(out)
@@ -43,13 +81,167 @@ class VAD:
             chunk = audio[i : i + self.window_size_samples]
             if len(chunk) < self.window_size_samples:
                 break
-            ort_inputs = {
-                "input": np.expand_dims(chunk, 0),
-                "h": self._h,
-                "c": self._c,
-                "sr": np.array(self.sr, dtype="int64"),
-            }
-            out, self._h, self._c = self.ort_sess.run(None, ort_inputs)
-            results.append(np.squeeze(out))
+            results.append(self.process_chunk(chunk))
         results = np.stack(results, axis=0)
-        return results
\ No newline at end of file
+        return results
+
+
+class VADStream:
+    """
+    One audio stream of a `VADService`. It keeps the recurrent state of its stream
+    and can be used wherever a `VAD` is, through `process_chunk` and `reset`.
+    """
+
+    def __init__(self, service: "VADService"):
+        self.service = service
+        self.reset()
+
+    def reset(self):
+        self.h = np.zeros((2, 64), dtype=np.float32)
+        self.c = np.zeros((2, 64), dtype=np.float32)
+
+    def process_chunk(self, chunk: np.ndarray) -> float:
+        """Run the chunk in the next batch of the service and return its speech probability."""
+        return self.service.process_chunk(self, chunk)
+
+
+class VADService:
+    """
+    Runs the Silero VAD of many streams with one shared ONNX session.
+
+    Chunks submitted by different streams at about the same time are stacked
+    into one batch, so one `run` call serves all of them. Every stream keeps its
+    own h/c state, which is batched along the second axis of the model state.
+    """
+
+    def __init__(
+        self,
+        model_path,
+        intra_op_threads: int = 1,
+        inter_op_threads: int = 1,
+        max_batch: int = 64,
+        max_wait_ms: float = 2.0,
+    ):
+        """
+        Parameters:
+            model_path: The path of silero_vad.onnx.
+            intra_op_threads (int): ONNX Runtime threads used inside one operator.
+            inter_op_threads (int): ONNX Runtime threads used across operators.
+            max_batch (int): The largest number of chunks in one run.
+            max_wait_ms (float): How long the first chunk of a batch waits for others.
+        """
+        self.ort_sess = get_shared_session(model_path, intra_op_threads, inter_op_threads)
+        self.sr = SAMPLE_RATE
+        self._sr = np.array(self.sr, dtype="int64")
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._pending: list[tuple[VADStream, np.ndarray, Future]] = []
+        self._condition = threading.Condition()
+        self._worker: threading.Thread | None = None
+        self._closed = False
+        self.batches = 0
+        self.chunks = 0
+
+    def create_stream(self) -> VADStream:
+        return VADStream(self)
+
+    def run_batch(self, items: list[tuple[VADStream, np.ndarray]]) -> np.ndarray:
+        """
+        Run one chunk of each stream in a single call and update their states.
+        All chunks must have the same length and belong to different streams.
+
+        Returns:
+            np.ndarray: The speech probability of each chunk.
+        """
+        streams = [stream for stream, _ in items]
+        ort_inputs = {
+            "input": np.stack([chunk for _, chunk in items]).astype(np.float32, copy=False),
+            "h": np.stack([stream.h for stream in streams], axis=1),
+            "c": np.stack([stream.c for stream in streams], axis=1),
+            "sr": self._sr,
+        }
+        out, h, c = self.ort_sess.run(None, ort_inputs)
+        for index, stream in enumerate(streams):
+            stream.h = h[:, index]
+            stream.c = c[:, index]
+        self.batches += 1
+        self.chunks += len(items)
+        return np.asarray(out).reshape(len(items))
+
+    def process_chunk(self, stream: VADStream, chunk: np.ndarray) -> float:
+        """Submit one chunk and wait for the batch it ends up in."""
+        future: Future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The VAD service is closed.")
+            self._pending.append((stream, np.asarray(chunk, dtype=np.float32), future))
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name="vad-service", daemon=True
+                )
+                self._worker.start()
+            self._condition.notify()
+        return future.result()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if self._closed and not self._pending:
+                    return
+                # give the other streams a moment to join the batch
+                deadline = time.monotonic() + self.max_wait
+                while len(self._pending) < self.max_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = self._take_batch()
+
+            try:
+                probabilities = self.run_batch([(stream, chunk) for stream, chunk, _ in batch])
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, _, future), probability in zip(batch, probabilities):
+                future.set_result(float(probability))
+
+    def _take_batch(self) -> list[tuple[VADStream, np.ndarray, Future]]:
+        """
+        Take up to `max_batch` pending chunks of the same length, at most one per stream,
+        because the next chunk of a stream needs the state left by the previous one.
+        Called with the lock held.
+        """
+        batch = []
+        remaining = []
+        streams = set()
+        length = len(self._pending[0][1])
+        for item in self._pending:
+            stream, chunk, _ = item
+            if len(batch) < self.max_batch and len(chunk) == length and id(stream) not in streams:
+                batch.append(item)
+                streams.add(id(stream))
+            else:
+                remaining.append(item)
+        self._pending = remaining
+        return batch
+
+
+_service: VADService | None = None
+_service_lock = threading.Lock()
+
+
+def get_vad_service(model_path, **kwargs) -> VADService:
+    """Return the process-wide VAD service, creating it with `kwargs` on first use."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = VADService(model_path, **kwargs)
+        return _service
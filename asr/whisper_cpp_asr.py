@@ -35,3 +35,10 @@ class VoiceRecognition(ASRInterface):
         for segment in segments:
             full_text += segment.text
         return full_text
+
+    def transcribe_segments_np(
+        self, audio: np.ndarray
+    ) -> list[tuple[float, float, str]]:
+        segments = self.model.transcribe(audio)
+        # t0 and t1 are in units of 10 ms
+        return [(segment.t0 / 100, segment.t1 / 100, segment.text) for segment in segments]
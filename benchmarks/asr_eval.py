@@ -0,0 +1,322 @@
+"""
+Accuracy and speed of any ASR backend of `ASRFactory` on a directory of clips.
+
+Every clip (wav, or mp3/flac/ogg if soundfile or pydub can decode them) may
+have a reference transcript, either in a sidecar file with the same name and
+a .txt extension, or as a line "<file name>\\t<transcript>" in transcripts.tsv
+in the directory.
+
+Reports:
+- load time of the model, and the time of one warm-up transcription
+- real-time factor (processing time / audio duration) over all clips
+- p50/p95/p99 of the latency of one clip
+- peak RSS of the process, and the RSS growth while the model was loaded
+- WER and CER against the references, after lowercasing and removing punctuation
+
+The results are written as JSON, and two JSON files can be compared.
+
+Run from the repository root:
+    PYTHONPATH=. python benchmarks/asr_eval.py run --backend FunASR --clips path/to/clips \\
+        --output funasr.json
+    PYTHONPATH=. python benchmarks/asr_eval.py run --backend Faster-Whisper --clips path/to/clips \\
+        --set model_path=small --set language=zh --output fw-small.json
+    PYTHONPATH=. python benchmarks/asr_eval.py compare funasr.json fw-small.json
+
+The settings of the backend are its section in conf.yaml (--config), with --set overrides.
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import resource
+import sys
+import time
+import unicodedata
+import numpy as np
+import yaml
+
+from asr.asr_factory import ASRFactory
+from tts.audio_buffer import decode_audio_bytes
+
+SAMPLE_RATE = 16000
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".flac", ".ogg", ".m4a")
+
+
+# ==== clips ====
+
+
+def load_clip(path: str) -> np.ndarray:
+    """Read an audio file as mono float32 at 16 kHz, the input of `transcribe_np`."""
+    with open(path, "rb") as audio_file:
+        samples, sample_rate = decode_audio_bytes(audio_file.read())
+    samples = samples.astype(np.float32) / 32768.0
+    if samples.ndim > 1:
+        samples = samples.mean(axis=1)
+    if sample_rate != SAMPLE_RATE and len(samples):
+        frames = int(round(len(samples) * SAMPLE_RATE / sample_rate))
+        positions = np.arange(frames) * (sample_rate / SAMPLE_RATE)
+        samples = np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+    return samples
+
+
+def load_references(clips_dir: str) -> dict[str, str]:
+    references = {}
+    tsv_path = os.path.join(clips_dir, "transcripts.tsv")
+    if os.path.exists(tsv_path):
+        with open(tsv_path, "r", encoding="utf-8") as tsv:
+            for line in tsv:
+                if "\t" in line:
+                    name, text = line.rstrip("\n").split("\t", 1)
+                    references[name] = text
+    for name in os.listdir(clips_dir):
+        base, extension = os.path.splitext(name)
+        if extension.lower() == ".txt":
+            with open(os.path.join(clips_dir, name), "r", encoding="utf-8") as txt:
+                text = txt.read().strip()
+            for audio_extension in AUDIO_EXTENSIONS:
+                references.setdefault(base + audio_extension, text)
+    return references
+
+
+def list_clips(clips_dir: str, limit: int | None = None) -> list[str]:
+    clips = sorted(
+        name for name in os.listdir(clips_dir) if name.lower().endswith(AUDIO_EXTENSIONS)
+    )
+    return clips[:limit] if limit else clips
+
+
+# ==== error rates ====
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = "".join(
+        " " if unicodedata.category(char).startswith("P") else char for char in text
+    )
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def edit_distance(reference: list[str], hypothesis: list[str]) -> int:
+    """The Levenshtein distance between two token sequences."""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_token in enumerate(reference, 1):
+        current = [i] + [0] * len(hypothesis)
+        for j, hyp_token in enumerate(hypothesis, 1):
+            current[j] = min(
+                previous[j] + 1,  # deletion
+                current[j - 1] + 1,  # insertion
+                previous[j - 1] + (ref_token != hyp_token),  # substitution
+            )
+        previous = current
+    return previous[-1]
+
+
+def error_counts(reference: str, hypothesis: str) -> dict:
+    """
+    Word and character errors of one clip. Characters are counted without spaces,
+    so the CER also works for Chinese and Japanese, which have no words to split.
+    """
+    reference, hypothesis = normalize(reference), normalize(hypothesis)
+    ref_words, hyp_words = reference.split(), hypothesis.split()
+    ref_chars, hyp_chars = list(reference.replace(" ", "")), list(hypothesis.replace(" ", ""))
+    return {
+        "word_errors": edit_distance(ref_words, hyp_words),
+        "words": len(ref_words),
+        "char_errors": edit_distance(ref_chars, hyp_chars),
+        "chars": len(ref_chars),
+    }
+
+
+# ==== measurement ====
+
+
+def rss_bytes() -> int | None:
+    try:
+        with open("/proc/self/statm", "r") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def percentile(values: list[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def parse_overrides(overrides: list[str]) -> dict:
+    settings = {}
+    for override in overrides:
+        key, _, value = override.partition("=")
+        settings[key] = yaml.safe_load(value)
+    return settings
+
+
+def run(args: argparse.Namespace) -> dict:
+    settings = {}
+    if args.config and os.path.exists(args.config):
+        with open(args.config, "r", encoding="utf-8") as config_file:
+            settings = dict((yaml.safe_load(config_file) or {}).get(args.backend) or {})
+    settings.update(parse_overrides(args.set))
+
+    clips = list_clips(args.clips, args.limit)
+    if not clips:
+        raise SystemExit(f"No audio clips in {args.clips}")
+    references = load_references(args.clips)
+    audio = {name: load_clip(os.path.join(args.clips, name)) for name in clips}
+
+    rss_before = rss_bytes()
+    start = time.perf_counter()
+    asr = ASRFactory.get_asr_system(args.backend, **settings)
+    load_seconds = time.perf_counter() - start
+    rss_after = rss_bytes()
+    print(f"Loaded {args.backend} in {load_seconds:.2f}s")
+
+    start = time.perf_counter()
+    asr.transcribe_np(audio[clips[0]])
+    warm_up_seconds = time.perf_counter() - start
+
+    results = []
+    for name in clips:
+        samples = audio[name]
+        latencies = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            text = asr.transcribe_np(samples)
+            latencies.append(time.perf_counter() - start)
+        clip = {
+            "clip": name,
+            "audio_seconds": len(samples) / SAMPLE_RATE,
+            "latency_seconds": min(latencies) if args.best_of else float(np.mean(latencies)),
+            "text": text,
+        }
+        if name in references:
+            clip["reference"] = references[name]
+            clip.update(error_counts(references[name], text))
+        results.append(clip)
+        print(f"{clip['latency_seconds']:7.3f}s  {name}: {text}")
+
+    latencies = [clip["latency_seconds"] for clip in results]
+    audio_seconds = sum(clip["audio_seconds"] for clip in results)
+    scored = [clip for clip in results if "reference" in clip]
+    words = sum(clip["words"] for clip in scored)
+    chars = sum(clip["chars"] for clip in scored)
+    summary = {
+        "clips": len(results),
+        "audio_seconds": round(audio_seconds, 3),
+        "load_seconds": round(load_seconds, 3),
+        "warm_up_seconds": round(warm_up_seconds, 3),
+        "rtf": round(sum(latencies) / audio_seconds, 4) if audio_seconds else None,
+        "latency_p50": round(percentile(latencies, 50), 4),
+        "latency_p95": round(percentile(latencies, 95), 4),
+        "latency_p99": round(percentile(latencies, 99), 4),
+        "peak_rss_mb": round(peak_rss_bytes() / 1024 / 1024, 1),
+        "model_rss_mb": (
+            round((rss_after - rss_before) / 1024 / 1024, 1)
+            if rss_before is not None and rss_after is not None
+            else None
+        ),
+        "scored_clips": len(scored),
+        "wer": round(sum(clip["word_errors"] for clip in scored) / words, 4) if words else None,
+        "cer": round(sum(clip["char_errors"] for clip in scored) / chars, 4) if chars else None,
+    }
+    return {
+        "backend": args.backend,
+        "settings": settings,
+        "machine": {
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+        },
+        "repeat": args.repeat,
+        "summary": summary,
+        "clips": results,
+    }
+
+
+# ==== reports ====
+
+# metric, lower is better
+METRICS = [
+    ("rtf", True),
+    ("latency_p50", True),
+    ("latency_p95", True),
+    ("latency_p99", True),
+    ("load_seconds", True),
+    ("warm_up_seconds", True),
+    ("peak_rss_mb", True),
+    ("model_rss_mb", True),
+    ("wer", True),
+    ("cer", True),
+]
+
+
+def print_summary(result: dict) -> None:
+    print(f"\n### {result['backend']} {json.dumps(result['settings'], ensure_ascii=False)}")
+    summary = result["summary"]
+    print(f"{summary['clips']} clips, {summary['audio_seconds']:.1f}s of audio")
+    for metric, _ in METRICS:
+        print(f"{metric:<16} {summary.get(metric)}")
+
+
+def compare(baseline: dict, candidate: dict) -> None:
+    print(f"{'metric':<16} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    for metric, lower_is_better in METRICS:
+        old, new = baseline["summary"].get(metric), candidate["summary"].get(metric)
+        if old is None or new is None:
+            print(f"{metric:<16} {str(old):>12} {str(new):>12}")
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        better = (change < 0) == lower_is_better if change else None
+        mark = {True: "better", False: "worse", None: ""}[better]
+        print(f"{metric:<16} {old:>12} {new:>12} {change:>+8.1f}% {mark}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="benchmark one backend")
+    run_parser.add_argument("--backend", required=True, help="an ASR_MODEL name, e.g. FunASR")
+    run_parser.add_argument("--clips", required=True, help="directory of audio clips")
+    run_parser.add_argument("--config", default="conf.yaml", help="settings of the backend")
+    run_parser.add_argument(
+        "--set", action="append", default=[], metavar="KEY=VALUE", help="override a setting"
+    )
+    run_parser.add_argument("--repeat", type=int, default=1, help="transcriptions per clip")
+    run_parser.add_argument(
+        "--best-of", action="store_true", help="report the fastest repetition, not the mean"
+    )
+    run_parser.add_argument("--limit", type=int, help="use only the first N clips")
+    run_parser.add_argument("--output", help="write the results to this JSON file")
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        with open(args.candidate, "r", encoding="utf-8") as candidate_file:
+            candidate = json.load(candidate_file)
+        compare(baseline, candidate)
+        return
+
+    result = run(args)
+    print_summary(result)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(result, output, ensure_ascii=False, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark of AudioPayloadPreparer.prepare_audio_payload.
+
+Compares the numpy implementation with the previous pydub one (decode with
+ffmpeg, make_chunks + AudioSegment.rms, re-export as WAV) on a sentence of
+speech and on a 20 minute stereo song, like the ones playsongfunction sends.
+
+Run from the repository root:
+    PYTHONPATH=. python benchmarks/audio_payload_bench.py
+"""
+
+import base64
+import os
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+from tts.audio_buffer import encode_wav
+from tts.stream_audio import AudioPayloadPreparer
+
+
+exec_round = 3
+
+
+def make_wav(path: str, seconds: float, sample_rate: int, channels: int) -> None:
+    rng = np.random.default_rng(0)
+    frames = int(seconds * sample_rate)
+    t = np.arange(frames, dtype=np.float32) / sample_rate
+    signal = 0.3 * np.sin(2 * np.pi * 220 * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 0.5 * t))
+    signal = signal + 0.05 * rng.standard_normal(frames).astype(np.float32)
+    if channels > 1:
+        signal = np.repeat(signal[:, np.newaxis], channels, axis=1)
+    with open(path, "wb") as wav_file:
+        wav_file.write(encode_wav(signal, sample_rate))
+
+
+def legacy_prepare(audio_path: str, chunk_length_ms: int = 20):
+    """The pydub implementation this benchmark replaces."""
+    from pydub import AudioSegment
+    from pydub.utils import make_chunks
+
+    audio = AudioSegment.from_file(audio_path)
+    audio_bytes = audio.export(format="wav").read()
+    audio_base64 = base64.b64encode(audio_bytes).decode("utf-8")
+    volumes = [chunk.rms for chunk in make_chunks(audio, chunk_length_ms)]
+    max_volume = max(volumes)
+    volumes = [volume / max_volume for volume in volumes]
+    return {"audio": audio_base64, "volumes": volumes}, audio.duration_seconds
+
+
+def measure(name: str, func) -> object:
+    func()  # warm up
+    start = time.perf_counter()
+    for _ in range(exec_round):
+        result = func()
+    elapsed = (time.perf_counter() - start) / exec_round
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<28} {elapsed * 1000:10.1f} ms/run   peak {peak / 2**20:8.1f} MiB")
+    return result
+
+
+def run_case(label: str, audio_path: str) -> None:
+    size = os.path.getsize(audio_path) / 2**20
+    print(f"\n### {label} ({size:.1f} MiB)")
+    preparer = AudioPayloadPreparer()
+    payload, duration = measure(
+        "numpy", lambda: preparer.prepare_audio_payload(audio_path=audio_path)
+    )
+    try:
+        import pydub  # noqa: F401
+    except ImportError:
+        print("pydub is not installed, skipping the legacy implementation")
+        return
+    legacy_payload, legacy_duration = measure(
+        "pydub (legacy)", lambda: legacy_prepare(audio_path)
+    )
+    error = np.max(
+        np.abs(np.array(payload["volumes"]) - np.array(legacy_payload["volumes"]))
+    )
+    print(
+        f"duration {duration:.3f}s vs {legacy_duration:.3f}s, "
+        f"{len(payload['volumes'])} volumes, max difference {error:.2e}"
+    )
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as temp_dir:
+        sentence_path = os.path.join(temp_dir, "sentence.wav")
+        make_wav(sentence_path, seconds=4, sample_rate=32000, channels=1)
+        run_case("4 s mono sentence", sentence_path)
+
+        song_path = os.path.join(temp_dir, "song.wav")
+        make_wav(song_path, seconds=20 * 60, sample_rate=44100, channels=2)
+        run_case("20 min stereo song", song_path)
@@ -0,0 +1,422 @@
+"""
+End-to-end latency of the conversation pipeline, without network or GPU.
+
+Runs conversation turns through `OpenLLMVTuberMain.aconversation_chain` with:
+- a scripted LLM that answers after --ttft-ms and streams --tokens-per-second
+- the fakeTTS engine, which answers after --tts-latency-ms, synthesizes --tts-rtf
+  times slower than real time and returns a tone as long as the sentence would be
+- a recording audio output that plays every chunk in real time (--playback-speed)
+  and stops playing when the turn is interrupted, like the frontend does
+
+For every turn it measures:
+- time to first audio: from sending the prompt to the first audio output
+- the gaps between the end of one audio chunk and the start of the next one
+- the total time of the turn
+- for every --interrupt-every th turn, interrupted --interrupt-after-ms after its
+  first audio: the time from the interrupt until the output is silent, and the
+  audio chunks that were still sent after the interrupt
+
+The turns run in --concurrency sessions at once, sharing the TTS engine through
+the model registry like the sessions of the server do. Pipeline settings like
+TTS_STREAMING, TTS_MAX_PARALLEL or FAST_FIRST_CLAUSE come from conf.yaml (--config),
+with --set overrides.
+
+Run from the repository root:
+    PYTHONPATH=. python benchmarks/pipeline_bench.py run --concurrency 1 4 --output base.json
+    PYTHONPATH=. python benchmarks/pipeline_bench.py run --concurrency 1 4 \\
+        --set TTS_STREAMING=true --output streaming.json
+    PYTHONPATH=. python benchmarks/pipeline_bench.py compare base.json streaming.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import re
+import sys
+import time
+from typing import Iterator
+import numpy as np
+import yaml
+
+# main.py imports the __init__.py of the repository root, not the one of this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm.llm_interface import LLMInterface
+from main import OpenLLMVTuberMain
+from tts.tts_factory import TTSFactory
+from utils import model_registry
+
+REPLIES = [
+    "你好呀！今天过得怎么样？有什么想和我聊的吗？",
+    "Thanks for dropping by! I was just thinking about what to play next. "
+    "Maybe a round of Minecraft, or should we try something new today?",
+    "人类，我闻到了你身上散发出来的欧气。今天一定会抽到想要的角色吧！"
+    "不过要记得，抽卡有风险，氪金需谨慎哦。",
+    "Sure, let me explain. First, you collect some wood. Then you build a crafting table. "
+    "After that, you can make tools, and the real adventure begins.",
+]
+PROMPT = "Tell me something."
+
+
+# ==== fakes ====
+
+
+def tokenize(text: str) -> list[str]:
+    """Split a reply into LLM-like tokens: English words, spaces and single characters."""
+    return re.findall(r"[A-Za-z]+|\s+|.", text)
+
+
+class ScriptedLLM(LLMInterface):
+    """Answers with the replies of the script in turn, at a fixed latency and token rate."""
+
+    def __init__(self, ttft_ms: float, tokens_per_second: float, replies: list[str] = REPLIES):
+        self.ttft = ttft_ms / 1000
+        self.token_interval = 1 / tokens_per_second if tokens_per_second > 0 else 0
+        self.replies = replies
+        self.memory: list[dict] = []
+        self.turns = 0
+        self.interrupts = 0
+
+    def chat_iter(self, prompt: str) -> Iterator[str]:
+        self.memory.append({"role": "user", "content": prompt})
+        reply = self.replies[self.turns % len(self.replies)]
+        self.turns += 1
+
+        def _generate_response():
+            time.sleep(self.ttft)
+            for token in tokenize(reply):
+                yield token
+                time.sleep(self.token_interval)
+            self.memory.append({"role": "assistant", "content": reply})
+
+        return _generate_response()
+
+    def handle_interrupt(self, heard_response: str) -> None:
+        self.interrupts += 1
+        self.memory.append({"role": "assistant", "content": heard_response + "..."})
+
+    def get_history(self) -> list[dict]:
+        return list(self.memory)
+
+    def set_history(self, history: list[dict]) -> None:
+        self.memory = list(history)
+
+
+class RecordingSink:
+    """
+    The audio output of one session. Records when every chunk started and stopped
+    playing, and plays it by waiting for its duration.
+    """
+
+    def __init__(self, playback_speed: float):
+        self.playback_speed = playback_speed
+        self.stopped = asyncio.Event()
+        # [start, end, sentence] of every chunk of the current turn, end is None while it plays
+        self.chunks: list[list] = []
+
+    def new_turn(self) -> None:
+        self.stopped.clear()
+        self.chunks = []
+
+    def stop(self) -> None:
+        """Stop playing, like the frontend does when it receives an interrupt."""
+        self.stopped.set()
+
+    async def play(
+        self,
+        sentence: str | None,
+        filepath: str | None,
+        audio: tuple[np.ndarray, int] | None,
+    ) -> None:
+        chunk = [time.perf_counter(), None, sentence or ""]
+        self.chunks.append(chunk)
+        seconds = len(audio[0]) / audio[1] if audio is not None else 0.0
+        if self.playback_speed > 0 and seconds and not self.stopped.is_set():
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self.stopped.wait(), seconds / self.playback_speed)
+        chunk[1] = time.perf_counter()
+
+
+# ==== measurement ====
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    return round(float(np.percentile(values, q)), 4) if values else None
+
+
+def parse_overrides(overrides: list[str]) -> dict:
+    settings = {}
+    for override in overrides:
+        key, _, value = override.partition("=")
+        settings[key] = yaml.safe_load(value)
+    return settings
+
+
+def load_config(args: argparse.Namespace) -> dict:
+    config = {}
+    if args.config and os.path.exists(args.config):
+        with open(args.config, "r", encoding="utf-8") as config_file:
+            config = yaml.safe_load(config_file) or {}
+    config.update(parse_overrides(args.set))
+    # everything the pipeline talks to is simulated
+    config.update(
+        {
+            "LLM_PROVIDER": "fakellm",
+            "TTS_ON": True,
+            "VOICE_INPUT_ON": False,
+            "LIVE2D": False,
+            "TRANSLATE_AUDIO": False,
+            "SAY_SENTENCE_SEPARATELY": True,
+            "VERBOSE": False,
+        }
+    )
+    return config
+
+
+async def run_turn(
+    vtuber: OpenLLMVTuberMain, sink: RecordingSink, interrupt_after: float | None
+) -> dict:
+    sink.new_turn()
+    interrupted_at = None
+
+    async def interrupt_later() -> None:
+        nonlocal interrupted_at
+        while not sink.chunks and not sink.stopped.is_set():
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(interrupt_after)
+        interrupted_at = time.perf_counter()
+        sink.stop()
+        vtuber.interrupt(vtuber.pipeline.heard_sentence)
+
+    interrupter = (
+        asyncio.create_task(interrupt_later()) if interrupt_after is not None else None
+    )
+    start = time.perf_counter()
+    try:
+        await vtuber.aconversation_chain(PROMPT)
+    except InterruptedError:
+        pass
+    end = time.perf_counter()
+    if interrupter is not None and not interrupter.done():
+        # the turn ended before it could be interrupted
+        interrupter.cancel()
+
+    chunks = sink.chunks
+    turn = {
+        "first_audio": chunks[0][0] - start if chunks else None,
+        "gaps": [max(0.0, b[0] - a[1]) for a, b in zip(chunks, chunks[1:])],
+        "total": end - start,
+        "chunks": len(chunks),
+    }
+    if interrupted_at is not None:
+        last_sound = max((chunk[1] for chunk in chunks), default=interrupted_at)
+        turn["interrupt_to_silence"] = max(0.0, last_sound - interrupted_at)
+        turn["interrupt_to_turn_end"] = end - interrupted_at
+        turn["chunks_after_interrupt"] = sum(chunk[0] > interrupted_at for chunk in chunks)
+        # only the turns that were not interrupted say how long a whole turn takes
+        turn["gaps"] = []
+    return turn
+
+
+async def run_session(
+    vtuber: OpenLLMVTuberMain, sink: RecordingSink, args: argparse.Namespace
+) -> list[dict]:
+    turns = []
+    for index in range(args.turns):
+        interrupted = args.interrupt_every and (index + 1) % args.interrupt_every == 0
+        turns.append(
+            await run_turn(
+                vtuber, sink, args.interrupt_after_ms / 1000 if interrupted else None
+            )
+        )
+    await vtuber.pipeline.close()
+    return turns
+
+
+def summarize(turns: list[dict], wall_seconds: float) -> dict:
+    complete = [turn for turn in turns if "interrupt_to_silence" not in turn]
+    interrupted = [turn for turn in turns if "interrupt_to_silence" in turn]
+    first_audio = [turn["first_audio"] for turn in turns if turn["first_audio"] is not None]
+    gaps = [gap for turn in complete for gap in turn["gaps"]]
+    totals = [turn["total"] for turn in complete]
+    silences = [turn["interrupt_to_silence"] for turn in interrupted]
+    turn_ends = [turn["interrupt_to_turn_end"] for turn in interrupted]
+    return {
+        "turns": len(turns),
+        "interrupted_turns": len(interrupted),
+        "first_audio_p50": percentile(first_audio, 50),
+        "first_audio_p95": percentile(first_audio, 95),
+        "gap_p50": percentile(gaps, 50),
+        "gap_p95": percentile(gaps, 95),
+        "gap_max": round(max(gaps), 4) if gaps else None,
+        "turn_p50": percentile(totals, 50),
+        "turn_p95": percentile(totals, 95),
+        "interrupt_to_silence_p50": percentile(silences, 50),
+        "interrupt_to_silence_p95": percentile(silences, 95),
+        "interrupt_to_turn_end_p95": percentile(turn_ends, 95),
+        "chunks_after_interrupt": sum(turn["chunks_after_interrupt"] for turn in interrupted),
+        "wall_seconds": round(wall_seconds, 3),
+    }
+
+
+async def run_level(config: dict, args: argparse.Namespace, concurrency: int) -> dict:
+    tts_config = {"latency_ms": args.tts_latency_ms, "rtf": args.tts_rtf}
+    tts = model_registry.registry.acquire(
+        "tts",
+        "fakeTTS",
+        tts_config,
+        lambda: TTSFactory.get_tts_engine("fakeTTS", **tts_config),
+        max_concurrency=args.tts_slots,
+    )
+    try:
+        sessions = []
+        for _ in range(concurrency):
+            vtuber = await asyncio.to_thread(OpenLLMVTuberMain, config, custom_tts=tts)
+            vtuber.llm = ScriptedLLM(args.ttft_ms, args.tokens_per_second)
+            sink = RecordingSink(args.playback_speed)
+            vtuber.set_async_audio_output_func(sink.play)
+            sessions.append((vtuber, sink))
+
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(run_session(vtuber, sink, args) for vtuber, sink in sessions)
+        )
+        wall_seconds = time.perf_counter() - start
+    finally:
+        tts.release()
+    turns = [turn for session in results for turn in session]
+    return {"concurrency": concurrency, "summary": summarize(turns, wall_seconds), "turns": turns}
+
+
+def run(args: argparse.Namespace) -> dict:
+    config = load_config(args)
+    levels = []
+    for concurrency in args.concurrency:
+        print(f"\n### concurrency {concurrency}")
+        # the pipeline prints every token of the LLM
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with output:
+            level = asyncio.run(run_level(config, args, concurrency))
+        levels.append(level)
+        for metric, value in level["summary"].items():
+            print(f"{metric:<26} {value}")
+    return {
+        "settings": {
+            key: config.get(key)
+            for key in (
+                "TTS_STREAMING",
+                "TTS_STREAM_CHUNK_MS",
+                "TTS_MAX_PARALLEL",
+                "FAST_FIRST_CLAUSE",
+                "FIRST_CLAUSE_MIN_CHARS",
+                "FIRST_CLAUSE_MAX_CHARS",
+            )
+        },
+        "simulation": {
+            "ttft_ms": args.ttft_ms,
+            "tokens_per_second": args.tokens_per_second,
+            "tts_latency_ms": args.tts_latency_ms,
+            "tts_rtf": args.tts_rtf,
+            "tts_slots": args.tts_slots,
+            "playback_speed": args.playback_speed,
+            "turns": args.turns,
+            "interrupt_every": args.interrupt_every,
+            "interrupt_after_ms": args.interrupt_after_ms,
+        },
+        "levels": levels,
+    }
+
+
+# ==== reports ====
+
+# metric, lower is better
+METRICS = [
+    ("first_audio_p50", True),
+    ("first_audio_p95", True),
+    ("gap_p50", True),
+    ("gap_p95", True),
+    ("gap_max", True),
+    ("turn_p50", True),
+    ("turn_p95", True),
+    ("interrupt_to_silence_p50", True),
+    ("interrupt_to_silence_p95", True),
+    ("interrupt_to_turn_end_p95", True),
+    ("chunks_after_interrupt", True),
+]
+
+
+def compare(baseline: dict, candidate: dict) -> None:
+    candidate_levels = {level["concurrency"]: level for level in candidate["levels"]}
+    for level in baseline["levels"]:
+        other = candidate_levels.get(level["concurrency"])
+        if other is None:
+            continue
+        print(f"\n### concurrency {level['concurrency']}")
+        print(f"{'metric':<26} {'baseline':>10} {'candidate':>10} {'change':>9}")
+        for metric, lower_is_better in METRICS:
+            old, new = level["summary"].get(metric), other["summary"].get(metric)
+            if old is None or new is None:
+                print(f"{metric:<26} {str(old):>10} {str(new):>10}")
+                continue
+            change = (new - old) / old * 100 if old else 0.0
+            better = (change < 0) == lower_is_better if change else None
+            mark = {True: "better", False: "worse", None: ""}[better]
+            print(f"{metric:<26} {old:>10} {new:>10} {change:>+8.1f}% {mark}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmark")
+    run_parser.add_argument("--config", default="conf.yaml", help="pipeline settings")
+    run_parser.add_argument(
+        "--set", action="append", default=[], metavar="KEY=VALUE", help="override a setting"
+    )
+    run_parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1], help="sessions at the same time"
+    )
+    run_parser.add_argument("--turns", type=int, default=8, help="turns of every session")
+    run_parser.add_argument("--ttft-ms", type=float, default=300, help="LLM time to first token")
+    run_parser.add_argument("--tokens-per-second", type=float, default=40)
+    run_parser.add_argument("--tts-latency-ms", type=float, default=150)
+    run_parser.add_argument("--tts-rtf", type=float, default=0.2)
+    run_parser.add_argument(
+        "--tts-slots", type=int, default=4, help="sentences the shared TTS synthesizes at once"
+    )
+    run_parser.add_argument(
+        "--playback-speed", type=float, default=1.0,
+        help="how much faster than real time the audio is played, 0 to not wait",
+    )
+    run_parser.add_argument(
+        "--interrupt-every", type=int, default=4, help="interrupt every N th turn, 0 never"
+    )
+    run_parser.add_argument("--interrupt-after-ms", type=float, default=500)
+    run_parser.add_argument("--verbose", action="store_true", help="show the pipeline output")
+    run_parser.add_argument("--output", help="write the results to this JSON file")
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        with open(args.candidate, "r", encoding="utf-8") as candidate_file:
+            candidate = json.load(candidate_file)
+        compare(baseline, candidate)
+        return
+
+    result = run(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(result, output, ensure_ascii=False, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""
+Latency and speed of the TTS engines of `TTSFactory` on a fixed multilingual corpus.
+
+For every sentence it measures:
+- time to first audio: until the first PCM chunk of `stream_pcm` arrives
+  (the whole synthesis for engines that do not stream)
+- total synthesis time, the duration of the audio and the real-time factor
+- the size of the output: PCM bytes with --mode stream, encoded bytes of
+  `generate_audio_bytes` with --mode bytes
+
+Sentences are synthesized by --concurrency threads at once, like the
+conversation pipeline does with TTS_MAX_PARALLEL.
+
+The HTTP engines (GPT_Sovits, xTTS, cosyvoiceTTS) can be measured against a
+local stand-in server (--stand-in) instead of a real model. It answers after
+--stand-in-delay-ms and produces audio --stand-in-rtf times slower than real
+time (GPT_Sovits streams it), so the numbers show the overhead of the client
+side: HTTP, decoding, threading. cosyvoiceTTS talks to gradio through
+gradio_client, whose protocol the stand-in does not speak; its client is
+replaced by one that fetches the audio from the stand-in server.
+
+Run from the repository root:
+    PYTHONPATH=. python benchmarks/tts_bench.py --engine edgeTTS --concurrency 4
+    PYTHONPATH=. python benchmarks/tts_bench.py --engine GPT_Sovits --engine xTTS \\
+        --engine cosyvoiceTTS --stand-in --stand-in-delay-ms 300 --output tts.json
+
+The settings of an engine are its section in conf.yaml (--config), with --set overrides.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+import yaml
+
+from tts.audio_buffer import decode_audio_bytes, encode_wav
+from tts.tts_factory import TTSFactory
+
+CORPUS = [
+    ("zh", "你好。"),
+    ("zh", "谢谢大家的礼物，今天的直播就到这里啦！"),
+    ("zh", "人类，我闻到了你身上散发出来的欧气，今天一定会抽到想要的角色吧。"),
+    ("en", "Hello there!"),
+    ("en", "Thanks for the super chat, that really made my day."),
+    ("en", "The quick brown fox jumps over the lazy dog, and then it takes a long nap in the sun."),
+    ("ja", "こんにちは、今日もよろしくお願いします。"),
+    ("mixed", "今天我们来玩 Minecraft，先去 collect some wood 吧。"),
+]
+STAND_IN_ENGINES = {"GPT_Sovits", "xTTS", "cosyvoiceTTS"}
+STAND_IN_SAMPLE_RATE = 32000
+
+
+# ==== stand-in server ====
+
+
+def stand_in_audio(text: str) -> np.ndarray:
+    """A tone of about the length the sentence would take to speak."""
+    seconds = max(0.5, 0.15 * len(text))
+    t = np.arange(int(seconds * STAND_IN_SAMPLE_RATE), dtype=np.float32) / STAND_IN_SAMPLE_RATE
+    return 0.3 * np.sin(2 * np.pi * 220 * t)
+
+
+class StandInServer:
+    """
+    A local HTTP server standing in for a TTS server.
+
+    GET with a "text" query parameter (GPT_Sovits) streams a WAV file: the header
+    after `delay`, then the audio as fast as `rtf` allows. POST with a JSON body
+    containing "text" (xTTS) returns the whole file once it is "synthesized".
+    """
+
+    def __init__(self, delay_ms: float, rtf: float, chunk_ms: float = 200):
+        self.delay = delay_ms / 1000
+        self.rtf = rtf
+        self.chunk_ms = chunk_ms
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.0"
+
+            def do_GET(self):
+                text = parse_qs(urlparse(self.path).query).get("text", [""])[0]
+                server.stream(self, text)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                server.respond(self, json.loads(body or b"{}").get("text", ""))
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def stream(self, handler: BaseHTTPRequestHandler, text: str) -> None:
+        audio = encode_wav(stand_in_audio(text), STAND_IN_SAMPLE_RATE)
+        time.sleep(self.delay)
+        handler.send_response(200)
+        handler.send_header("Content-Type", "audio/wav")
+        handler.end_headers()
+        handler.wfile.write(audio[:44])
+        chunk_bytes = int(STAND_IN_SAMPLE_RATE * self.chunk_ms / 1000) * 2
+        for offset in range(44, len(audio), chunk_bytes):
+            time.sleep(self.chunk_ms / 1000 * self.rtf)
+            handler.wfile.write(audio[offset : offset + chunk_bytes])
+            handler.wfile.flush()
+
+    def respond(self, handler: BaseHTTPRequestHandler, text: str) -> None:
+        samples = stand_in_audio(text)
+        time.sleep(self.delay + len(samples) / STAND_IN_SAMPLE_RATE * self.rtf)
+        audio = encode_wav(samples, STAND_IN_SAMPLE_RATE)
+        handler.send_response(200)
+        handler.send_header("Content-Type", "audio/wav")
+        handler.send_header("Content-Length", str(len(audio)))
+        handler.end_headers()
+        handler.wfile.write(audio)
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+
+
+class StandInGradioClient:
+    """Stands in for the gradio_client.Client of cosyvoiceTTS: `predict` returns a wav file path."""
+
+    def __init__(self, server: StandInServer):
+        self.server = server
+
+    def predict(self, tts_text: str, **kwargs) -> str:
+        import requests
+
+        response = requests.post(f"{self.server.url}/generate_audio", json={"text": tts_text})
+        response.raise_for_status()
+        file_descriptor, path = tempfile.mkstemp(suffix=".wav")
+        with os.fdopen(file_descriptor, "wb") as wav_file:
+            wav_file.write(response.content)
+        return path
+
+
+def create_engine(name: str, settings: dict, stand_in: StandInServer | None):
+    if stand_in is None or name not in STAND_IN_ENGINES:
+        return TTSFactory.get_tts_engine(name, **settings)
+    if name == "GPT_Sovits":
+        return TTSFactory.get_tts_engine(
+            name, **{**settings, "api_url": f"{stand_in.url}/tts", "media_type": "wav"}
+        )
+    if name == "xTTS":
+        return TTSFactory.get_tts_engine(
+            name, **{**settings, "api_url": f"{stand_in.url}/tts_to_audio"}
+        )
+    # cosyvoiceTTS connects to gradio in __init__, so it is built without it
+    from tts.cosyvoiceTTS import TTSEngine as CosyvoiceTTSEngine
+
+    engine = CosyvoiceTTSEngine.__new__(CosyvoiceTTSEngine)
+    engine.__dict__.update(settings)
+    engine.prompt_wav_upload = engine.prompt_wav_record = None
+    engine.api_name = settings.get("api_name", "/generate_audio")
+    engine.client = StandInGradioClient(stand_in)
+    return engine
+
+
+# ==== measurement ====
+
+
+def synthesize(engine, language: str, text: str, mode: str) -> dict:
+    start = time.perf_counter()
+    first_audio = None
+    frames = 0
+    output_bytes = 0
+    sample_rate = None
+    if mode == "stream":
+        for samples, sample_rate in engine.stream_pcm(text):
+            if first_audio is None:
+                first_audio = time.perf_counter() - start
+            frames += len(samples)
+            output_bytes += samples.nbytes
+    else:
+        audio = engine.generate_audio_bytes(text)
+        first_audio = time.perf_counter() - start
+        if audio:
+            samples, sample_rate = decode_audio_bytes(audio)
+            frames = len(samples)
+            output_bytes = len(audio)
+    total = time.perf_counter() - start
+    audio_seconds = frames / sample_rate if sample_rate else 0.0
+    return {
+        "language": language,
+        "text": text,
+        "time_to_first_audio": first_audio,
+        "total_seconds": total,
+        "audio_seconds": audio_seconds,
+        "rtf": total / audio_seconds if audio_seconds else None,
+        "output_bytes": output_bytes,
+        "sample_rate": sample_rate,
+    }
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    return round(float(np.percentile(values, q)), 4) if values else None
+
+
+def run_engine(name: str, settings: dict, args, stand_in: StandInServer | None) -> dict:
+    start = time.perf_counter()
+    engine = create_engine(name, settings, stand_in)
+    load_seconds = time.perf_counter() - start
+
+    concurrency = args.concurrency
+    if concurrency > 1 and not getattr(engine, "supports_concurrent_requests", False):
+        print(f"{name} does not support concurrent requests, the pipeline runs it one at a time")
+
+    # one warm-up sentence, not counted
+    synthesize(engine, *CORPUS[0], args.mode)
+
+    jobs = [sentence for _ in range(args.repeat) for sentence in CORPUS]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda job: synthesize(engine, *job, args.mode), jobs))
+    wall_seconds = time.perf_counter() - start
+
+    for result in results:
+        first = result["time_to_first_audio"]
+        first = "-" if first is None else f"{first:.3f}"
+        print(
+            f"  {result['language']:<6} first audio {first:>6}s"
+            f"  total {result['total_seconds']:6.3f}s  audio {result['audio_seconds']:6.2f}s"
+            f"  {result['text'][:30]}"
+        )
+
+    ok = [result for result in results if result["audio_seconds"] > 0]
+    first_audio = [result["time_to_first_audio"] for result in ok]
+    totals = [result["total_seconds"] for result in ok]
+    audio_seconds = sum(result["audio_seconds"] for result in ok)
+    summary = {
+        "sentences": len(results),
+        "failed": len(results) - len(ok),
+        "load_seconds": round(load_seconds, 3),
+        "first_audio_p50": percentile(first_audio, 50),
+        "first_audio_p95": percentile(first_audio, 95),
+        "total_p50": percentile(totals, 50),
+        "total_p95": percentile(totals, 95),
+        "rtf": round(sum(totals) / audio_seconds, 4) if audio_seconds else None,
+        "audio_seconds": round(audio_seconds, 2),
+        "output_bytes": sum(result["output_bytes"] for result in ok),
+        "wall_seconds": round(wall_seconds, 3),
+        # seconds of audio produced per second, with all threads
+        "throughput": round(audio_seconds / wall_seconds, 3) if wall_seconds else None,
+    }
+    return {
+        "engine": name,
+        "settings": settings,
+        "stand_in": stand_in is not None and name in STAND_IN_ENGINES,
+        "summary": summary,
+        "sentences": results,
+    }
+
+
+def parse_overrides(overrides: list[str]) -> dict:
+    settings = {}
+    for override in overrides:
+        key, _, value = override.partition("=")
+        settings[key] = yaml.safe_load(value)
+    return settings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--engine", action="append", required=True, help="a TTS_MODEL name")
+    parser.add_argument("--config", default="conf.yaml", help="settings of the engines")
+    parser.add_argument(
+        "--set", action="append", default=[], metavar="KEY=VALUE",
+        help="override a setting of every engine",
+    )
+    parser.add_argument("--mode", choices=["stream", "bytes"], default="stream")
+    parser.add_argument("--concurrency", type=int, default=1, help="sentences at the same time")
+    parser.add_argument("--repeat", type=int, default=1, help="passes over the corpus")
+    parser.add_argument("--stand-in", action="store_true", help="use a local stand-in server")
+    parser.add_argument("--stand-in-delay-ms", type=float, default=200)
+    parser.add_argument("--stand-in-rtf", type=float, default=0.3)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    config = {}
+    if os.path.exists(args.config):
+        with open(args.config, "r", encoding="utf-8") as config_file:
+            config = yaml.safe_load(config_file) or {}
+    stand_in = (
+        StandInServer(args.stand_in_delay_ms, args.stand_in_rtf) if args.stand_in else None
+    )
+
+    results = []
+    try:
+        for name in args.engine:
+            settings = {**(config.get(name) or {}), **parse_overrides(args.set)}
+            print(f"\n### {name}, concurrency {args.concurrency}, mode {args.mode}")
+            try:
+                result = run_engine(name, settings, args, stand_in)
+            except Exception as e:
+                print(f"{name} failed: {e}", file=sys.stderr)
+                continue
+            results.append(result)
+            for metric, value in result["summary"].items():
+                print(f"{metric:<16} {value}")
+    finally:
+        if stand_in is not None:
+            stand_in.close()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(
+                {"concurrency": args.concurrency, "mode": args.mode, "engines": results},
+                output,
+                ensure_ascii=False,
+                indent=2,
+            )
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Throughput of the Silero VAD with many concurrent mic streams.
+
+Compares one `VAD` per stream, each running its 50 ms chunks one ONNX call at a
+time, with `VADService.run_batch`, which runs one chunk of every stream in a
+single call on the shared session. Also runs the threaded `VADService` the
+server uses, with one thread per stream.
+
+Run from the repository root:
+    PYTHONPATH=. python benchmarks/vad_bench.py [path/to/silero_vad.onnx]
+"""
+
+import os
+import sys
+import threading
+import time
+import numpy as np
+
+from asr.vad import VAD, VADService
+
+SAMPLE_RATE = 16000
+CHUNK = SAMPLE_RATE * 50 // 1000
+SECONDS = 10
+STREAM_COUNTS = [1, 8, 32, 128]
+THREAD_SETTINGS = [(1, 1), (4, 1)]
+
+model_path = sys.argv[1] if len(sys.argv) > 1 else "asr/models/silero_vad.onnx"
+if not os.path.exists(model_path):
+    # the browser VAD ships the same model
+    model_path = "static/libs/silero_vad.onnx"
+
+
+def make_streams(count: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return (0.1 * rng.standard_normal((count, SECONDS * SAMPLE_RATE))).astype(np.float32)
+
+
+def report(name: str, streams: int, elapsed: float) -> None:
+    chunks = streams * SECONDS * SAMPLE_RATE // CHUNK
+    audio_seconds = streams * SECONDS
+    print(
+        f"{name:<32} {streams:4d} streams  {chunks / elapsed:10.0f} chunks/s"
+        f"  {audio_seconds / elapsed:8.1f}x realtime"
+    )
+
+
+def bench_per_stream(audio: np.ndarray, threads: tuple[int, int]) -> float:
+    vads = [VAD(model_path, intra_op_threads=threads[0], inter_op_threads=threads[1]) for _ in audio]
+    start = time.perf_counter()
+    for offset in range(0, audio.shape[1] - CHUNK + 1, CHUNK):
+        for vad, stream in zip(vads, audio):
+            vad.process_chunk(stream[offset : offset + CHUNK])
+    return time.perf_counter() - start
+
+
+def bench_batched(audio: np.ndarray, threads: tuple[int, int]) -> float:
+    service = VADService(model_path, intra_op_threads=threads[0], inter_op_threads=threads[1])
+    streams = [service.create_stream() for _ in audio]
+    start = time.perf_counter()
+    for offset in range(0, audio.shape[1] - CHUNK + 1, CHUNK):
+        service.run_batch(
+            [(stream, samples[offset : offset + CHUNK]) for stream, samples in zip(streams, audio)]
+        )
+    return time.perf_counter() - start
+
+
+def bench_service(audio: np.ndarray, threads: tuple[int, int]) -> float:
+    service = VADService(model_path, intra_op_threads=threads[0], inter_op_threads=threads[1])
+
+    def run_stream(samples: np.ndarray) -> None:
+        stream = service.create_stream()
+        for offset in range(0, len(samples) - CHUNK + 1, CHUNK):
+            stream.process_chunk(samples[offset : offset + CHUNK])
+
+    workers = [threading.Thread(target=run_stream, args=(samples,)) for samples in audio]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    service.close()
+    print(f"    average batch: {service.chunks / max(service.batches, 1):.1f} chunks")
+    return elapsed
+
+
+if __name__ == "__main__":
+    print(f"Model: {model_path}, {SECONDS}s of audio per stream, {CHUNK} samples per chunk")
+    for threads in THREAD_SETTINGS:
+        print(f"\n### intra_op_threads={threads[0]}, inter_op_threads={threads[1]}")
+        for count in STREAM_COUNTS:
+            audio = make_streams(count)
+            report("one session call per chunk", count, bench_per_stream(audio, threads))
+            report("batched run_batch", count, bench_batched(audio, threads))
+            report("VADService (thread per stream)", count, bench_service(audio, threads))
@@ -0,0 +1,507 @@
+"""
+Load test of the /client-ws endpoint of server.py.
+
+Opens --sessions WebSocket sessions at once, and every session replays the
+messages of a client: recorded sessions (--replay, written by the server with
+SESSION_RECORDING enabled, see utils/session_recording.py) or a synthetic
+session of text inputs with interrupts. The messages are sent with their
+original timing, or --speed times faster.
+
+Client-observed, per turn (a text-input or mic-audio-end):
+- time until the server acknowledges the input, until the conversation chain
+  starts, until the first audio arrives and until the chain ends
+- the gaps between the end of one audio payload and the arrival of the next one
+- for interrupted turns, the time from the interrupt to the last audio received
+  and the audio that still arrived after it
+- the time until a config switch is confirmed
+Dropped: turns that were never answered, config switches never confirmed,
+error messages and sessions that failed or were closed by the server.
+
+Server-side, from the /metrics endpoint before and after the run: the pipeline
+latency histograms and the lag of the event loop of the server. The lag of the
+event loop of this tool is reported too, it must stay low for the numbers to count.
+
+Start the server with the fake engines, so the test needs no model, GPU or network:
+    LLM_PROVIDER: "fakellm" (with TTFT_MS and TOKENS_PER_SECOND in its section)
+    TTS_MODEL: "fakeTTS"
+    VOICE_INPUT_ON: False (recordings with mic audio need a real ASR)
+
+Run from the repository root:
+    PYTHONPATH=. python benchmarks/ws_load.py --sessions 1 10 50 --output load.json
+    PYTHONPATH=. python benchmarks/ws_load.py --replay recordings/a.jsonl recordings/b.jsonl \\
+        --speed 2 --sessions 20
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import time
+import aiohttp
+import numpy as np
+
+from utils import ws_protocol
+from utils.session_recording import load_session
+
+ACK_TEXT = "思考中..."
+STATUS_CONTROLS = {"conversation-chain-start", "conversation-chain-end"}
+
+
+# ==== sessions ====
+
+
+def synthetic_session(
+    turns: int, interval: float, interrupt_every: int, interrupt_after: float, binary: bool
+) -> list[dict]:
+    """The messages of a client that types --turns inputs and interrupts some replies."""
+    hello = {"type": "hello", "binary_audio": ws_protocol.PROTOCOL_VERSION if binary else None}
+    messages = [{"t": 0.0, "text": json.dumps(hello)}]
+    for index in range(turns):
+        t = 0.5 + index * interval
+        text_input = {"type": "text-input", "text": f"Tell me something ({index + 1})."}
+        messages.append({"t": t, "text": json.dumps(text_input)})
+        if interrupt_every and (index + 1) % interrupt_every == 0:
+            interrupt = {"type": "interrupt-signal", "text": ""}
+            messages.append({"t": t + interrupt_after, "text": json.dumps(interrupt)})
+    return messages
+
+
+class SessionStats:
+    """What one session observed. The times are `time.perf_counter()` values."""
+
+    def __init__(self) -> None:
+        self.opened_at: float | None = None
+        self.connected_at: float | None = None
+        self.ready_at: float | None = None
+        self.turns: list[dict] = []
+        self.switches: list[dict] = []
+        self.errors: list[str] = []
+        self.failure: str | None = None
+        self.closed_by_server = False
+        self.audio_messages = 0
+        self.audio_bytes = 0
+
+    def current_turn(self) -> dict | None:
+        """The turn the audio that arrives now belongs to: the last one that has started."""
+        for turn in reversed(self.turns):
+            if turn["started"] is not None:
+                return turn
+        return None
+
+    def sent(self, message: dict, now: float) -> None:
+        if "text" not in message:
+            return
+        try:
+            kind = json.loads(message["text"]).get("type")
+        except (ValueError, AttributeError):
+            return
+        if kind in ("text-input", "mic-audio-end"):
+            self.turns.append(
+                {
+                    "sent": now,
+                    "ack": None,
+                    "started": None,
+                    "audio": [],  # (arrival, duration)
+                    "ended": None,
+                    "interrupted": None,
+                    "late_audio": 0,
+                }
+            )
+        elif kind == "interrupt-signal":
+            turn = next(
+                (turn for turn in reversed(self.turns) if turn["ended"] is None), None
+            )
+            if turn is not None and turn["interrupted"] is None:
+                turn["interrupted"] = now
+        elif kind == "switch-config":
+            self.switches.append({"sent": now, "done": None})
+
+    def received(self, message: aiohttp.WSMessage, now: float) -> None:
+        if message.type == aiohttp.WSMsgType.BINARY:
+            try:
+                _, header, payload = ws_protocol.decode_frame(message.data)
+            except ws_protocol.ProtocolError as e:
+                self.errors.append(str(e))
+                return
+            self._audio(header, len(payload), now)
+            return
+        data = json.loads(message.data)
+        kind = data.get("type")
+        if kind == "audio":
+            self._audio(data, len(data.get("audio") or ""), now)
+        elif kind == "full-text" and data.get("text") == ACK_TEXT:
+            self._first(lambda turn: turn["ack"] is None, "ack", now)
+        elif kind == "control" and data.get("text") == "start-mic":
+            self.ready_at = self.ready_at or now
+        elif kind == "control" and data.get("text") in STATUS_CONTROLS:
+            if data["text"] == "conversation-chain-start":
+                self._first(lambda turn: turn["started"] is None, "started", now)
+            else:
+                self._first(
+                    lambda turn: turn["started"] is not None and turn["ended"] is None,
+                    "ended",
+                    now,
+                )
+        elif kind == "config-switched":
+            self._switch_done(now)
+        elif kind == "error":
+            self.errors.append(data.get("message") or data.get("text") or "error")
+            if self.switches and self.switches[-1]["done"] is None:
+                self._switch_done(now)
+
+    def _first(self, condition, key: str, now: float) -> None:
+        for turn in self.turns:
+            if condition(turn):
+                turn[key] = now
+                return
+
+    def _switch_done(self, now: float) -> None:
+        for switch in self.switches:
+            if switch["done"] is None:
+                switch["done"] = now
+                return
+
+    def _audio(self, header: dict, size: int, now: float) -> None:
+        self.audio_messages += 1
+        self.audio_bytes += size
+        duration = len(header.get("volumes") or []) * header.get("slice_length", 20) / 1000
+        turn = self.current_turn()
+        if turn is None:
+            return
+        if turn["interrupted"] is not None and now > turn["interrupted"]:
+            turn["late_audio"] += 1
+        turn["audio"].append((now, duration))
+
+
+async def run_session(
+    http: aiohttp.ClientSession,
+    url: str,
+    messages: list[dict],
+    speed: float,
+    drain_timeout: float,
+    ready_timeout: float,
+) -> SessionStats:
+    stats = SessionStats()
+    stats.opened_at = time.perf_counter()
+    try:
+        async with http.ws_connect(url, max_msg_size=0, heartbeat=None) as ws:
+            stats.connected_at = time.perf_counter()
+            closing = False
+
+            async def receive() -> None:
+                async for message in ws:
+                    if message.type in (aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY):
+                        stats.received(message, time.perf_counter())
+                stats.closed_by_server = not closing
+
+            receiver = asyncio.create_task(receive())
+            # the server creates the session, and waits for preloading models, before start-mic
+            deadline = time.perf_counter() + ready_timeout
+            while stats.ready_at is None and not receiver.done():
+                if time.perf_counter() > deadline:
+                    raise TimeoutError("The session did not become ready.")
+                await asyncio.sleep(0.01)
+
+            started = time.perf_counter()
+            for message in messages:
+                delay = started + message["t"] / speed - time.perf_counter() if speed > 0 else 0
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if receiver.done():
+                    break
+                if "bytes" in message:
+                    await ws.send_bytes(message["bytes"])
+                else:
+                    await ws.send_str(message["text"])
+                stats.sent(message, time.perf_counter())
+
+            # wait for the replies to the last inputs
+            deadline = time.perf_counter() + drain_timeout
+            while time.perf_counter() < deadline and not receiver.done():
+                if all(
+                    turn["ended"] is not None or turn["interrupted"] is not None
+                    for turn in stats.turns
+                ) and all(switch["done"] is not None for switch in stats.switches):
+                    break
+                await asyncio.sleep(0.05)
+            closing = True
+            await ws.close()
+            await receiver
+    except Exception as e:
+        stats.failure = f"{type(e).__name__}: {e}"
+    return stats
+
+
+# ==== event loop lag ====
+
+
+async def measure_loop_lag(lags: list[float], interval: float = 0.05) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - start - interval))
+
+
+# ==== server metrics ====
+
+_SAMPLE = re.compile(r"^(\w+?)(_bucket|_sum|_count)(?:\{(.*)\})? (\S+)$")
+
+
+def parse_metrics(text: str) -> dict:
+    """
+    Parse the histograms of /metrics.
+
+    Returns:
+        dict: (name, labels) -> {"buckets": {le: cumulative count}, "sum": ..., "count": ...}
+    """
+    histograms = {}
+    for line in text.splitlines():
+        match = _SAMPLE.match(line)
+        if not match:
+            continue
+        name, suffix, labels, value = match.groups()
+        label_pairs = re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', labels or "")
+        le = next((value for key, value in label_pairs if key == "le"), None)
+        key = (name, ",".join(f"{k}={v}" for k, v in label_pairs if k != "le"))
+        histogram = histograms.setdefault(key, {"buckets": {}, "sum": 0.0, "count": 0})
+        if suffix == "_bucket":
+            histogram["buckets"][le] = float(value)
+        else:
+            histogram[suffix[1:]] = float(value)
+    return histograms
+
+
+def histogram_quantile(buckets: dict[str, float], count: float, q: float) -> float | None:
+    """The upper bound of the bucket that holds the q quantile, like Prometheus without interpolation."""
+    if not count:
+        return None
+    for le, cumulative in sorted(buckets.items(), key=lambda item: float(item[0])):
+        if cumulative >= q * count:
+            return float(le)
+    return None
+
+
+def diff_metrics(before: dict, after: dict) -> dict:
+    """What the server observed during the run: the difference of two scrapes."""
+    summary = {}
+    for key, histogram in after.items():
+        previous = before.get(key, {"buckets": {}, "sum": 0.0, "count": 0})
+        count = histogram["count"] - previous["count"]
+        if count <= 0:
+            continue
+        buckets = {
+            le: cumulative - previous["buckets"].get(le, 0.0)
+            for le, cumulative in histogram["buckets"].items()
+        }
+        name = key[0] + (f"{{{key[1]}}}" if key[1] else "")
+        summary[name] = {
+            "count": int(count),
+            "mean": round((histogram["sum"] - previous["sum"]) / count, 4),
+            "p50": histogram_quantile(buckets, count, 0.5),
+            "p95": histogram_quantile(buckets, count, 0.95),
+            "p99": histogram_quantile(buckets, count, 0.99),
+        }
+    return summary
+
+
+async def fetch_metrics(http: aiohttp.ClientSession, base_url: str) -> dict | None:
+    try:
+        async with http.get(f"{base_url}/metrics") as response:
+            return parse_metrics(await response.text())
+    except aiohttp.ClientError:
+        return None
+
+
+async def wait_until_ready(http: aiohttp.ClientSession, base_url: str, timeout: float) -> None:
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            async with http.get(f"{base_url}/ready") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        if time.perf_counter() > deadline:
+            raise SystemExit(f"The server at {base_url} is not ready.")
+        await asyncio.sleep(0.5)
+
+
+# ==== report ====
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    return round(float(np.percentile(values, q)), 4) if values else None
+
+
+def summarize(sessions: list[SessionStats], wall_seconds: float) -> dict:
+    connected = [stats for stats in sessions if stats.connected_at is not None]
+    ready = [stats for stats in connected if stats.ready_at is not None]
+    turns = [turn for stats in sessions for turn in stats.turns]
+    complete = [turn for turn in turns if turn["interrupted"] is None]
+    interrupted = [turn for turn in turns if turn["interrupted"] is not None]
+
+    def latencies(key: str, of: list[dict]) -> list[float]:
+        return [turn[key] - turn["sent"] for turn in of if turn[key] is not None]
+
+    first_audio = [turn["audio"][0][0] - turn["sent"] for turn in complete if turn["audio"]]
+    gaps = [
+        max(0.0, later[0] - (earlier[0] + earlier[1]))
+        for turn in complete
+        for earlier, later in zip(turn["audio"], turn["audio"][1:])
+    ]
+    silences = [
+        max([arrival for arrival, _ in turn["audio"]] + [turn["interrupted"]]) - turn["interrupted"]
+        for turn in interrupted
+    ]
+    switches = [switch for stats in sessions for switch in stats.switches]
+    return {
+        "sessions": len(sessions),
+        "failed_sessions": sum(stats.failure is not None for stats in sessions),
+        "closed_by_server": sum(stats.closed_by_server for stats in sessions),
+        "connect_p95": percentile([s.connected_at - s.opened_at for s in connected], 95),
+        "session_ready_p95": percentile([s.ready_at - s.opened_at for s in ready], 95),
+        "turns": len(turns),
+        "interrupted_turns": len(interrupted),
+        "ack_p50": percentile(latencies("ack", turns), 50),
+        "ack_p95": percentile(latencies("ack", turns), 95),
+        "chain_start_p95": percentile(latencies("started", turns), 95),
+        "first_audio_p50": percentile(first_audio, 50),
+        "first_audio_p95": percentile(first_audio, 95),
+        "first_audio_p99": percentile(first_audio, 99),
+        "gap_p95": percentile(gaps, 95),
+        "turn_p50": percentile(latencies("ended", complete), 50),
+        "turn_p95": percentile(latencies("ended", complete), 95),
+        "interrupt_to_silence_p95": percentile(silences, 95),
+        "audio_after_interrupt": sum(turn["late_audio"] for turn in interrupted),
+        "switch_p95": percentile(
+            [s["done"] - s["sent"] for s in switches if s["done"] is not None], 95
+        ),
+        "dropped_turns": sum(turn["ended"] is None for turn in complete),
+        "dropped_switches": sum(switch["done"] is None for switch in switches),
+        "errors": sum(len(stats.errors) for stats in sessions),
+        "audio_messages": sum(stats.audio_messages for stats in sessions),
+        "audio_mb": round(sum(stats.audio_bytes for stats in sessions) / 1024 / 1024, 2),
+        "wall_seconds": round(wall_seconds, 3),
+    }
+
+
+async def run_level(args: argparse.Namespace, scripts: list[list[dict]], sessions: int) -> dict:
+    base_url = re.sub(r"^ws", "http", args.url.rsplit("/", 1)[0])
+    timeout = aiohttp.ClientTimeout(total=None, connect=args.ready_timeout)
+    async with aiohttp.ClientSession(timeout=timeout) as http:
+        await wait_until_ready(http, base_url, args.ready_timeout)
+        before = await fetch_metrics(http, base_url)
+        client_lags: list[float] = []
+        lag_monitor = asyncio.create_task(measure_loop_lag(client_lags))
+
+        async def start_session(index: int) -> SessionStats:
+            if args.ramp_seconds and sessions > 1:
+                await asyncio.sleep(args.ramp_seconds * index / (sessions - 1))
+            return await run_session(
+                http,
+                args.url,
+                scripts[index % len(scripts)],
+                args.speed,
+                args.drain_timeout,
+                args.ready_timeout,
+            )
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(start_session(index) for index in range(sessions)))
+        wall_seconds = time.perf_counter() - start
+        lag_monitor.cancel()
+        after = await fetch_metrics(http, base_url)
+
+    summary = summarize(results, wall_seconds)
+    summary["client_loop_lag_p99"] = percentile(client_lags, 99)
+    return {
+        "sessions": sessions,
+        "summary": summary,
+        "server": diff_metrics(before, after) if before is not None and after else None,
+        "failures": [stats.failure for stats in results if stats.failure],
+        "errors": sorted({error for stats in results for error in stats.errors}),
+    }
+
+
+def print_level(level: dict) -> None:
+    print(f"\n### {level['sessions']} sessions")
+    for metric, value in level["summary"].items():
+        print(f"{metric:<26} {value}")
+    if level["server"]:
+        print("server:")
+        for name, histogram in sorted(level["server"].items()):
+            print(
+                f"  {name:<70} n={histogram['count']:<6} mean={histogram['mean']:<8}"
+                f" p50<={histogram['p50']} p95<={histogram['p95']}"
+            )
+    for failure in level["failures"][:5]:
+        print(f"failed: {failure}")
+    for error in level["errors"][:5]:
+        print(f"error: {error}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default="ws://localhost:12393/client-ws")
+    parser.add_argument(
+        "--sessions", type=int, nargs="+", default=[1], help="concurrent sessions, one run per value"
+    )
+    parser.add_argument("--replay", nargs="+", help="recorded sessions, assigned round robin")
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="replay speed, 0 to send without waiting"
+    )
+    parser.add_argument("--ramp-seconds", type=float, default=0, help="spread the session starts")
+    parser.add_argument("--turns", type=int, default=5, help="inputs of a synthetic session")
+    parser.add_argument(
+        "--turn-interval", type=float, default=15, help="seconds between synthetic inputs"
+    )
+    parser.add_argument(
+        "--interrupt-every", type=int, default=3, help="interrupt every N th synthetic turn, 0 never"
+    )
+    parser.add_argument("--interrupt-after", type=float, default=2.0, help="seconds after the input")
+    parser.add_argument("--binary", action="store_true", help="use the binary audio protocol")
+    parser.add_argument(
+        "--drain-timeout", type=float, default=60, help="how long to wait for the last replies"
+    )
+    parser.add_argument("--ready-timeout", type=float, default=120)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    if args.replay:
+        scripts = [load_session(path) for path in args.replay]
+    else:
+        scripts = [
+            synthetic_session(
+                args.turns,
+                args.turn_interval,
+                args.interrupt_every,
+                args.interrupt_after,
+                args.binary,
+            )
+        ]
+
+    levels = []
+    for sessions in args.sessions:
+        level = asyncio.run(run_level(args, scripts, sessions))
+        print_level(level)
+        levels.append(level)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(
+                {
+                    "url": args.url,
+                    "replay": args.replay,
+                    "speed": args.speed,
+                    "levels": levels,
+                },
+                output,
+                ensure_ascii=False,
+                indent=2,
+            )
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 import anthropic
 from typing import Iterator
-from .llm_interface import LLMInterface
+from .llm_interface import LLMInterface, DIGEST_INSTRUCTION, format_viewer_message
 
 class LLM(LLMInterface):
     def __init__(
@@ -46,6 +46,33 @@ class LLM(LLMInterface):
         """
         # Add user message to history
         self.messages.append({"role": "user", "content": prompt})
+        return self._stream_response()
+
+    def chat_iter_messages(self, messages: list[dict]) -> Iterator[str]:
+        """
+        Send several viewer messages to Claude as one user turn with one text block per viewer.
+
+        Args:
+            messages (list[dict]): Dicts with the keys "name" and "content"
+
+        Yields:
+            str: Response tokens
+        """
+        content = [
+            {"type": "text", "text": format_viewer_message(message)}
+            for message in messages
+        ]
+        content.append({"type": "text", "text": DIGEST_INSTRUCTION})
+        self.messages.append({"role": "user", "content": content})
+        return self._stream_response()
+
+    def _stream_response(self) -> Iterator[str]:
+        """
+        Stream the reply to the conversation history and add it to the history.
+
+        Yields:
+            str: Response tokens
+        """
         
         try:
             # Stream response from Claude
@@ -81,3 +108,9 @@ class LLM(LLMInterface):
         if self.messages and self.messages[-1]["role"] == "assistant":
             # Update last assistant message with only heard portion
             self.messages[-1]["content"] = heard_response
+
+    def get_history(self) -> list[dict]:
+        return list(self.messages)
+
+    def set_history(self, history: list[dict]) -> None:
+        self.messages = list(history)
@@ -1,14 +1,21 @@
 from typing import Iterator
 import json
+import time
 
 from .llm_interface import LLMInterface
 
 class LLM(LLMInterface):
 
-    def __init__(self):
+    def __init__(self, ttft_ms: float = 0, tokens_per_second: float = 0):
         """
         Initializes an instance of the `FakeLLM` class.
+
+        Parameters:
+        - ttft_ms (float): How long to wait before the first character, like the time to first token of an LLM.
+        - tokens_per_second (float): How many characters to yield per second. 0 yields them without delay.
         """
+        self.ttft = ttft_ms / 1000
+        self.token_interval = 1 / tokens_per_second if tokens_per_second > 0 else 0
         self.memory = []
         self.sentence_count = 1
         self.response_list = [
@@ -62,9 +69,11 @@ class LLM(LLMInterface):
         # A generator to yield the response one character at a time
         def _generate_response():
             complete_response = ""
+            time.sleep(self.ttft)
             for char in response:
                 yield char
                 complete_response += char
+                time.sleep(self.token_interval)
             
             # Store the complete response in memory
             self.memory.append(
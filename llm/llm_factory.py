@@ -56,7 +56,10 @@ class LLMFactory:
                 verbose=kwargs.get("VERBOSE", False),
             )
         elif llm_provider == "fakellm":
-            return FakeLLM()
+            return FakeLLM(
+                ttft_ms=kwargs.get("TTFT_MS", 0),
+                tokens_per_second=kwargs.get("TOKENS_PER_SECOND", 0),
+            )
         else:
             raise ValueError(f"Unsupported LLM provider: {llm_provider}")
 
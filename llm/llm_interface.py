@@ -1,6 +1,19 @@
 import abc
 from typing import Iterator
 
+# Sent with a digest of viewer messages, see `chat_iter_messages`
+DIGEST_INSTRUCTION = (
+    "The messages above were sent by several viewers at about the same time. "
+    "Reply to them in one response and address each viewer by name."
+)
+
+
+def format_viewer_message(message: dict) -> str:
+    """Format a {"name": ..., "content": ...} viewer message as one line of text."""
+    if message.get("name"):
+        return f"{message['name']}: {message['content']}"
+    return message["content"]
+
 
 class LLMInterface(metaclass=abc.ABCMeta):
 
@@ -18,6 +31,23 @@ class LLMInterface(metaclass=abc.ABCMeta):
         """
         raise NotImplementedError
 
+    def chat_iter_messages(self, messages: list[dict]) -> Iterator[str]:
+        """
+        Sends several viewer messages to the agent as one turn and return an iterator to the single response.
+        Like `chat_iter`, this function stores the messages and the response in the memory.
+        The default implementation joins the messages into one prompt. Providers that support
+        structured messages should override it.
+
+        Parameters:
+        - messages (list[dict]): The messages, in order. Each one is a dict with the keys
+          "name" (the viewer name, may be empty) and "content" (the message text).
+
+        Returns:
+        - Iterator[str]: An iterator to the response from the agent.
+        """
+        prompt = "\n".join(format_viewer_message(message) for message in messages)
+        return self.chat_iter(f"{prompt}\n\n{DIGEST_INSTRUCTION}")
+
     def handle_interrupt(self, heard_response: str) -> None:
         """
         This function will be called when the LLM is interrupted by the user.
@@ -30,3 +60,20 @@ class LLMInterface(metaclass=abc.ABCMeta):
         - heard_response (str): The last response from the LLM before it was interrupted. The only content that the user can hear before the interruption.
         """
         raise NotImplementedError
+
+    def get_history(self) -> list[dict]:
+        """
+        Return the chat history as {"role": ..., "content": ...} dicts, without the system prompt,
+        so that it can be carried over to a new instance when the config is switched.
+        Providers that do not keep the history themselves return an empty list.
+        """
+        return []
+
+    def set_history(self, history: list[dict]) -> None:
+        """
+        Continue the conversation of `history`, as returned by `get_history` of another instance.
+        Called on a new instance, which keeps its own system prompt.
+
+        Parameters:
+        - history (list[dict]): The chat history, oldest message first.
+        """
@@ -196,6 +196,13 @@ class LLM(LLMInterface):
             }
         )
 
+    def get_history(self) -> list[dict]:
+        # the first message is the system prompt
+        return self.conversation_memory[1:]
+
+    def set_history(self, history: list[dict]) -> None:
+        self.conversation_memory = self.conversation_memory[:1] + list(history)
+
 
 def test():
 
@@ -9,6 +9,7 @@ from typing import Iterator
 import json
 from openai import OpenAI
 
+from .llm_interface import DIGEST_INSTRUCTION, format_viewer_message
 # from .llm_interface import LLMInterface
 
 
@@ -101,10 +102,41 @@ class LLM:
             print(" -- System: " + self.system)
             print(" -- Prompt: " + prompt + "\n\n")
 
+        return self._stream_completion()
+
+    def chat_iter_messages(self, messages: list[dict]) -> Iterator[str]:
+        """
+        Send several viewer messages as one turn. Every message is stored as its own
+        user message, and the digest instruction is only sent with this request.
+
+        Parameters:
+        - messages (list[dict]): Dicts with the keys "name" and "content".
+        """
+        for message in messages:
+            self.memory.append(
+                {
+                    "role": "user",
+                    "content": format_viewer_message(message),
+                }
+            )
+
+        if self.verbose:
+            self.__print_memory()
+            print(" -- Digest of " + str(len(messages)) + " messages\n\n")
+
+        return self._stream_completion(
+            [{"role": "system", "content": DIGEST_INSTRUCTION}]
+        )
+
+    def _stream_completion(self, extra_messages: list[dict] = ()) -> Iterator[str]:
+        """
+        Request a streamed completion of the memory and store the response in the memory.
+        `extra_messages` are sent after the memory but not stored.
+        """
         chat_completion = []
         try:
             chat_completion = self.client.chat.completions.create(
-                messages=self.memory,
+                messages=self.memory + list(extra_messages),
                 model=self.model,
                 stream=True,
                 extra_query={"keep_alive": "20m"},
@@ -158,6 +190,13 @@ class LLM:
             }
         )
 
+    def get_history(self) -> list[dict]:
+        # the first message is the system prompt
+        return self.memory[1:]
+
+    def set_history(self, history: list[dict]) -> None:
+        self.memory = self.memory[:1] + list(history)
+
 
 def test():
     llm = LLM(
@@ -10,7 +10,10 @@ import threading
 import queue
 import uuid
 import asyncio
-from typing import Callable, Iterator, Optional
+import copy
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Iterator, Optional
 from loguru import logger
 import numpy as np
 import yaml
@@ -22,17 +25,21 @@ import blivedm.models.web as web_models
 
 import __init__
 from aifunctions.playsongfunction import playsongfunction
-from asr.asr_factory import ASRFactory
 from asr.asr_interface import ASRInterface
 from live2d_model import Live2dModel
 from llm.llm_factory import LLMFactory
 from llm.llm_interface import LLMInterface
 from prompts import prompt_loader
-from tts.tts_factory import TTSFactory
 from tts.tts_interface import TTSInterface
+from tts.audio_buffer import encode_wav
 from translate.translate_interface import TranslateInterface
 from translate.translate_factory import TranslateFactory
+from utils import metrics, model_registry
 from utils.audio_preprocessor import audio_filter
+from utils.startup import StartupTimer
+from pipeline.danmaku_scheduler import DanmakuScheduler, Priority, ViewerMessage
+from pipeline.conversation_pipeline import ConversationPipeline
+from pipeline.sentence_segmenter import SentenceSegmenter
 
 TEST_ROOM_IDS = [5624404]  # Change this to the room you want to monitor
 SESSDATA = 'f720b3a4%2C1749954481%2Cd0e6b%2Ac2CjA_Vi_vivcoKfKfB8X6_vjvH7bGDdf7LL9EbW_eBuOtHbdrvXxQ078mfT-BWdZsvywSVkZJX1Y0S0N4dDJkX2dpT08tLWxQaHJHM05SamxqdHdibnVCa1pBTGhnVkQwcFBGSXo4YUhPSklENFVBLXJtRlRUSDNXZWZnSWhHNWplSnFBQlBNUGh3IIEC'
@@ -54,55 +61,70 @@ class OpenLLMVTuberMain:
     ) -> None:
         logger.info(f"t41372/Open-LLM-VTuber, version {__init__.__version__}")
 
-        self.config: dict = configs
+        # a copy: a config switch of this instance must not change the config of others
+        self.config: dict = dict(configs)
+        self._model_handles: list[model_registry.SharedModel] = []
         self.verbose = self.config.get("VERBOSE", False)
-        self.live2d: Live2dModel | None = self.init_live2d()
         self._continue_exec_flag = threading.Event()
         self._continue_exec_flag.set()  # Set the flag to continue execution
         self.session_id: str = str(uuid.uuid4().hex)
         self.heard_sentence: str = ""
         self.songFunc=playsongfunction()
-        # Init ASR if voice input is on.
-        self.asr: ASRInterface | None
-        if self.config.get("VOICE_INPUT_ON", False):
+
+        # ASR, TTS and the translator are independent of each other and of
+        # Live2D and the LLM, so they are loaded in parallel.
+        self.startup = StartupTimer()
+        with ThreadPoolExecutor(max_workers=3, thread_name_prefix="startup") as executor:
+            # Init ASR if voice input is on.
             # if custom_asr is provided, don't init asr and use it instead.
-            if custom_asr is None:
-                self.asr = self.init_asr()
+            asr_future = None
+            if self.config.get("VOICE_INPUT_ON", False) and custom_asr is None:
+                asr_future = executor.submit(self.init_asr, self.startup)
+            # Init TTS if TTS is on.
+            tts_future = None
+            if self.config.get("TTS_ON", False) and custom_tts is None:
+                tts_future = executor.submit(self.init_tts, self.startup)
+            translator_future = executor.submit(self._timed, "Translator", self.init_translator)
+
+            self.live2d: Live2dModel | None = self._timed("Live2D", self.init_live2d)
+            # the system prompt of the LLM depends on the Live2D expressions
+            self.llm: LLMInterface = self._timed("LLM", self.init_llm)
+
+            self.asr: ASRInterface | None
+            if not self.config.get("VOICE_INPUT_ON", False):
+                self.asr = None
+            elif custom_asr is None:
+                self.asr = asr_future.result()
             else:
                 print("Using custom ASR")
                 self.asr = custom_asr
-        else:
-            self.asr = None
-
-        # Init TTS if TTS is on.
-        self.tts: TTSInterface
-        if self.config.get("TTS_ON", False):
-            # if custom_tts is provided, don't init tts and use it instead.
-            if custom_tts is None:
-                self.tts = self.init_tts()
+
+            self.tts: TTSInterface
+            if not self.config.get("TTS_ON", False):
+                self.tts = None
+            elif custom_tts is None:
+                self.tts = tts_future.result()
             else:
                 print("Using custom TTS")
                 self.tts = custom_tts
-        else:
-            self.tts = None
-
-        # Init Translator if enabled
-        self.translator: TranslateInterface | None
-        if self.config.get("TRANSLATE_AUDIO", False):
-            try:
-                translate_provider = self.config.get("TRANSLATE_PROVIDER", "DeepLX")
-                self.translator = TranslateFactory.get_translator(
-                    translate_provider=translate_provider,
-                    **self.config.get(translate_provider, {}),
-                )
-            except Exception as e:
-                print(f"Error initializing Translator: {e}")
-                print("Proceed without Translator.")
-                self.translator = None
-        else:
-            self.translator = None
 
-        self.llm: LLMInterface = self.init_llm()
+            self.translator: TranslateInterface | None = translator_future.result()
+        self.startup.finish()
+        self.startup.log_report("Loading the components")
+
+        # Async conversation pipeline used by `aconversation_chain`
+        self._play_audio_file_async_func: (
+            Callable[[Optional[str], Optional[str], Optional[tuple]], Awaitable[None]]
+            | None
+        ) = None
+        self._has_custom_audio_output = False
+        self._conversation_lock = asyncio.Lock()
+        self.pipeline = ConversationPipeline(
+            self,
+            tts_parallelism=self.config.get("TTS_MAX_PARALLEL", 1),
+            stream_tts=self.config.get("TTS_STREAMING", False),
+            stream_chunk_seconds=self.config.get("TTS_STREAM_CHUNK_MS", 1000) / 1000,
+        )
 
     # Initialization methods
 
@@ -128,21 +150,50 @@ class OpenLLMVTuberMain:
         )
         return llm
 
-    def init_asr(self) -> ASRInterface:
-        asr_model = self.config.get("ASR_MODEL")
-        asr_config = self.config.get(asr_model, {})
-        asr = ASRFactory.get_asr_system(asr_model, **asr_config)
-        return asr
+    def init_asr(self, timer: StartupTimer | None = None) -> ASRInterface:
+        # shared with the other sessions of this process
+        return self._own(model_registry.acquire_asr(self.config, timer))
 
-    def init_tts(self) -> TTSInterface:
-        tts_model = self.config.get("TTS_MODEL", "pyttsx3TTS")
-        tts_config = self.config.get(tts_model, {})
-        return TTSFactory.get_tts_engine(tts_model, **tts_config)
+    def init_tts(self, timer: StartupTimer | None = None) -> TTSInterface:
+        return self._own(model_registry.acquire_tts(self.config, timer))
+
+    def _timed(self, step: str, init: Callable):
+        with self.startup.measure(step):
+            return init()
+
+    def _own(self, handle: model_registry.SharedModel) -> model_registry.SharedModel:
+        """Remember a registry handle acquired by this instance, to release it in `close`."""
+        self._model_handles.append(handle)
+        return handle
+
+    def close(self) -> None:
+        """
+        Release the shared models acquired by this instance.
+        Custom models passed to the constructor belong to the caller and are left alone.
+        """
+        handles, self._model_handles = self._model_handles, []
+        for handle in handles:
+            handle.release()
 
     def set_audio_output_func(
         self, audio_output_func: Callable[[Optional[str], Optional[str]], None]
     ) -> None:
         self._play_audio_file = audio_output_func
+        self._has_custom_audio_output = True
+
+    def set_async_audio_output_func(
+        self,
+        audio_output_func: Callable[
+            [Optional[str], Optional[str], Optional[tuple]], Awaitable[None]
+        ],
+    ) -> None:
+        """
+        Set a coroutine function used by `aconversation_chain` to play audio.
+        It is called with the sentence, the audio file path and the PCM buffer
+        `(samples, sample_rate)`. Either the path or the buffer is set.
+        If not set, the sync audio output function is run in a worker thread instead.
+        """
+        self._play_audio_file_async_func = audio_output_func
 
     def get_system_prompt(self) -> str:
         if self.config.get("PERSONA_CHOICE"):
@@ -192,7 +243,7 @@ class OpenLLMVTuberMain:
             user_input = self.get_user_input()
         elif isinstance(user_input, np.ndarray):
             print("transcribing...")
-            user_input = self.asr.transcribe_np(user_input)
+            user_input = self.transcribe_np(user_input)
 
         if user_input.strip().lower() == self.config.get("EXIT_PHRASE", "exit").lower():
             print("Exiting...")
@@ -222,6 +273,78 @@ class OpenLLMVTuberMain:
         print(f"{c[color_code]}Conversation completed.")
         return full_response
 
+    async def aconversation_chain(
+        self, user_input: str | np.ndarray | list[dict] | None = None
+    ) -> str:
+        """
+        The coroutine version of `conversation_chain`.
+        The turn runs through the long-lived stages of `self.pipeline` instead of
+        spawning producer and consumer threads, so it can be awaited directly
+        from the event loop. Turns on the same instance run one after another.
+
+        `user_input` may also be a list of {"name": ..., "content": ...} viewer
+        messages, which are answered together in one reply (danmaku digest).
+
+        Raises:
+            InterruptedError: If the turn was interrupted.
+        """
+        async with self._conversation_lock:
+            self._continue_exec_flag.set()
+            print("New Conversation Chain started!")
+
+            if user_input is None:
+                user_input = await asyncio.to_thread(self.get_user_input)
+            elif isinstance(user_input, np.ndarray):
+                print("transcribing...")
+                user_input = await asyncio.to_thread(self.transcribe_np, user_input)
+                # the turn does not exist yet, so only the flag knows about an interrupt
+                self._raise_if_interrupted()
+
+            if isinstance(user_input, list):
+                print(f"User input: digest of {len(user_input)} messages")
+                prompt_sent_at = time.perf_counter()
+                chat_completion: Iterator[str] = await asyncio.to_thread(
+                    self.llm.chat_iter_messages, user_input
+                )
+            else:
+                if (
+                    user_input.strip().lower()
+                    == self.config.get("EXIT_PHRASE", "exit").lower()
+                ):
+                    print("Exiting...")
+                    return "Goodbye!"
+
+                print(f"User input: {user_input}")
+
+                prompt_sent_at = time.perf_counter()
+                chat_completion: Iterator[str] = await asyncio.to_thread(
+                    self.llm.chat_iter, user_input
+                )
+
+            # interrupted while the LLM was thinking: the reply is never spoken
+            self._raise_if_interrupted()
+            turn = await self.pipeline.run_turn(
+                chat_completion,
+                speak=self.config.get("TTS_ON", False),
+                by_sentence=self.config.get("SAY_SENTENCE_SEPARATELY", True),
+                started_at=prompt_sent_at,
+            )
+            print()  # newline after printing
+
+            if turn.is_interrupted():
+                self._interrupt_post_processing()
+                raise InterruptedError("Conversation chain interrupted.")
+
+            if self.verbose:
+                print(f"\nComplete response: [\n{turn.full_response}\n]")
+            print("Conversation completed.")
+            return turn.full_response
+
+    def transcribe_np(self, audio: np.ndarray) -> str:
+        """Transcribe the audio with the ASR and record how long it took."""
+        with metrics.ASR_TRANSCRIBE_SECONDS.time(asr_model=self.config.get("ASR_MODEL")):
+            return self.asr.transcribe_np(audio)
+
     def get_user_input(self) -> str:
         if self.config.get("VOICE_INPUT_ON", False):
             print("Listening from the microphone...")
@@ -262,7 +385,6 @@ class OpenLLMVTuberMain:
         if not self.tts:
             return None
 
-        print("json_str")
         sentence = sentence.strip()
         if sentence == "":
             return None
@@ -270,7 +392,131 @@ class OpenLLMVTuberMain:
 
 
         # Now generate audio with the extracted emotion if any
-        return self.tts.generate_audio(sentence, file_name_no_ext=file_name_no_ext, emotion=emotion)
+        # (only GPT_Sovits takes an emotion)
+        tts_kwargs = {"emotion": emotion} if emotion else {}
+        return self.tts.generate_audio(sentence, file_name_no_ext=file_name_no_ext, **tts_kwargs)
+
+    def _generate_pcm(self, sentence: str, emotion=None) -> tuple[np.ndarray, int] | None:
+        """Like `_generate_audio_file`, but return a PCM buffer instead of writing a file."""
+        if not self.tts:
+            return None
+
+        sentence = sentence.strip()
+        if sentence == "":
+            return None
+
+        tts_kwargs = {"emotion": emotion} if emotion else {}
+        return self.tts.generate_pcm(sentence, **tts_kwargs)
+
+    def _synthesize_sentence(
+        self, sentence: str, in_memory: bool = False, stream: bool = False
+    ) -> dict:
+        """
+        Turn a complete sentence from the LLM into audio.
+        Emotion tags like `[joy]` are passed to the TTS engine and a
+        `{"play_song": ...}` action is answered with a song file instead of TTS.
+
+        Parameters:
+            sentence (str): The sentence from the LLM.
+            in_memory (bool): Return the synthesized speech as a PCM buffer instead of a file.
+            stream (bool): Return an iterator of PCM chunks instead. The synthesis starts
+                when the iterator is consumed.
+
+        Returns:
+            dict: `sentence` to display, `audio_filepath`, `audio` (a PCM buffer
+            `(samples, sample_rate)`) or `audio_stream` to play, and whether the audio
+            file is `temporary` and should be removed after use.
+        """
+        audio_filepath = None
+        audio = None
+        audio_stream = None
+        # Extract emotion from the sentence if present
+        # Assuming emotion is indicated like [happy], [sad], [angry], etc.
+        emotion_pattern = r"\[([a-zA-Z0-9_]+)\]"
+        matches = re.findall(emotion_pattern, sentence)
+        emotion = None
+        if matches:
+            # If multiple emotions are found, decide how to handle it.
+            # For simplicity, let's use the first one.
+            emotion = matches[0]
+            # Remove all emotion tags from the sentence
+            sentence = re.sub(emotion_pattern, "", sentence)
+
+        json_pattern = r'(\{.*?\})'
+        match = re.search(json_pattern, sentence)
+        action = None
+
+        if match:
+            json_str = match.group(1)
+            sentence = sentence.replace(match.group(1), "").strip()
+            try:
+                data = json.loads(json_str)
+                action = data.get("play_song", None)
+            except json.JSONDecodeError:
+                pass
+
+        tts_target_sentence = audio_filter(
+            sentence,
+            translator=(
+                self.translator
+                if self.config.get("TRANSLATE_AUDIO", False)
+                else None
+            ),
+            remove_special_char=self.config.get("REMOVE_SPECIAL_CHAR", True),
+        )
+        if action:
+            # For now, we assume we just go to play a random song.
+            audio_filepath = self.songFunc._get_song_audio_file_path(action)
+            if self.verbose:
+                print(f"Action detected: play_song. Returning song file {audio_filepath}")
+        elif stream:
+            if self.tts and tts_target_sentence.strip():
+                tts_kwargs = {"emotion": emotion} if emotion else {}
+                audio_stream = self.tts.stream_pcm(tts_target_sentence.strip(), **tts_kwargs)
+        elif in_memory:
+            audio = self._generate_pcm(tts_target_sentence, emotion=emotion)
+        else:
+            audio_filepath = self._generate_audio_file(
+                tts_target_sentence, file_name_no_ext=str(uuid.uuid4()), emotion=emotion
+            )
+
+        return {
+            "sentence": sentence,
+            "audio_filepath": audio_filepath,
+            "audio": audio,
+            "audio_stream": audio_stream,
+            "temporary": not action,
+        }
+
+    def _discard_audio_file(self, audio_info: dict) -> None:
+        """Remove a generated audio file that will never be played."""
+        if self.tts and audio_info["audio_filepath"] and audio_info.get("temporary"):
+            self.tts.remove_file(audio_info["audio_filepath"], verbose=self.verbose)
+
+    async def _play_audio_file_async(
+        self,
+        sentence: str | None,
+        filepath: str | None,
+        audio: tuple[np.ndarray, int] | None = None,
+    ) -> None:
+        if self._play_audio_file_async_func is not None:
+            await self._play_audio_file_async_func(sentence, filepath, audio)
+        elif audio is not None and not self._has_custom_audio_output:
+            await asyncio.to_thread(self.tts.play_pcm_local, *audio)
+        else:
+            if audio is not None:
+                # the sync audio output function only takes files
+                filepath = await asyncio.to_thread(self._write_audio_file, audio)
+            await asyncio.to_thread(
+                self._play_audio_file, sentence=sentence, filepath=filepath
+            )
+
+    def _write_audio_file(self, audio: tuple[np.ndarray, int]) -> str:
+        """Write a PCM buffer to a temporary wav file in the cache directory."""
+        filepath = self.tts.generate_cache_file_name(str(uuid.uuid4()), "wav")
+        with open(filepath, "wb") as audio_file:
+            audio_file.write(encode_wav(*audio))
+        return filepath
 
     def _play_audio_file(self, sentence: str | None, filepath: str | None) -> None:
         if filepath is None:
@@ -302,6 +548,7 @@ class OpenLLMVTuberMain:
             try:
                 index = 0
                 sentence_buffer = ""
+                segmenter = self.create_sentence_segmenter()
 
                 for char in chat_completion:
                     if not self._continue_exec_flag.is_set():
@@ -309,94 +556,25 @@ class OpenLLMVTuberMain:
 
                     if char:
                         print(char, end="", flush=True)
-                        sentence_buffer += char
                         full_response[0] += char
-                        if self.is_complete_sentence(sentence_buffer):
-                            print("sentence")
-                            audio_filepath=None
-                            # Extract emotion from the sentence if present
-                            # Assuming emotion is indicated like [happy], [sad], [angry], etc.
-                            emotion_pattern = r"\[([a-zA-Z0-9_]+)\]"
-                            matches = re.findall(emotion_pattern, sentence_buffer)
-                            emotion = None
-                            if matches:
-                                # If multiple emotions are found, decide how to handle it.
-                                # For simplicity, let's use the first one.
-                                emotion = matches[0]
-                                # Remove all emotion tags from the sentence
-                                sentence_buffer = re.sub(emotion_pattern, "", sentence_buffer)
-
-                            json_pattern = r'(\{.*?\})'
-                            match = re.search(json_pattern, sentence_buffer)
-                            action = None
-
-                            if match:
-                                json_str = match.group(1)
-                                print("json_str1")
-                                sentence_buffer=sentence_buffer.replace(match.group(1), "").strip()
-                                try:
-                                    data = json.loads(json_str)
-                                    action = data.get("play_song", None)
-                                except json.JSONDecodeError:
-                                    pass
-
-
+                        for sentence_buffer in segmenter.feed(char):
                             if self.verbose:
                                 print("\n")
                             if not self._continue_exec_flag.is_set():
                                 raise InterruptedError("Producer interrupted")
-                            tts_target_sentence = sentence_buffer
-
-                            tts_target_sentence = audio_filter(
-                                tts_target_sentence,
-                                translator=(
-                                    self.translator
-                                    if self.config.get("TRANSLATE_AUDIO", False)
-                                    else None
-                                ),
-                                remove_special_char=self.config.get(
-                                    "REMOVE_SPECIAL_CHAR", True
-                                ),
-                            )
-                            if action:
-                                # Remove the JSON part from the sentence to "clean it up"
-                                # For example, just strip out the matched JSON substring
-
-                                # You might do something with cleaned_sentence if needed,
-                                # e.g. read it out first, or ignore it.
-                                # For now, we assume we just go to play a random song.
-                                print("playsong")
-                                audio_filepath = self.songFunc._get_song_audio_file_path(action)
-                                if self.verbose:
-                                    print(f"Action detected: play_song. Returning song file {audio_filepath}")
-                            else:
-
-                                audio_filepath = self._generate_audio_file(
-                                    tts_target_sentence, file_name_no_ext=str(uuid.uuid4()),emotion=emotion
-                                )
+                            audio_info = self._synthesize_sentence(sentence_buffer)
 
                             if not self._continue_exec_flag.is_set():
                                 raise InterruptedError("Producer interrupted")
-                            audio_info = {
-                                "sentence": sentence_buffer,
-                                "audio_filepath": audio_filepath,
-                            }
                             task_queue.put(audio_info)
                             index += 1
-                            sentence_buffer = ""
 
-                            if sentence_buffer:
-                                if not self._continue_exec_flag.is_set():
-                                    raise InterruptedError("Producer interrupted")
-                                print("\n")
-                                audio_filepath = self._generate_audio_file(
-                                    sentence_buffer, file_name_no_ext=str(uuid.uuid4())
-                                )
-                                audio_info = {
-                                    "sentence": sentence_buffer,
-                                    "audio_filepath": audio_filepath,
-                                }
-                                task_queue.put(audio_info)
+                sentence_buffer = segmenter.flush()
+                if sentence_buffer:
+                    if not self._continue_exec_flag.is_set():
+                        raise InterruptedError("Producer interrupted")
+                    print("\n")
+                    task_queue.put(self._synthesize_sentence(sentence_buffer))
 
             except InterruptedError:
                 print("\nProducer interrupted")
@@ -461,65 +639,29 @@ class OpenLLMVTuberMain:
 
     def interrupt(self, heard_sentence: str = "") -> None:
         self._continue_exec_flag.clear()
+        self.pipeline.interrupt()
         self.llm.handle_interrupt(heard_sentence)
 
     def _interrupt_post_processing(self) -> None:
         self._continue_exec_flag.set()  # Reset the interrupt flag
 
+    def _raise_if_interrupted(self) -> None:
+        """Like `_check_interrupt`, but resets the flag for the next turn first."""
+        if not self._continue_exec_flag.is_set():
+            self._interrupt_post_processing()
+            raise InterruptedError("Conversation chain interrupted before the reply.")
+
     def _check_interrupt(self):
         if not self._continue_exec_flag.is_set():
             raise InterruptedError("Conversation chain interrupted: checked")
 
-    def is_complete_sentence(self, text: str):
-        white_list = [
-            "...",
-            "Dr.",
-            "Mr.",
-            "Ms.",
-            "Mrs.",
-            "Jr.",
-            "Sr.",
-            "St.",
-            "Ave.",
-            "Rd.",
-            "Blvd.",
-            "Dept.",
-            "Univ.",
-            "Prof.",
-            "Ph.D.",
-            "M.D.",
-            "U.S.",
-            "U.K.",
-            "U.N.",
-            "E.U.",
-            "U.S.A.",
-            "U.K.",
-            "U.S.S.R.",
-            "U.A.E.",
-        ]
-
-        for item in white_list:
-            if text.strip().endswith(item):
-                return False
-
-        punctuation_blacklist = [
-            ".",
-            "?",
-            "!",
-            "。",
-            "；",
-            "？",
-            "！",
-            "…",
-            "〰",
-            "〜",
-            "～",
-            "！",
-            "……",
-            "？",
-            "}"
-        ]
-        return any(text.strip().endswith(punct) for punct in punctuation_blacklist)
+    def create_sentence_segmenter(self) -> SentenceSegmenter:
+        """Create a segmenter for one reply, configured by the FIRST_CLAUSE settings."""
+        return SentenceSegmenter(
+            fast_first_clause=self.config.get("FAST_FIRST_CLAUSE", False),
+            first_clause_min_chars=self.config.get("FIRST_CLAUSE_MIN_CHARS", 4),
+            first_clause_max_chars=self.config.get("FIRST_CLAUSE_MAX_CHARS", 30),
+        )
 
     def clean_cache(self):
         cache_dir = "./cache"
@@ -530,13 +672,139 @@ class OpenLLMVTuberMain:
     def load_and_apply_config(self, config_file: str) -> None:
         with open(config_file, "r", encoding="utf-8") as file:
             new_config = yaml.safe_load(file)
-
-        self.config.update(new_config)
-        self.live2d = self.init_live2d()
-        self.asr = self.init_asr()
-        self.tts = self.init_tts()
-        self.translator = self.init_translator()
-        self.llm = self.init_llm()
+        self.apply_config(new_config)
+
+    def apply_config(self, new_config: dict) -> set[str]:
+        """
+        Switch to `new_config`, merged into the current config. Only the components
+        whose settings changed are rebuilt, and the chat history is carried over
+        to a new LLM.
+
+        Returns:
+            set[str]: The rebuilt components.
+        """
+        config = {**self.config, **new_config}
+        changed = self._changed_components(config)
+        components, handles = self._build_components(config, changed)
+        self._swap_components(config, components, handles)
+        return changed
+
+    async def aapply_config(self, new_config: dict) -> set[str]:
+        """
+        The coroutine version of `apply_config`. The changed components are built in
+        a worker thread while conversations go on with the old ones, and swapped in
+        between two turns.
+        """
+        config = {**self.config, **new_config}
+        changed = self._changed_components(config)
+        components, handles = await asyncio.to_thread(
+            self._build_components, config, changed
+        )
+        async with self._conversation_lock:
+            self._swap_components(config, components, handles)
+        return changed
+
+    def _changed_components(self, config: dict) -> set[str]:
+        """The components that have to be rebuilt to switch from the current config to `config`."""
+        old = self.config
+
+        def differs(*keys: str) -> bool:
+            return any(old.get(key) != config.get(key) for key in keys)
+
+        def section_differs(name_key: str) -> bool:
+            # the settings of the selected engine, e.g. the "FunASR" section for ASR_MODEL
+            return old.get(old.get(name_key), {}) != config.get(config.get(name_key), {})
+
+        changed = set()
+        if differs("LIVE2D", "LIVE2D_MODEL"):
+            changed.add("live2d")
+        if differs("VOICE_INPUT_ON", "ASR_MODEL", "ASR_BATCHING") or section_differs("ASR_MODEL"):
+            changed.add("asr")
+        if differs("TTS_ON", "TTS_MODEL", "TTS_CACHE") or section_differs("TTS_MODEL"):
+            changed.add("tts")
+        if differs("TRANSLATE_AUDIO", "TRANSLATE_PROVIDER") or section_differs(
+            "TRANSLATE_PROVIDER"
+        ):
+            changed.add("translator")
+        # the system prompt depends on the persona and the Live2D expressions
+        if (
+            differs(
+                "LLM_PROVIDER",
+                "PERSONA_CHOICE",
+                "DEFAULT_PERSONA_PROMPT_IN_YAML",
+                "LIVE2D_Expression_Prompt",
+            )
+            or section_differs("LLM_PROVIDER")
+            or "live2d" in changed
+        ):
+            changed.add("llm")
+        return changed
+
+    def _build_components(
+        self, config: dict, changed: set[str]
+    ) -> tuple[dict, list[model_registry.SharedModel]]:
+        """
+        Build the `changed` components for `config` without touching the running ones.
+        They are built by the init methods of a shallow copy of this instance that carries
+        the new config, in parallel like in `__init__`.
+
+        Returns:
+            tuple[dict, list[SharedModel]]: The new components by attribute name,
+            and the registry handles acquired for them.
+        """
+        staged = copy.copy(self)
+        staged.config = config
+        staged._model_handles = []
+        components = {}
+        try:
+            with ThreadPoolExecutor(max_workers=3, thread_name_prefix="config-switch") as executor:
+                futures = {}
+                if "asr" in changed:
+                    futures["asr"] = (
+                        executor.submit(staged.init_asr)
+                        if config.get("VOICE_INPUT_ON", False)
+                        else None
+                    )
+                if "tts" in changed:
+                    futures["tts"] = (
+                        executor.submit(staged.init_tts) if config.get("TTS_ON", False) else None
+                    )
+                if "translator" in changed:
+                    futures["translator"] = executor.submit(staged.init_translator)
+                if "live2d" in changed:
+                    staged.live2d = components["live2d"] = staged.init_live2d()
+                if "llm" in changed:
+                    components["llm"] = staged.init_llm()
+                for name, future in futures.items():
+                    components[name] = future.result() if future is not None else None
+        except BaseException:
+            for handle in staged._model_handles:
+                handle.release()
+            raise
+        return components, staged._model_handles
+
+    def _swap_components(
+        self, config: dict, components: dict, handles: list[model_registry.SharedModel]
+    ) -> None:
+        """Replace the running components with the new ones and release the replaced models."""
+        if "llm" in components and self.llm is not None:
+            components["llm"].set_history(self.llm.get_history())
+
+        released = []
+        for name in ("asr", "tts"):
+            if name in components:
+                old = getattr(self, name)
+                if any(old is handle for handle in self._model_handles):
+                    self._model_handles = [h for h in self._model_handles if h is not old]
+                    released.append(old)
+
+        for name, component in components.items():
+            setattr(self, name, component)
+        self.config = config
+        self._model_handles.extend(handles)
+        for handle in released:
+            handle.release()
+        logger.info(f"Switched config, rebuilt: {', '.join(sorted(components)) or 'nothing'}")
 
     def init_translator(self) -> TranslateInterface | None:
         if self.config.get("TRANSLATE_AUDIO", False):
@@ -602,29 +870,62 @@ class MyHandler(blivedm.BaseHandler):
     def __init__(self, vtuber_instance: OpenLLMVTuberMain):
         super().__init__()
         self.vtuber_instance = vtuber_instance
+        self.scheduler = DanmakuScheduler.from_config(
+            self._handle_message,
+            vtuber_instance.config.get("DANMAKU_SCHEDULER", {}),
+            handle_digest=self._handle_digest,
+        )
+
+    async def _handle_message(self, message: ViewerMessage):
+        # Treat the incoming message as user input
+        try:
+            response = await self.vtuber_instance.aconversation_chain(message.text)
+        except InterruptedError as e:
+            print(f"Conversation was interrupted. {e}")
+            return
+        print(f"AI Response: {response}")
+
+    async def _handle_digest(self, messages: list[ViewerMessage]):
+        # Answer several danmaku in one turn
+        try:
+            response = await self.vtuber_instance.aconversation_chain(
+                [{"name": message.uname, "content": message.text} for message in messages]
+            )
+        except InterruptedError as e:
+            print(f"Conversation was interrupted. {e}")
+            return
+        print(f"AI Response: {response}")
 
     def _on_heartbeat(self, client: blivedm.BLiveClient, message: web_models.HeartbeatMessage):
         print(f'[{client.room_id}] 心跳')
 
     def _on_danmaku(self, client: blivedm.BLiveClient, message: web_models.DanmakuMessage):
         print(f'[{client.room_id}] {message.uname}: {message.msg}')
-
-        # Treat the incoming message as user input
-        async def run_conversation():
-            # Run conversation_chain in a separate thread to avoid blocking the event loop
-            response = await asyncio.to_thread(self.vtuber_instance.conversation_chain, message.msg)
-            print(f"AI Response: {response}")
-
-        asyncio.create_task(run_conversation())
+        self.scheduler.submit(ViewerMessage(Priority.DANMAKU, message.uname, message.msg))
 
     def _on_gift(self, client: blivedm.BLiveClient, message: web_models.GiftMessage):
         print(f'[{client.room_id}] {message.uname} 赠送 {message.gift_name}x{message.num}')
+        self.scheduler.submit(ViewerMessage(
+            Priority.GIFT,
+            message.uname,
+            f'{message.uname} 赠送 {message.gift_name}x{message.num} [真的礼物]',
+        ))
 
     def _on_buy_guard(self, client: blivedm.BLiveClient, message: web_models.GuardBuyMessage):
         print(f'[{client.room_id}] {message.username} 购买 {message.gift_name}')
+        self.scheduler.submit(ViewerMessage(
+            Priority.GUARD_BUY,
+            message.username,
+            f'{message.username} 购买 {message.gift_name} [真的礼物]',
+        ))
 
     def _on_super_chat(self, client: blivedm.BLiveClient, message: web_models.SuperChatMessage):
         print(f'[{client.room_id}] 醒目留言 ¥{message.price} {message.uname}: {message.message}')
+        self.scheduler.submit(ViewerMessage(
+            Priority.SUPER_CHAT,
+            message.uname,
+            f'醒目留言 ¥{message.price} {message.uname}: {message.message} [真的礼物]',
+        ))
 
 
 async def init_session():
@@ -644,12 +945,14 @@ async def run_single_client(vtuber_instance: OpenLLMVTuberMain):
     client = blivedm.BLiveClient(room_id, session=session)
     handler = MyHandler(vtuber_instance)
     client.set_handler(handler)
+    scheduler_task = asyncio.create_task(handler.scheduler.run())
 
     client.start()
     try:
         # Keep running indefinitely; press Ctrl+C to exit
         await client.join()
     finally:
+        scheduler_task.cancel()
         await client.stop_and_close()
         await session.close()
 
@@ -668,8 +971,8 @@ if __name__ == "__main__":
     def _interrupt_on_i():
         while input(">>> say i and press enter to interrupt: ") == "i":
             print("\n\n!!!!!!!!!! interrupt !!!!!!!!!!!!...\n")
-            print("Heard sentence: ", vtuber_main.heard_sentence)
-            vtuber_main.interrupt(vtuber_main.heard_sentence)
+            print("Heard sentence: ", vtuber_main.pipeline.heard_sentence)
+            vtuber_main.interrupt(vtuber_main.pipeline.heard_sentence)
 
     if config.get("VOICE_INPUT_ON", False):
         threading.Thread(target=_interrupt_on_i).start()
@@ -0,0 +1,498 @@
+"""
+Asyncio-native conversation pipeline.
+
+One conversation turn flows through four long-lived stages that are connected
+by bounded asyncio queues:
+
+    LLM stream -> sentence segmenter -> TTS -> audio output
+
+The stages are started once per `ConversationPipeline` and live as long as the
+event loop they were started on. Each item travelling through the queues is
+tagged with the `Turn` it belongs to, so per-turn state (interrupt flag, heard
+sentence, full response) is never shared between turns.
+"""
+
+import asyncio
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Iterator
+import numpy as np
+from loguru import logger
+from utils import metrics
+
+if TYPE_CHECKING:
+    from main import OpenLLMVTuberMain
+
+# Marks the end of a turn in every queue of the pipeline.
+_END_OF_TURN = object()
+
+
+class Turn:
+    """
+    The state of one conversation turn travelling through the pipeline.
+
+    Attributes:
+        turn_id (str): Unique id of the turn.
+        chat_completion (Iterator[str]): The token iterator returned by the LLM.
+        started_at (float): `time.perf_counter()` when the prompt was sent to the LLM.
+        speak (bool): Whether the response should be synthesized and played.
+        by_sentence (bool): Whether to speak sentence by sentence, or the full response at once.
+        full_response (str): Everything the LLM has generated so far.
+        heard_sentence (str): Everything that has been sent to the audio output so far.
+        interrupted (threading.Event): Set when the turn is interrupted.
+            It is a threading.Event because the LLM stream is pulled from a worker thread.
+        synthesis_jobs (list[asyncio.Future]): The TTS jobs of the turn that may still be running.
+        done (asyncio.Future): Resolved when the last item of the turn has left the output stage.
+    """
+
+    def __init__(
+        self,
+        chat_completion: Iterator[str],
+        done: asyncio.Future,
+        speak: bool = True,
+        by_sentence: bool = True,
+        started_at: float | None = None,
+    ) -> None:
+        self.turn_id: str = uuid.uuid4().hex
+        self.chat_completion = chat_completion
+        self.started_at = time.perf_counter() if started_at is None else started_at
+        self.first_audio_played = False
+        self.speak = speak
+        self.by_sentence = by_sentence
+        self.heard_sentence: str = ""
+        self.synthesis_jobs: list[asyncio.Future] = []
+        self._response_parts: list[str] = []
+        self.interrupted = threading.Event()
+        self.done = done
+
+    @property
+    def full_response(self) -> str:
+        return "".join(self._response_parts)
+
+    def append_response(self, token: str) -> None:
+        self._response_parts.append(token)
+
+    def is_interrupted(self) -> bool:
+        return self.interrupted.is_set()
+
+
+class ConversationPipeline:
+    """
+    Runs conversation turns of an `OpenLLMVTuberMain` through long-lived async stages.
+
+    Only one turn is fed into the pipeline at a time, but the stages work on it
+    concurrently: the LLM keeps streaming while earlier sentences are being
+    synthesized and played.
+    """
+
+    def __init__(
+        self,
+        vtuber: "OpenLLMVTuberMain",
+        queue_size: int = 8,
+        tts_parallelism: int = 1,
+        stream_tts: bool = False,
+        stream_chunk_seconds: float = 1.0,
+    ) -> None:
+        """
+        Parameters:
+            vtuber (OpenLLMVTuberMain): The instance that owns the LLM, TTS and audio output.
+            queue_size (int): The maximum number of items buffered between two stages.
+            tts_parallelism (int): The maximum number of sentences synthesized at once.
+                Engines without `supports_concurrent_requests` still synthesize one at a time.
+            stream_tts (bool): Play the audio of a sentence chunk by chunk while the TTS
+                engine is still streaming it, see `TTSInterface.stream_pcm`.
+            stream_chunk_seconds (float): Streamed audio is sent to the audio output
+                in chunks of at least this length.
+        """
+        self.vtuber = vtuber
+        self.queue_size = queue_size
+        self.tts_parallelism = max(1, tts_parallelism)
+        self.stream_tts = stream_tts
+        self.stream_chunk_seconds = stream_chunk_seconds
+        self.current_turn: Turn | None = None
+
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._stage_tasks: list[asyncio.Task] = []
+        self._turn_lock: asyncio.Lock | None = None
+        # The LLM iterators and TTS engines are blocking, so they run on
+        # long-lived worker threads instead of fresh threads per turn.
+        self._llm_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="pipeline-llm"
+        )
+        self._tts_executor = ThreadPoolExecutor(
+            max_workers=self.tts_parallelism, thread_name_prefix="pipeline-tts"
+        )
+        self._serial_tts_lock = threading.Lock()
+
+    @property
+    def heard_sentence(self) -> str:
+        """The part of the current turn's response that has been sent to the audio output."""
+        if self.current_turn is None:
+            return ""
+        return self.current_turn.heard_sentence
+
+    def _ensure_started(self) -> None:
+        """Start the stage tasks on the running event loop if they are not running yet."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._stage_tasks:
+            return
+        self._loop = loop
+        self._turn_lock = asyncio.Lock()
+        self._turn_queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._token_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._sentence_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._audio_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tts_slots = asyncio.Semaphore(self.tts_parallelism)
+        self._stage_tasks = [
+            loop.create_task(self._llm_stage()),
+            loop.create_task(self._segmenter_stage()),
+            loop.create_task(self._tts_stage()),
+            loop.create_task(self._output_stage()),
+        ]
+
+    async def run_turn(
+        self,
+        chat_completion: Iterator[str],
+        speak: bool = True,
+        by_sentence: bool = True,
+        started_at: float | None = None,
+    ) -> Turn:
+        """
+        Feed one turn into the pipeline and wait until it has been fully played.
+
+        Parameters:
+            chat_completion (Iterator[str]): The token iterator returned by `LLMInterface.chat_iter`.
+            speak (bool): Whether to synthesize and play the response.
+            by_sentence (bool): Whether to speak sentence by sentence.
+            started_at (float, optional): `time.perf_counter()` when the prompt was sent
+                to the LLM. Latency metrics of the turn are measured from here.
+
+        Returns:
+            Turn: The finished turn. Check `turn.is_interrupted()` to know if it was interrupted.
+        """
+        self._ensure_started()
+        async with self._turn_lock:
+            turn = Turn(
+                chat_completion,
+                done=self._loop.create_future(),
+                speak=speak,
+                by_sentence=by_sentence,
+                started_at=started_at,
+            )
+            self.current_turn = turn
+            try:
+                await self._turn_queue.put(turn)
+                await turn.done
+            except asyncio.CancelledError:
+                # let the stages drain the remaining items of this turn
+                turn.interrupted.set()
+                raise
+            finally:
+                if self.current_turn is turn:
+                    self.current_turn = None
+            return turn
+
+    def interrupt(self) -> None:
+        """
+        Interrupt the turn currently in the pipeline, if any.
+        Can be called from any thread.
+        """
+        turn = self.current_turn
+        if turn is None:
+            return
+        turn.interrupted.set()
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._cancel_synthesis_jobs, turn)
+
+    async def close(self) -> None:
+        """Stop the stage tasks and the worker threads."""
+        for task in self._stage_tasks:
+            task.cancel()
+        await asyncio.gather(*self._stage_tasks, return_exceptions=True)
+        self._stage_tasks = []
+        self._llm_executor.shutdown(wait=False, cancel_futures=True)
+        self._tts_executor.shutdown(wait=False, cancel_futures=True)
+
+    # Stages
+
+    async def _llm_stage(self) -> None:
+        """Pull tokens from the blocking LLM iterator of each turn."""
+        while True:
+            turn: Turn = await self._turn_queue.get()
+            llm_provider = self.vtuber.config.get("LLM_PROVIDER")
+            iterator = iter(turn.chat_completion)
+            first_token_at = None
+            token_count = 0
+            try:
+                while not turn.is_interrupted():
+                    token = await self._loop.run_in_executor(
+                        self._llm_executor, next, iterator, _END_OF_TURN
+                    )
+                    if token is _END_OF_TURN:
+                        break
+                    if token:
+                        token_count += 1
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                            metrics.LLM_TIME_TO_FIRST_TOKEN_SECONDS.observe(
+                                first_token_at - turn.started_at, llm_provider=llm_provider
+                            )
+                        await self._token_queue.put((turn, token))
+            except Exception as e:
+                logger.error(f"LLM stage error: {e}")
+            finally:
+                if first_token_at is not None and token_count > 1:
+                    elapsed = time.perf_counter() - first_token_at
+                    if elapsed > 0:
+                        metrics.LLM_TOKENS_PER_SECOND.observe(
+                            (token_count - 1) / elapsed, llm_provider=llm_provider
+                        )
+                await self._token_queue.put((turn, _END_OF_TURN))
+
+    async def _segmenter_stage(self) -> None:
+        """Split the token stream into sentences and pass each one to the TTS stage."""
+        segmenter = self.vtuber.create_sentence_segmenter()
+        unsegmented: list[str] = []  # used when not speaking sentence by sentence
+        sentence_started_at = None
+        while True:
+            turn, token = await self._token_queue.get()
+            if token is _END_OF_TURN:
+                remaining = segmenter.flush()
+                if turn.speak and not turn.by_sentence:
+                    remaining = "".join(unsegmented)
+                unsegmented = []
+                if remaining and remaining.strip() and turn.speak and not turn.is_interrupted():
+                    await self._sentence_queue.put((turn, remaining))
+                segmenter = self.vtuber.create_sentence_segmenter()
+                sentence_started_at = None
+                await self._sentence_queue.put((turn, _END_OF_TURN))
+                continue
+            if turn.is_interrupted():
+                continue
+
+            print(token, end="", flush=True)
+            turn.append_response(token)
+            if not turn.speak:
+                continue
+            if not turn.by_sentence:
+                unsegmented.append(token)
+                continue
+            if sentence_started_at is None:
+                sentence_started_at = time.perf_counter()
+            for sentence in segmenter.feed(token):
+                metrics.SEGMENTER_WAIT_SECONDS.observe(
+                    time.perf_counter() - sentence_started_at
+                )
+                sentence_started_at = time.perf_counter()
+                await self._sentence_queue.put((turn, sentence))
+
+    async def _tts_stage(self) -> None:
+        """
+        Start the synthesis of each sentence without waiting for the previous one.
+        Up to `tts_parallelism` sentences are synthesized at once. The jobs are
+        queued in sentence order, so the output stage still plays them in order.
+        """
+        while True:
+            turn, sentence = await self._sentence_queue.get()
+            if sentence is _END_OF_TURN:
+                await self._audio_queue.put((turn, _END_OF_TURN))
+                continue
+            if turn.is_interrupted():
+                continue
+            await self._tts_slots.acquire()
+            chunks = None
+            if self.stream_tts:
+                chunks = asyncio.Queue()
+                job = self._loop.run_in_executor(
+                    self._tts_executor, self._synthesize_stream, turn, sentence, chunks
+                )
+                # ends the chunk stream even if the job was cancelled before it started
+                job.add_done_callback(lambda _, chunks=chunks: chunks.put_nowait(None))
+            else:
+                job = self._loop.run_in_executor(
+                    self._tts_executor, self._synthesize, turn, sentence
+                )
+            job.add_done_callback(lambda _: self._tts_slots.release())
+            turn.synthesis_jobs.append(job)
+            await self._audio_queue.put((turn, (sentence, job, chunks)))
+
+    def _synthesize(self, turn: Turn, sentence: str) -> dict | None:
+        """Run on a TTS worker thread. Skips the work if the turn was interrupted while queued."""
+        if turn.is_interrupted():
+            return None
+        start = time.perf_counter()
+        if getattr(self.vtuber.tts, "supports_concurrent_requests", False):
+            audio_info = self.vtuber._synthesize_sentence(sentence, in_memory=True)
+        else:
+            with self._serial_tts_lock:
+                audio_info = self.vtuber._synthesize_sentence(sentence, in_memory=True)
+        if audio_info.get("audio") is not None:
+            samples, sample_rate = audio_info["audio"]
+            self._observe_tts(time.perf_counter() - start, len(samples) / sample_rate)
+        if turn.is_interrupted():
+            self.vtuber._discard_audio_file(audio_info)
+            return None
+        return audio_info
+
+    def _synthesize_stream(self, turn: Turn, sentence: str, chunks: asyncio.Queue) -> None:
+        """
+        Run on a TTS worker thread. Puts the audio info of the sentence on `chunks`,
+        then its PCM chunks while the engine streams them. The done callback of the
+        job ends the stream with None.
+        """
+        if turn.is_interrupted():
+            return
+
+        def put(item) -> None:
+            self._loop.call_soon_threadsafe(chunks.put_nowait, item)
+
+        try:
+            self._stream_sentence(turn, sentence, put)
+        except Exception as e:
+            logger.error(
+                f"TTS stage error: Error streaming audio for sentence: '{sentence}'.\n{e}"
+            )
+
+    def _stream_sentence(self, turn: Turn, sentence: str, put) -> None:
+        start = time.perf_counter()
+        concurrent = getattr(self.vtuber.tts, "supports_concurrent_requests", False)
+        # the engine works while the stream is consumed, so hold the lock until the end
+        with nullcontext() if concurrent else self._serial_tts_lock:
+            audio_info = self.vtuber._synthesize_sentence(
+                sentence, in_memory=True, stream=True
+            )
+            stream = audio_info.pop("audio_stream", None)
+            put(audio_info)
+            if stream is None:
+                return
+
+            pending: list[np.ndarray] = []
+            pending_frames = 0
+            total_frames = 0
+            sample_rate = None
+            try:
+                for samples, sample_rate in stream:
+                    if turn.is_interrupted():
+                        return
+                    pending.append(samples)
+                    pending_frames += len(samples)
+                    total_frames += len(samples)
+                    if pending_frames >= self.stream_chunk_seconds * sample_rate:
+                        put((np.concatenate(pending), sample_rate))
+                        pending = []
+                        pending_frames = 0
+                if pending:
+                    put((np.concatenate(pending), sample_rate))
+            finally:
+                stream.close()
+        if total_frames:
+            self._observe_tts(time.perf_counter() - start, total_frames / sample_rate)
+
+    def _observe_tts(self, elapsed: float, duration: float) -> None:
+        tts_model = self.vtuber.config.get("TTS_MODEL")
+        metrics.TTS_SENTENCE_SECONDS.observe(elapsed, tts_model=tts_model)
+        if duration:
+            metrics.TTS_REAL_TIME_FACTOR.observe(elapsed / duration, tts_model=tts_model)
+
+    async def _output_stage(self) -> None:
+        """Wait for the synthesis jobs in sentence order and play them."""
+        while True:
+            turn, item = await self._audio_queue.get()
+            if item is _END_OF_TURN:
+                turn.synthesis_jobs.clear()
+                if not turn.done.done():
+                    turn.done.set_result(turn)
+                continue
+            sentence, job, chunks = item
+            if turn.is_interrupted():
+                self._drop_job(job)
+                continue
+            if chunks is not None:
+                await self._play_stream(turn, sentence, chunks)
+                continue
+            try:
+                audio_info = await job
+            except asyncio.CancelledError:
+                if job.cancelled():
+                    continue
+                raise
+            except Exception as e:
+                logger.error(
+                    f"TTS stage error: Error generating audio for sentence: '{sentence}'.\n{e}"
+                )
+                continue
+            if audio_info is None:
+                continue
+            if turn.is_interrupted():
+                self.vtuber._discard_audio_file(audio_info)
+                continue
+            turn.heard_sentence += audio_info["sentence"]
+            await self._play(
+                turn,
+                audio_info["sentence"],
+                filepath=audio_info["audio_filepath"],
+                audio=audio_info.get("audio"),
+            )
+
+    async def _play_stream(self, turn: Turn, sentence: str, chunks: asyncio.Queue) -> None:
+        """Play the chunks of a streamed sentence as they arrive."""
+        audio_info = await chunks.get()
+        if audio_info is None:
+            logger.error(f"TTS stage error: No audio generated for sentence: '{sentence}'.")
+            return
+        if turn.is_interrupted():
+            self.vtuber._discard_audio_file(audio_info)
+            return
+        turn.heard_sentence += audio_info["sentence"]
+        # the sentence is displayed with the first chunk only
+        display_text = audio_info["sentence"]
+        if audio_info["audio_filepath"] or audio_info.get("audio") is not None:
+            await self._play(
+                turn,
+                display_text,
+                filepath=audio_info["audio_filepath"],
+                audio=audio_info.get("audio"),
+            )
+            display_text = ""
+        while (chunk := await chunks.get()) is not None:
+            if turn.is_interrupted():
+                continue
+            await self._play(turn, display_text, filepath=None, audio=chunk)
+            display_text = ""
+
+    async def _play(
+        self,
+        turn: Turn,
+        sentence: str,
+        filepath: str | None,
+        audio: tuple[np.ndarray, int] | None,
+    ) -> None:
+        if not turn.first_audio_played:
+            turn.first_audio_played = True
+            metrics.TIME_TO_FIRST_AUDIO_SECONDS.observe(
+                time.perf_counter() - turn.started_at,
+                llm_provider=self.vtuber.config.get("LLM_PROVIDER"),
+                tts_model=self.vtuber.config.get("TTS_MODEL"),
+            )
+        try:
+            await self.vtuber._play_audio_file_async(
+                sentence=sentence, filepath=filepath, audio=audio
+            )
+        except Exception as e:
+            logger.error(f"Output stage error: Error playing sentence '{sentence}'.\n {e}")
+
+    def _drop_job(self, job: asyncio.Future) -> None:
+        """Throw away the result of a synthesis job that will never be played."""
+        if not job.done():
+            job.cancel()
+        elif not job.cancelled() and job.exception() is None and job.result():
+            self.vtuber._discard_audio_file(job.result())
+
+    def _cancel_synthesis_jobs(self, turn: Turn) -> None:
+        """Cancel the synthesis jobs of an interrupted turn that have not started yet."""
+        for job in turn.synthesis_jobs:
+            if not job.done():
+                job.cancel()
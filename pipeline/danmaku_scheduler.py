@@ -0,0 +1,390 @@
+"""
+Priority scheduler and admission control for Bilibili live room messages.
+
+blivedm handlers `submit` every danmaku, gift, guard buy and super chat to a
+`DanmakuScheduler`. The scheduler keeps a bounded backlog per priority class
+and feeds the messages one at a time to the conversation, highest priority
+first, so turns never race on the same `OpenLLMVTuberMain`.
+
+Admission and drop policy:
+- Super chats and guard buys are paid messages. They are always admitted,
+  never rate-limited and never evicted.
+- Commands (danmaku starting with "#") are answered before gifts and danmaku,
+  but they are not paid: they are rate-limited, expire, and at most
+  `max_command_backlog` of them wait at once.
+- Commands, gifts and danmaku go through a per-viewer token bucket. A danmaku from a
+  viewer who already has a danmaku waiting is merged into the waiting one.
+- When the backlog is full, the oldest message of the lowest non-empty class
+  is evicted if that class is not more important than the new message.
+  Otherwise the new message is rejected.
+- A message waiting longer than the TTL of its class is dropped when it
+  reaches the front of the backlog.
+
+Digest mode: when at least `digest_min_backlog` danmaku are waiting and
+nothing more important is, up to `digest_max_messages` danmaku that arrived
+within `digest_window` seconds of the oldest one are answered together in
+one LLM turn by `handle_digest`.
+"""
+
+import asyncio
+import itertools
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Awaitable, Callable
+from loguru import logger
+
+
+class Priority(IntEnum):
+    """Priority classes of viewer messages. Lower values are answered first."""
+
+    SUPER_CHAT = 0
+    GUARD_BUY = 1
+    COMMAND = 2
+    GIFT = 3
+    DANMAKU = 4
+
+
+PAID_PRIORITIES = (Priority.SUPER_CHAT, Priority.GUARD_BUY)
+
+# Seconds a message may wait in the backlog. None means it never expires.
+DEFAULT_TTL_SECONDS = {
+    Priority.SUPER_CHAT: None,
+    Priority.GUARD_BUY: None,
+    Priority.COMMAND: 60.0,
+    Priority.GIFT: 120.0,
+    Priority.DANMAKU: 30.0,
+}
+
+_sequence = itertools.count()
+
+
+@dataclass
+class ViewerMessage:
+    """
+    One message from the live room, waiting to be answered.
+
+    Attributes:
+        priority (Priority): The priority class of the message.
+        uname (str): The name of the viewer.
+        text (str): The prompt to send to the LLM.
+        created_at (float): `time.monotonic()` when the message arrived.
+        ttl (float, optional): Overrides the TTL of the priority class for this message.
+    """
+
+    priority: Priority
+    uname: str
+    text: str
+    created_at: float = field(default_factory=time.monotonic)
+    ttl: float | None = None
+    seq: int = field(default_factory=lambda: next(_sequence))
+
+    def age(self, now: float | None = None) -> float:
+        return (time.monotonic() if now is None else now) - self.created_at
+
+
+class TokenBucket:
+    """A token bucket that refills `rate` tokens per second up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def try_take(self, now: float | None = None) -> bool:
+        now = time.monotonic() if now is None else now
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def is_full(self, now: float | None = None) -> bool:
+        """True if the bucket has refilled, so it is no different from a new one."""
+        now = time.monotonic() if now is None else now
+        return self.tokens + (now - self.updated_at) * self.rate >= self.capacity
+
+
+class DanmakuScheduler:
+    """
+    Sits between blivedm and the conversation pipeline.
+    Call `submit` from the blivedm handlers and run `run()` as a task.
+    """
+
+    def __init__(
+        self,
+        handle_message: Callable[[ViewerMessage], Awaitable[None]],
+        max_backlog: int = 50,
+        max_command_backlog: int = 5,
+        viewer_rate: float = 0.1,
+        viewer_burst: float = 2,
+        ttl_seconds: dict[Priority, float | None] | None = None,
+        merge_danmaku: bool = True,
+        answer_last_expired: bool = False,
+        handle_digest: Callable[[list[ViewerMessage]], Awaitable[None]] | None = None,
+        digest_max_messages: int = 5,
+        digest_window: float = 20.0,
+        digest_min_backlog: int = 3,
+    ) -> None:
+        """
+        Parameters:
+            handle_message (Callable): Coroutine function that answers one message.
+                The next message is not started before it returns.
+            max_backlog (int): The maximum number of commands, gifts and danmaku waiting.
+            max_command_backlog (int): The maximum number of commands waiting.
+            viewer_rate (float): Messages per second each viewer may add to the backlog.
+            viewer_burst (float): How many messages a viewer may send at once.
+            ttl_seconds (dict, optional): Seconds a message of each priority class may wait.
+            merge_danmaku (bool): Merge a danmaku into the waiting danmaku of the same viewer.
+            answer_last_expired (bool): Answer an expired message anyway if nothing else is waiting.
+            handle_digest (Callable, optional): Coroutine function that answers several danmaku
+                in one turn. Digest mode is off if it is None.
+            digest_max_messages (int): The maximum number of danmaku in one digest.
+            digest_window (float): Only danmaku sent within this many seconds of the oldest
+                one are put in the same digest.
+            digest_min_backlog (int): Digest mode starts when this many danmaku are waiting.
+        """
+        self.handle_message = handle_message
+        self.max_backlog = max_backlog
+        self.max_command_backlog = max_command_backlog
+        self.viewer_rate = viewer_rate
+        self.viewer_burst = viewer_burst
+        self.ttl_seconds = dict(DEFAULT_TTL_SECONDS)
+        if ttl_seconds:
+            self.ttl_seconds.update(ttl_seconds)
+        self.merge_danmaku = merge_danmaku
+        self.answer_last_expired = answer_last_expired
+        self.handle_digest = handle_digest
+        self.digest_max_messages = digest_max_messages
+        self.digest_window = digest_window
+        self.digest_min_backlog = digest_min_backlog
+
+        self._backlog: dict[Priority, deque[ViewerMessage]] = {
+            priority: deque() for priority in Priority
+        }
+        self._pending_danmaku: dict[str, ViewerMessage] = {}
+        self._buckets: dict[str, TokenBucket] = {}
+        self._buckets_pruned_at = time.monotonic()
+        self._wakeup = asyncio.Event()
+        self.current_message: ViewerMessage | None = None
+        self.last_processed_time = time.monotonic()
+        self.stats = {
+            "admitted": 0,
+            "merged": 0,
+            "rate_limited": 0,
+            "evicted": 0,
+            "rejected": 0,
+            "expired": 0,
+            "answered": 0,
+            "digested": 0,
+        }
+
+    @classmethod
+    def from_config(
+        cls,
+        handle_message: Callable[[ViewerMessage], Awaitable[None]],
+        scheduler_config: dict,
+        handle_digest: Callable[[list[ViewerMessage]], Awaitable[None]] | None = None,
+        **kwargs,
+    ) -> "DanmakuScheduler":
+        """
+        Create a scheduler from the DANMAKU_SCHEDULER section of conf.yaml.
+        `handle_digest` is only used if DIGEST_MODE is on.
+        """
+        ttl_config = scheduler_config.get("TTL_SECONDS", {}) or {}
+        ttl_seconds = {
+            Priority[name]: (seconds if seconds else None)
+            for name, seconds in ttl_config.items()
+        }
+        return cls(
+            handle_message,
+            max_backlog=scheduler_config.get("MAX_BACKLOG", 50),
+            max_command_backlog=scheduler_config.get("MAX_COMMAND_BACKLOG", 5),
+            viewer_rate=scheduler_config.get("VIEWER_RATE", 0.1),
+            viewer_burst=scheduler_config.get("VIEWER_BURST", 2),
+            ttl_seconds=ttl_seconds,
+            merge_danmaku=scheduler_config.get("MERGE_DANMAKU", True),
+            handle_digest=handle_digest if scheduler_config.get("DIGEST_MODE", False) else None,
+            digest_max_messages=scheduler_config.get("DIGEST_MAX_MESSAGES", 5),
+            digest_window=scheduler_config.get("DIGEST_WINDOW_SECONDS", 20.0),
+            digest_min_backlog=scheduler_config.get("DIGEST_MIN_BACKLOG", 3),
+            **kwargs,
+        )
+
+    def is_idle(self) -> bool:
+        """True if no message is being answered or waiting."""
+        return self.current_message is None and self.backlog_size() == 0
+
+    def backlog_size(self, include_paid: bool = True) -> int:
+        return sum(
+            len(queue)
+            for priority, queue in self._backlog.items()
+            if include_paid or priority not in PAID_PRIORITIES
+        )
+
+    def submit(self, message: ViewerMessage) -> bool:
+        """
+        Offer a message to the backlog. Must be called from the event loop thread.
+
+        Returns:
+            bool: False if the message was dropped.
+        """
+        if message.priority not in PAID_PRIORITIES:
+            self._prune_buckets()
+            bucket = self._buckets.get(message.uname)
+            if bucket is None:
+                bucket = TokenBucket(self.viewer_rate, self.viewer_burst)
+                self._buckets[message.uname] = bucket
+            if not bucket.try_take():
+                self.stats["rate_limited"] += 1
+                logger.debug(f"Rate limited message from {message.uname}: {message.text}")
+                return False
+
+            if message.priority == Priority.DANMAKU and self.merge_danmaku:
+                waiting = self._pending_danmaku.get(message.uname)
+                if waiting is not None:
+                    waiting.text = f"{waiting.text}\n{message.text}"
+                    waiting.created_at = message.created_at
+                    self.stats["merged"] += 1
+                    return True
+
+            if (
+                message.priority == Priority.COMMAND
+                and len(self._backlog[Priority.COMMAND]) >= self.max_command_backlog
+            ):
+                self.stats["rejected"] += 1
+                logger.debug(f"Too many commands waiting, rejected: {message.text}")
+                return False
+
+            if self.backlog_size(include_paid=False) >= self.max_backlog:
+                if not self._evict_for(message):
+                    self.stats["rejected"] += 1
+                    logger.debug(f"Backlog full, rejected: {message.text}")
+                    return False
+
+        self._backlog[message.priority].append(message)
+        if message.priority == Priority.DANMAKU:
+            self._pending_danmaku[message.uname] = message
+        self.stats["admitted"] += 1
+        self._wakeup.set()
+        return True
+
+    def _prune_buckets(self) -> None:
+        """
+        Forget the buckets of viewers who have been quiet long enough for them to refill,
+        so a long stream does not keep a bucket for every viewer it ever had.
+        Runs at most once per refill time of a bucket.
+        """
+        now = time.monotonic()
+        refill_seconds = self.viewer_burst / self.viewer_rate if self.viewer_rate > 0 else None
+        if refill_seconds is None or now - self._buckets_pruned_at < refill_seconds:
+            return
+        self._buckets_pruned_at = now
+        self._buckets = {
+            uname: bucket
+            for uname, bucket in self._buckets.items()
+            if not bucket.is_full(now)
+        }
+
+    def _evict_for(self, message: ViewerMessage) -> bool:
+        """Make room for `message` by evicting the oldest message of the lowest class."""
+        now = time.monotonic()
+        for priority in reversed(Priority):
+            if priority in PAID_PRIORITIES or priority < message.priority:
+                break
+            queue = self._backlog[priority]
+            # expired messages are the first to go
+            for waiting in queue:
+                if self._is_expired(waiting, now):
+                    self._remove(waiting)
+                    self.stats["expired"] += 1
+                    return True
+            if queue:
+                self._remove(queue[0])
+                self.stats["evicted"] += 1
+                return True
+        return False
+
+    def _remove(self, message: ViewerMessage) -> None:
+        self._backlog[message.priority].remove(message)
+        if self._pending_danmaku.get(message.uname) is message:
+            del self._pending_danmaku[message.uname]
+
+    def _is_expired(self, message: ViewerMessage, now: float) -> bool:
+        ttl = message.ttl if message.ttl is not None else self.ttl_seconds.get(message.priority)
+        return ttl is not None and message.age(now) > ttl
+
+    def _next_batch(self) -> list[ViewerMessage]:
+        """
+        Pop the most important message that has not expired, or a digest of danmaku.
+        Returns an empty list if nothing is waiting.
+        """
+        now = time.monotonic()
+        for priority in Priority:
+            queue = self._backlog[priority]
+            if (
+                priority == Priority.DANMAKU
+                and self.handle_digest is not None
+                and len(queue) >= self.digest_min_backlog
+            ):
+                return self._next_digest(now)
+            while queue:
+                message = self._pop(queue, now)
+                if message is not None:
+                    return [message]
+        return []
+
+    def _next_digest(self, now: float) -> list[ViewerMessage]:
+        """Pop up to `digest_max_messages` danmaku sent within `digest_window` of each other."""
+        queue = self._backlog[Priority.DANMAKU]
+        batch = []
+        while queue and len(batch) < self.digest_max_messages:
+            if batch and queue[0].created_at - batch[0].created_at > self.digest_window:
+                break
+            message = self._pop(queue, now)
+            if message is not None:
+                batch.append(message)
+        return batch
+
+    def _pop(self, queue: deque[ViewerMessage], now: float) -> ViewerMessage | None:
+        """Pop the first message of `queue`. Returns None if it has expired."""
+        message = queue.popleft()
+        if self._pending_danmaku.get(message.uname) is message:
+            del self._pending_danmaku[message.uname]
+        if not self._is_expired(message, now):
+            return message
+        if self.answer_last_expired and self.backlog_size() == 0:
+            return message
+        self.stats["expired"] += 1
+        logger.debug(
+            f"Discarding message due to age {message.age(now):.0f}s: {message.text}"
+        )
+        return None
+
+    async def run(self) -> None:
+        """Answer the backlog one message (or one digest) at a time, forever."""
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            self.current_message = batch[0]
+            try:
+                if len(batch) > 1:
+                    logger.info(f"Answering a digest of {len(batch)} danmaku")
+                    self.stats["digested"] += len(batch)
+                    await self.handle_digest(batch)
+                else:
+                    await self.handle_message(batch[0])
+            except Exception as e:
+                logger.error(f"Error handling message '{batch[0].text}': {e}")
+            finally:
+                self.current_message = None
+            self.stats["answered"] += len(batch)
+            self.last_processed_time = time.monotonic()
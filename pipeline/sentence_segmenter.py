@@ -0,0 +1,186 @@
+"""
+Incremental sentence segmenter for streamed LLM output.
+
+`SentenceSegmenter` consumes token deltas and returns complete sentences as
+soon as their boundaries are known. Every character is looked at once and the
+text is only joined when a sentence is emitted, so the work per character is
+O(1) amortized, no matter how long the reply is.
+"""
+
+# Punctuation that ends a sentence
+SENTENCE_TERMINALS = frozenset(".?!。；？！…〰〜～")
+
+# Characters that may follow a sentence terminal and still belong to the sentence
+CLOSING_CHARS = frozenset("\"'”’)）]】」』》>")
+
+# Punctuation where a short first clause may be flushed early
+CLAUSE_PUNCTUATION = frozenset(",，、;：:")
+
+# Words that end with a "." without ending a sentence (compared without the final ".")
+ABBREVIATIONS = frozenset(
+    [
+        "Dr", "Mr", "Ms", "Mrs", "Jr", "Sr", "St", "Ave", "Rd", "Blvd", "Dept",
+        "Univ", "Prof", "Ph.D", "M.D", "U.S", "U.K", "U.N", "E.U", "U.S.A",
+        "U.S.S.R", "U.A.E", "e.g", "i.e", "etc", "vs", "No", "Inc", "Ltd", "Co",
+    ]
+)
+_MAX_ABBREVIATION_LENGTH = max(len(abbr) for abbr in ABBREVIATIONS)
+
+
+class SentenceSegmenter:
+    """
+    Split a stream of LLM tokens into sentences for TTS.
+
+    Chinese and English punctuation are both recognized. A "." only ends a
+    sentence when it is followed by whitespace and does not end a known
+    abbreviation, an initial ("J. K.") or an ellipsis ("..."). Text inside
+    `{...}` (the play_song action) is never split, and the closing "}" ends a
+    sentence.
+
+    With `fast_first_clause` enabled, the first segment of a reply is flushed
+    early at a clause punctuation such as a comma, or after
+    `first_clause_max_chars` characters, so the TTS can start before the first
+    full sentence is finished.
+    """
+
+    def __init__(
+        self,
+        fast_first_clause: bool = False,
+        first_clause_min_chars: int = 4,
+        first_clause_max_chars: int = 30,
+    ) -> None:
+        """
+        Parameters:
+            fast_first_clause (bool): Whether to flush a short first clause early.
+            first_clause_min_chars (int): A first clause shorter than this is never flushed at a comma.
+            first_clause_max_chars (int): The first clause is flushed after this many characters
+                even if no punctuation was found.
+        """
+        self.fast_first_clause = fast_first_clause
+        self.first_clause_min_chars = first_clause_min_chars
+        self.first_clause_max_chars = first_clause_max_chars
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget the buffered text, ready for a new reply."""
+        self._chars: list[str] = []
+        # set when the buffer ends with a sentence terminal that waits for the next character
+        self._pending_terminal = False
+        self._brace_depth = 0
+        self._last_space = -1
+        self._segments_emitted = 0
+
+    def feed(self, delta: str) -> list[str]:
+        """
+        Add a token delta from the LLM.
+
+        Parameters:
+            delta (str): The new text.
+
+        Returns:
+            list[str]: The sentences completed by this delta, in order. Usually empty.
+        """
+        segments = []
+        for char in delta:
+            if self._pending_terminal:
+                if char in SENTENCE_TERMINALS or char in CLOSING_CHARS:
+                    self._chars.append(char)
+                    continue
+                self._pending_terminal = False
+                if self._is_sentence_boundary(char):
+                    segments.append(self._emit(len(self._chars)))
+
+            self._chars.append(char)
+
+            if char == "{":
+                self._brace_depth += 1
+                continue
+            if char == "}" and self._brace_depth > 0:
+                self._brace_depth -= 1
+                if self._brace_depth == 0:
+                    segments.append(self._emit(len(self._chars)))
+                continue
+            if self._brace_depth > 0:
+                continue
+
+            if char.isspace():
+                self._last_space = len(self._chars) - 1
+            elif char in SENTENCE_TERMINALS:
+                self._pending_terminal = True
+            elif self._segments_emitted == 0 and self.fast_first_clause:
+                segment = self._first_clause(char)
+                if segment is not None:
+                    segments.append(segment)
+        return segments
+
+    def flush(self) -> str | None:
+        """
+        Return whatever is left in the buffer at the end of the reply.
+
+        Returns:
+            str | None: The remaining text, or None if only whitespace is left.
+        """
+        text = "".join(self._chars)
+        self.reset()
+        if not text.strip():
+            return None
+        return text
+
+    def _emit(self, end: int) -> str:
+        """Remove and return the first `end` buffered characters as one segment."""
+        segment = "".join(self._chars[:end])
+        del self._chars[:end]
+        self._last_space = -1
+        for i in range(len(self._chars) - 1, -1, -1):
+            if self._chars[i].isspace():
+                self._last_space = i
+                break
+        self._segments_emitted += 1
+        return segment
+
+    def _first_clause(self, char: str) -> str | None:
+        """Flush the first clause early if the policy allows it."""
+        length = len(self._chars)
+        if char in CLAUSE_PUNCTUATION and length >= self.first_clause_min_chars:
+            return self._emit(length)
+        if length >= self.first_clause_max_chars:
+            # prefer to cut English text between two words
+            if self._last_space >= self.first_clause_min_chars:
+                return self._emit(self._last_space + 1)
+            return self._emit(length)
+        return None
+
+    def _is_sentence_boundary(self, next_char: str) -> bool:
+        """
+        Decide if the terminal punctuation at the end of the buffer ends a sentence,
+        now that the character after it is known.
+        """
+        end = len(self._chars)
+        while end > 0 and self._chars[end - 1] in CLOSING_CHARS:
+            end -= 1
+        start = end
+        while start > 0 and self._chars[start - 1] in SENTENCE_TERMINALS:
+            start -= 1
+        terminals = self._chars[start:end]
+        if any(terminal != "." for terminal in terminals):
+            return True
+
+        # Only "." from here on
+        if len(terminals) > 1:  # "..."
+            return False
+        if not next_char.isspace():  # "3.14", "example.com"
+            return False
+
+        word_start = start
+        while (
+            word_start > 0
+            and start - word_start <= _MAX_ABBREVIATION_LENGTH
+            and not self._chars[word_start - 1].isspace()
+        ):
+            word_start -= 1
+        word = "".join(self._chars[word_start:start])
+        if word in ABBREVIATIONS:
+            return False
+        if len(word) == 1 and word.isupper():  # initials like "J. K. Rowling"
+            return False
+        return True
@@ -4,17 +4,27 @@ import shutil
 import atexit
 import json
 import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any
 import yaml
 import numpy as np
 import chardet
 from loguru import logger
 from fastapi import FastAPI, WebSocket, APIRouter
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from starlette.websockets import WebSocketDisconnect
 from main import OpenLLMVTuberMain
 from live2d_model import Live2dModel
 from tts.stream_audio import AudioPayloadPreparer
+from utils import metrics
+from utils import model_registry, ws_protocol
+from utils.audio_accumulator import AudioAccumulator
+from utils.session_recording import SessionRecorder
+from utils.startup import StartupTimer
+from asr.streaming_asr import StreamingTranscriber
+from asr.stream_vad import StreamVAD
 import __init__
 
 
@@ -28,6 +38,7 @@ class WebSocketServer:
         router (APIRouter): APIRouter instance for routing.
         connected_clients (List[WebSocket]): List of connected WebSocket clients for "/client-ws".
         server_ws_clients (List[WebSocket]): List of connected WebSocket clients for "/server-ws".
+        binary_audio_clients (set[WebSocket]): Clients of "/client-ws" that use the binary audio protocol.
     """
 
     def __init__(self, open_llm_vtuber_main_config: Dict | None = None):
@@ -38,12 +49,17 @@ class WebSocketServer:
         self.app = FastAPI()
         self.router = APIRouter()
         self.connected_clients: List[WebSocket] = []
+        self.binary_audio_clients: set[WebSocket] = set()
         self.open_llm_vtuber_main_config = open_llm_vtuber_main_config
 
         # Initialize model manager
         self.preload_models = self.open_llm_vtuber_main_config.get("SERVER", {}).get(
             "PRELOAD_MODELS", False
         )
+        # Set once the preloaded models are loaded and warmed up. The server accepts
+        # connections before that; "/ready" tells a health check when it is.
+        self.ready = threading.Event()
+        self.preload_error: str | None = None
         if self.preload_models:
             logger.info("Preloading ASR and TTS models...")
             logger.info(
@@ -54,28 +70,51 @@ class WebSocketServer:
             )
 
             self.model_manager = ModelManager(self.open_llm_vtuber_main_config)
-            self.model_manager.initialize_models()
+            threading.Thread(
+                target=self._preload_models, name="preload-models", daemon=True
+            ).start()
+        else:
+            self.ready.set()
 
         self._setup_routes()
         self._mount_static_files()
         self.app.include_router(self.router)
+        self._lag_monitor: asyncio.Task | None = None
+        self.app.add_event_handler("startup", self._start_lag_monitor)
+
+    async def _start_lag_monitor(self) -> None:
+        """Export the lag of the event loop that serves all sessions in /metrics."""
+        self._lag_monitor = asyncio.create_task(metrics.monitor_event_loop_lag())
 
     async def _handle_config_switch(
-        self, websocket: WebSocket, config_file: str
-    ) -> tuple[Live2dModel, OpenLLMVTuberMain] | None:
-        """处理配置切换，返回新的组件实例"""
+        self,
+        websocket: WebSocket,
+        config_file: str,
+        open_llm_vtuber: OpenLLMVTuberMain,
+    ) -> Live2dModel | None:
+        """
+        处理配置切换。
+        Only the components whose settings changed are rebuilt, in the background,
+        while the session goes on; they are swapped in between two turns and the
+        chat history is kept. Returns the Live2D model of the new config, or None
+        if the switch failed or the session has no Live2D model of its own.
+        """
         new_config = self._load_config_from_file(config_file)
         if new_config:
             try:
-                # 更新模型缓存
+                switches = [open_llm_vtuber.aapply_config(new_config)]
+                # 更新模型缓存, in parallel: both take the same models from the registry
                 if self.preload_models:
-                    self.model_manager.update_models(new_config)
+                    switches.append(
+                        asyncio.to_thread(self.model_manager.update_models, new_config)
+                    )
+                changed, *_ = await asyncio.gather(*switches)
 
-                # 更新当前配置
+                # 更新当前配置, for the sessions that connect later
                 self.open_llm_vtuber_main_config.update(new_config)
 
-                # 重新初始化组件
-                l2d, open_llm_vtuber, _ = self._initialize_components(websocket)
+                # rebuilt by the switch if the model changed
+                l2d = open_llm_vtuber.live2d
 
                 await websocket.send_text(
                     json.dumps(
@@ -85,12 +124,16 @@ class WebSocketServer:
                         }
                     )
                 )
-                await websocket.send_text(
-                    json.dumps({"type": "set-model", "text": l2d.model_info})
+                if l2d is not None:
+                    await websocket.send_text(
+                        json.dumps({"type": "set-model", "text": l2d.model_info})
+                    )
+                logger.info(
+                    f"Configuration switched to {config_file}, "
+                    f"rebuilt: {', '.join(sorted(changed)) or 'nothing'}"
                 )
-                logger.info(f"Configuration switched to {config_file}")
 
-                return l2d, open_llm_vtuber
+                return l2d
 
             except Exception as e:
                 logger.error(f"Error switching configuration: {e}")
@@ -105,28 +148,31 @@ class WebSocketServer:
                 return None
         return None
 
+    def _preload_models(self) -> None:
+        try:
+            self.model_manager.initialize_models()
+        except Exception as e:
+            # the sessions load the models themselves then
+            logger.error(f"Error preloading models: {e}")
+            self.preload_error = str(e)
+        self.ready.set()
+
     def _initialize_components(
         self, websocket: WebSocket
     ) -> tuple[Live2dModel, OpenLLMVTuberMain, AudioPayloadPreparer]:
         """Initialize or reinitialize components with current configuration."""
-        l2d = Live2dModel(self.open_llm_vtuber_main_config["LIVE2D_MODEL"])
-
-        # Use cached models if available
-        custom_asr = (
-            self.model_manager.cache.get("asr") if self.preload_models else None
-        )
-        custom_tts = (
-            self.model_manager.cache.get("tts") if self.preload_models else None
-        )
-
-        open_llm_vtuber = OpenLLMVTuberMain(
-            self.open_llm_vtuber_main_config,
-            custom_asr=custom_asr,
-            custom_tts=custom_tts,
+        # The ASR and TTS models come from the shared model registry: a session
+        # takes its own reference to them, and only the first one loads them.
+        # With preloading, the model manager already holds them.
+        open_llm_vtuber = OpenLLMVTuberMain(self.open_llm_vtuber_main_config)
+        l2d = open_llm_vtuber.live2d or Live2dModel(
+            self.open_llm_vtuber_main_config["LIVE2D_MODEL"]
         )
 
         audio_preparer = AudioPayloadPreparer()
 
+        # The expressions are looked up on the Live2D model of the vtuber, which is
+        # replaced when the session switches to a config with another model.
         # Set up the audio playback function
         def _websocket_audio_handler(
             sentence: str | None, filepath: str | None
@@ -139,15 +185,17 @@ class WebSocketServer:
                 sentence = ""
 
             logger.info(f"Playing {filepath}...")
-            payload, duration = audio_preparer.prepare_audio_payload(
+            payload, duration = self._prepare_audio_payload(
+                audio_preparer,
                 audio_path=filepath,
                 display_text=sentence,
-                expression_list=l2d.extract_emotion(sentence),
+                expression_list=(open_llm_vtuber.live2d or l2d).extract_emotion(sentence),
+                binary=websocket in self.binary_audio_clients,
             )
             logger.info("Payload prepared")
 
             async def _send_audio():
-                await websocket.send_text(json.dumps(payload))
+                await self._send_audio_payload(websocket, payload)
                 await asyncio.sleep(duration)
 
             new_loop = asyncio.new_event_loop()
@@ -157,18 +205,85 @@ class WebSocketServer:
 
             logger.info("Audio played")
 
+        async def _async_websocket_audio_handler(
+            sentence: str | None,
+            filepath: str | None,
+            audio: tuple[np.ndarray, int] | None = None,
+        ) -> None:
+            if filepath is None and audio is None:
+                logger.info("No audio to be streamed. Response is empty.")
+                return
+
+            if sentence is None:
+                sentence = ""
+
+            logger.info(f"Playing {filepath or 'audio buffer'}...")
+            payload, duration = await asyncio.to_thread(
+                self._prepare_audio_payload,
+                audio_preparer,
+                audio_path=filepath,
+                display_text=sentence,
+                expression_list=(open_llm_vtuber.live2d or l2d).extract_emotion(sentence),
+                audio=audio,
+                binary=websocket in self.binary_audio_clients,
+            )
+            logger.info("Payload prepared")
+
+            await self._send_audio_payload(websocket, payload)
+            await asyncio.sleep(duration)
+
+            logger.info("Audio played")
+
         open_llm_vtuber.set_audio_output_func(_websocket_audio_handler)
+        open_llm_vtuber.set_async_audio_output_func(_async_websocket_audio_handler)
         return l2d, open_llm_vtuber, audio_preparer
 
+    @staticmethod
+    def _prepare_audio_payload(
+        audio_preparer: AudioPayloadPreparer, **kwargs
+    ) -> tuple[dict, float]:
+        """Prepare the audio payload and record how long it took."""
+        with metrics.AUDIO_PAYLOAD_PREPARE_SECONDS.time():
+            return audio_preparer.prepare_audio_payload(**kwargs)
+
+    @staticmethod
+    async def _send_audio_payload(websocket: WebSocket, payload: dict) -> None:
+        """Send an audio payload as JSON text, or as a binary frame if it holds raw bytes."""
+        with metrics.WEBSOCKET_SEND_SECONDS.time():
+            if isinstance(payload["audio"], bytes):
+                await websocket.send_bytes(ws_protocol.encode_audio_frame(payload))
+            else:
+                await websocket.send_text(json.dumps(payload))
+
     def _setup_routes(self):
         """Sets up the WebSocket and broadcast routes."""
 
+        # Latency histograms of the pipeline in the Prometheus text format
+        @self.app.get("/ready")
+        async def ready_endpoint():
+            """200 once the preloaded models are ready, 503 while they are loading."""
+            ready = self.ready.is_set() and self.preload_error is None
+            content = {"ready": ready}
+            if self.preload_models:
+                content["startup"] = self.model_manager.startup.to_dict()
+            if self.preload_error is not None:
+                content["error"] = self.preload_error
+            return JSONResponse(content, status_code=200 if ready else 503)
+
+        @self.app.get("/metrics")
+        async def metrics_endpoint():
+            return PlainTextResponse(
+                metrics.render_metrics(), media_type="text/plain; version=0.0.4"
+            )
+
         # the connection between this server and the frontend client
         # The version 2 of the client-ws. Introduces breaking changes.
         # This route will initiate its own main.py instance and conversation loop
         @self.app.websocket("/client-ws")
         async def websocket_endpoint(websocket: WebSocket):
             await websocket.accept()
+            # the messages of the client, to replay the session later
+            recorder = SessionRecorder.from_config(self.open_llm_vtuber_main_config)
             await websocket.send_text(
                 json.dumps({"type": "full-text", "text": "Connection established"})
             )
@@ -176,6 +291,9 @@ class WebSocketServer:
             self.connected_clients.append(websocket)
             print("Connection established")
 
+            # the session would load its own copy of models that are still preloading
+            await asyncio.to_thread(self.ready.wait)
+
             # Initialize components
             l2d, open_llm_vtuber, _ = self._initialize_components(websocket)
 
@@ -183,22 +301,178 @@ class WebSocketServer:
                 json.dumps({"type": "set-model", "text": l2d.model_info})
             )
             print("Model set")
-            received_data_buffer = np.array([])
+            received_audio = AudioAccumulator(
+                max_seconds=self.open_llm_vtuber_main_config.get(
+                    "MAX_UTTERANCE_SECONDS", 60
+                )
+            )
+            mic_decoder = ws_protocol.MicAudioDecoder()
+
+            # Transcribe while the user speaks and show the partial text
+            asr_streaming = self.open_llm_vtuber_main_config.get("ASR_STREAMING", False)
+            asr_step_seconds = (
+                self.open_llm_vtuber_main_config.get("ASR_STREAMING_STEP_MS", 1000) / 1000
+            )
+
+            async def _send_asr_partial(text: str) -> None:
+                await websocket.send_text(
+                    json.dumps({"type": "asr-partial", "text": text})
+                )
+
+            transcriber = StreamingTranscriber(
+                lambda: open_llm_vtuber.asr.create_streaming_session(
+                    step_seconds=asr_step_seconds
+                ),
+                on_partial=_send_asr_partial,
+            )
+
+            def _receive_audio(samples: np.ndarray) -> None:
+                samples = received_audio.append(samples)
+                if asr_streaming and open_llm_vtuber.asr is not None:
+                    transcriber.feed(samples)
+
+            async def _take_utterance() -> np.ndarray | str:
+                if asr_streaming and open_llm_vtuber.asr is not None:
+                    # Most of the utterance is decoded already
+                    received_audio.clear()
+                    return await transcriber.finish()
+                return received_audio.take()
+
+            # Endpointing on the server for clients that stream the mic continuously
+            server_vad_config = self.open_llm_vtuber_main_config.get("SERVER_VAD", {}) or {}
+            stream_vad: StreamVAD | None = None
+
+            async def _stop_conversation() -> None:
+                """Interrupt the turn that is still running, if any, and wait until it stops."""
+                if conversation_task is None or conversation_task.done():
+                    return
+                open_llm_vtuber.interrupt(open_llm_vtuber.pipeline.heard_sentence)
+                conversation_task.cancel()
+                await asyncio.gather(conversation_task, return_exceptions=True)
+
+            async def _start_conversation(user_input: np.ndarray | str) -> asyncio.Task:
+                # the user spoke again before the previous reply was over
+                await _stop_conversation()
+                await websocket.send_text(
+                    json.dumps({"type": "full-text", "text": "思考中..."})
+                )
+
+                async def _run_conversation():
+                    try:
+                        await websocket.send_text(
+                            json.dumps(
+                                {
+                                    "type": "control",
+                                    "text": "conversation-chain-start",
+                                }
+                            )
+                        )
+                        await open_llm_vtuber.aconversation_chain(
+                            user_input=user_input,
+                        )
+                        await websocket.send_text(
+                            json.dumps(
+                                {
+                                    "type": "control",
+                                    "text": "conversation-chain-end",
+                                }
+                            )
+                        )
+                        print("One Conversation Loop Completed")
+                    except asyncio.CancelledError:
+                        print("Conversation task was cancelled.")
+                    except InterruptedError as e:
+                        print(f"😢Conversation was interrupted. {e}")
+
+                return asyncio.create_task(_run_conversation())
+
             # start mic
             await websocket.send_text(
                 json.dumps({"type": "control", "text": "start-mic"})
             )
 
             conversation_task = None
+            # the config switches still running, awaited when the session ends
+            switch_tasks: set[asyncio.Task] = set()
 
             try:
                 while True:
                     print(".", end="")
-                    message = await websocket.receive_text()
-                    data = json.loads(message)
+                    message = await websocket.receive()
+                    if recorder is not None:
+                        recorder.record(message)
+                    if message["type"] == "websocket.disconnect":
+                        raise WebSocketDisconnect(message.get("code", 1000))
+                    if message.get("bytes") is not None:
+                        try:
+                            kind, header, payload = ws_protocol.decode_frame(
+                                message["bytes"]
+                            )
+                            samples = mic_decoder.decode(kind, header, payload)
+                        except ws_protocol.ProtocolError as e:
+                            logger.warning(f"Invalid binary frame: {e}")
+                            await websocket.send_text(
+                                json.dumps({"type": "error", "message": str(e)})
+                            )
+                            continue
+                        if stream_vad is None:
+                            _receive_audio(samples)
+                            print("*", end="")
+                            continue
+                        events = await asyncio.to_thread(stream_vad.process, samples)
+                        for event, audio in events:
+                            if audio is not None:
+                                _receive_audio(audio)
+                            if event == "speech-start":
+                                await websocket.send_text(
+                                    json.dumps({"type": "control", "text": "speech-start"})
+                                )
+                            elif event == "speech-end":
+                                print("Server VAD detected the end of speech.")
+                                await websocket.send_text(
+                                    json.dumps({"type": "control", "text": "speech-end"})
+                                )
+                                conversation_task = await _start_conversation(
+                                    await _take_utterance()
+                                )
+                        continue
+                    data = json.loads(message["text"])
                     # print(f"\033\n Received ws req: {data.get('type')}\033[0m\n")
 
-                    if data.get("type") == "interrupt-signal":
+                    if data.get("type") == "hello":
+                        # Protocol negotiation of clients that support binary audio frames
+                        version = data.get("binary_audio")
+                        if version == ws_protocol.PROTOCOL_VERSION:
+                            self.binary_audio_clients.add(websocket)
+                        else:
+                            self.binary_audio_clients.discard(websocket)
+                        # Clients that stream the mic continuously ask for server-side VAD
+                        if (
+                            data.get("server_vad")
+                            and server_vad_config.get("ENABLED", False)
+                            and websocket in self.binary_audio_clients
+                        ):
+                            if stream_vad is None:
+                                stream_vad = await asyncio.to_thread(
+                                    StreamVAD.from_config, server_vad_config
+                                )
+                        else:
+                            stream_vad = None
+                        await websocket.send_text(
+                            json.dumps(
+                                {
+                                    "type": "hello",
+                                    "binary_audio": (
+                                        ws_protocol.PROTOCOL_VERSION
+                                        if websocket in self.binary_audio_clients
+                                        else None
+                                    ),
+                                    "server_vad": stream_vad is not None,
+                                }
+                            )
+                        )
+
+                    elif data.get("type") == "interrupt-signal":
                         print("Start receiving audio data from front end.")
                         if conversation_task is not None:
                             print(
@@ -211,12 +485,7 @@ class WebSocketServer:
                             # conversation_task.cancel()
 
                     elif data.get("type") == "mic-audio-data":
-                        received_data_buffer = np.append(
-                            received_data_buffer,
-                            np.array(
-                                list(data.get("audio").values()), dtype=np.float32
-                            ),
-                        )
+                        _receive_audio(ws_protocol.decode_json_audio(data.get("audio")))
                         print("*", end="")
 
                     elif (
@@ -224,45 +493,14 @@ class WebSocketServer:
                         or data.get("type") == "text-input"
                     ):
                         print("Received audio data end from front end.")
-                        await websocket.send_text(
-                            json.dumps({"type": "full-text", "text": "思考中..."})
-                        )
                         if data.get("type") == "text-input":
                             user_input = data.get("text")
+                            transcriber.reset()
                         else:
-                            user_input: np.ndarray | str = received_data_buffer
-
-                        received_data_buffer = np.array([])
-
-                        async def _run_conversation():
-                            try:
-                                await websocket.send_text(
-                                    json.dumps(
-                                        {
-                                            "type": "control",
-                                            "text": "conversation-chain-start",
-                                        }
-                                    )
-                                )
-                                await asyncio.to_thread(
-                                    open_llm_vtuber.conversation_chain,
-                                    user_input=user_input,
-                                )
-                                await websocket.send_text(
-                                    json.dumps(
-                                        {
-                                            "type": "control",
-                                            "text": "conversation-chain-end",
-                                        }
-                                    )
-                                )
-                                print("One Conversation Loop Completed")
-                            except asyncio.CancelledError:
-                                print("Conversation task was cancelled.")
-                            except InterruptedError as e:
-                                print(f"😢Conversation was interrupted. {e}")
+                            user_input = await _take_utterance()
 
-                        conversation_task = asyncio.create_task(_run_conversation())
+                        received_audio.clear()
+                        conversation_task = await _start_conversation(user_input)
                     elif data.get("type") == "fetch-configs":
                         config_files = self._scan_config_alts_directory()
                         await websocket.send_text(
@@ -271,11 +509,18 @@ class WebSocketServer:
                     elif data.get("type") == "switch-config":
                         config_file = data.get("file")
                         if config_file:
-                            result = await self._handle_config_switch(
-                                websocket, config_file
-                            )
-                            if result:
-                                l2d, open_llm_vtuber = result
+                            # runs in the background, so messages keep being handled meanwhile
+                            async def _switch_config(config_file=config_file):
+                                nonlocal l2d
+                                new_l2d = await self._handle_config_switch(
+                                    websocket, config_file, open_llm_vtuber
+                                )
+                                if new_l2d:
+                                    l2d = new_l2d
+
+                            switch_task = asyncio.create_task(_switch_config())
+                            switch_tasks.add(switch_task)
+                            switch_task.add_done_callback(switch_tasks.discard)
 
                     elif data.get("type") == "fetch-backgrounds":
                         bg_files = self._scan_bg_directory()
@@ -287,7 +532,20 @@ class WebSocketServer:
 
             except WebSocketDisconnect:
                 self.connected_clients.remove(websocket)
-                open_llm_vtuber = None
+                self.binary_audio_clients.discard(websocket)
+            finally:
+                for switch_task in list(switch_tasks):
+                    switch_task.cancel()
+                await asyncio.gather(*switch_tasks, return_exceptions=True)
+                # stop the turn that is still running, then the stages of the pipeline
+                if conversation_task is not None:
+                    conversation_task.cancel()
+                    await asyncio.gather(conversation_task, return_exceptions=True)
+                await open_llm_vtuber.pipeline.close()
+                # release the shared models only once nothing uses them any more
+                open_llm_vtuber.close()
+                if recorder is not None:
+                    await asyncio.to_thread(recorder.close)
 
     def _scan_config_alts_directory(self) -> List[str]:
         config_files = ["conf.yaml"]  # default config file
@@ -427,26 +685,46 @@ def load_config_with_env(path) -> dict:
 
 
 class ModelCache:
-    """Manager for caching ASR and TTS models"""
+    """
+    Manager for caching ASR and TTS models.
+    The models are handles of the shared model registry; the cache holds one
+    reference to each, so preloaded models stay loaded while no client is connected.
+    """
 
     def __init__(self):
         self._cache: Dict[str, Any] = {}
+        self._lock = threading.Lock()
 
     def get(self, key: str) -> Any:
         """get the cached model"""
-        return self._cache.get(key)
+        with self._lock:
+            return self._cache.get(key)
 
     def set(self, key: str, model: Any) -> None:
-        """set the cached model"""
-        self._cache[key] = model
+        """set the cached model, releasing the one it replaces"""
+        with self._lock:
+            old_model = self._cache.get(key)
+            self._cache[key] = model
+        self._release(old_model)
 
     def remove(self, key: str) -> None:
         """remove the cached model"""
-        self._cache.pop(key, None)
+        with self._lock:
+            old_model = self._cache.pop(key, None)
+        self._release(old_model)
 
     def clear(self) -> None:
         """clear the cache"""
-        self._cache.clear()
+        with self._lock:
+            old_models = list(self._cache.values())
+            self._cache.clear()
+        for model in old_models:
+            self._release(model)
+
+    @staticmethod
+    def _release(model: Any) -> None:
+        if isinstance(model, model_registry.SharedModel):
+            model.release()
 
 
 class ModelManager:
@@ -456,31 +734,30 @@ class ModelManager:
         self.config = config
         self._old_config = config.copy()  # save a copy of the initial config
         self.cache = ModelCache()
+        self.startup = StartupTimer()
 
     def initialize_models(self) -> None:
-        """Initialize ASR and TTS models"""
-        if self.config.get("VOICE_INPUT_ON", False):
-            self._init_asr()
-        if self.config.get("TTS_ON", False):
-            self._init_tts()
+        """Initialize and warm up the ASR and TTS models in parallel"""
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="preload") as executor:
+            futures = []
+            if self.config.get("VOICE_INPUT_ON", False):
+                futures.append(executor.submit(self._init_asr))
+            if self.config.get("TTS_ON", False):
+                futures.append(executor.submit(self._init_tts))
+            for future in futures:
+                future.result()
+        self.startup.finish()
+        self.startup.log_report("Preloading the models")
 
     def _init_asr(self) -> None:
         """Initialize ASR model"""
-        from asr.asr_factory import ASRFactory
-
-        asr_model = self.config.get("ASR_MODEL")
-        asr_config = self.config.get(asr_model, {})
-        self.cache.set("asr", ASRFactory.get_asr_system(asr_model, **asr_config))
-        logger.info(f"ASR model {asr_model} loaded successfully")
+        self.cache.set("asr", model_registry.acquire_asr(self.config, self.startup))
+        logger.info(f"ASR model {self.config.get('ASR_MODEL')} loaded successfully")
 
     def _init_tts(self) -> None:
         """Initialize TTS model"""
-        from tts.tts_factory import TTSFactory
-
-        tts_model = self.config.get("TTS_MODEL")
-        tts_config = self.config.get(tts_model, {})
-        self.cache.set("tts", TTSFactory.get_tts_engine(tts_model, **tts_config))
-        logger.info(f"TTS model {tts_model} loaded successfully")
+        self.cache.set("tts", model_registry.acquire_tts(self.config, self.startup))
+        logger.info(f"TTS model {self.config.get('TTS_MODEL')} loaded successfully")
 
     def update_models(self, new_config: Dict) -> None:
         """Update ASR and TTS models based on new configuration"""
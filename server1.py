@@ -5,6 +5,7 @@ import atexit
 import json
 import asyncio
 import time
+import threading
 from typing import List, Dict, Any
 import yaml
 import numpy as np
@@ -30,6 +31,9 @@ import blivedm.models.web as web_models
 from main import OpenLLMVTuberMain
 from live2d_model import Live2dModel
 from tts.stream_audio import AudioPayloadPreparer
+from pipeline.danmaku_scheduler import DanmakuScheduler, Priority, ViewerMessage
+from utils import model_registry, ws_protocol
+from utils.audio_accumulator import AudioAccumulator
 import __init__
 
 TEST_ROOM_IDS = [30015166]  # Replace with your desired Bilibili room IDs
@@ -101,11 +105,20 @@ class WebSocketServer:
         new_config = self._load_config_from_file(config_file)
         if new_config:
             try:
+                # only the changed components are rebuilt, in the background,
+                # and the main vtuber instance keeps its chat history
+                switches = [self.open_llm_vtuber.aapply_config(new_config)]
                 if self.preload_models:
-                    self.model_manager.update_models(new_config)
+                    switches.append(
+                        asyncio.to_thread(self.model_manager.update_models, new_config)
+                    )
+                await asyncio.gather(*switches)
 
                 self.open_llm_vtuber_main_config.update(new_config)
-                l2d, open_llm_vtuber, _ = self._initialize_components(websocket)
+                open_llm_vtuber = self.open_llm_vtuber
+                l2d = await asyncio.to_thread(
+                    Live2dModel, self.open_llm_vtuber_main_config["LIVE2D_MODEL"]
+                )
 
                 await websocket.send_text(
                     json.dumps(
@@ -120,9 +133,7 @@ class WebSocketServer:
                 )
                 logger.info(f"Configuration switched to {config_file}")
 
-                # Update the main vtuber instance as well
                 self.l2d = l2d
-                self.open_llm_vtuber = open_llm_vtuber
                 return l2d, open_llm_vtuber
 
             except Exception as e:
@@ -172,7 +183,7 @@ class WebSocketServer:
             payload, duration = audio_preparer.prepare_audio_payload(
                 audio_path=filepath,
                 display_text=sentence,
-                expression_list=l2d.extract_emotion(sentence),
+                expression_list=(open_llm_vtuber.live2d or l2d).extract_emotion(sentence),
             )
             logger.info("Payload prepared")
 
@@ -194,7 +205,38 @@ class WebSocketServer:
 
             logger.info("Audio played")
 
+        async def _async_websocket_audio_handler(
+            sentence: str | None,
+            filepath: str | None,
+            audio: tuple[np.ndarray, int] | None = None,
+        ) -> None:
+            if filepath is None and audio is None:
+                logger.info("No audio to be streamed. Response is empty.")
+                return
+
+            if sentence is None:
+                sentence = ""
+
+            logger.info(f"Playing {filepath or 'audio buffer'}...")
+            payload, duration = await asyncio.to_thread(
+                audio_preparer.prepare_audio_payload,
+                audio_path=filepath,
+                display_text=sentence,
+                expression_list=(open_llm_vtuber.live2d or l2d).extract_emotion(sentence),
+                audio=audio,
+            )
+            logger.info("Payload prepared")
+
+            if websocket is not None:
+                await websocket.send_text(json.dumps(payload))
+                await asyncio.sleep(duration)
+            else:
+                print("no websocket")
+
+            logger.info("Audio played")
+
         open_llm_vtuber.set_audio_output_func(_websocket_audio_handler)
+        open_llm_vtuber.set_async_audio_output_func(_async_websocket_audio_handler)
         return l2d, open_llm_vtuber, audio_preparer
 
     def _setup_routes(self):
@@ -216,7 +258,11 @@ class WebSocketServer:
                 json.dumps({"type": "set-model", "text": l2d.model_info})
             )
             print("Model set")
-            received_data_buffer = np.array([])
+            received_audio = AudioAccumulator(
+                max_seconds=self.open_llm_vtuber_main_config.get(
+                    "MAX_UTTERANCE_SECONDS", 60
+                )
+            )
             # start mic
             await websocket.send_text(
                 json.dumps({"type": "control", "text": "start-mic"})
@@ -240,9 +286,8 @@ class WebSocketServer:
                             )
                             open_llm_vtuber.interrupt(data.get("text"))
                     elif data.get("type") == "mic-audio-data":
-                        received_data_buffer = np.append(
-                            received_data_buffer,
-                            np.array(list(data.get("audio").values()), dtype=np.float32),
+                        received_audio.append(
+                            ws_protocol.decode_json_audio(data.get("audio"))
                         )
                         print("*", end="")
                     elif data.get("type") in ["mic-audio-end", "text-input"]:
@@ -253,9 +298,9 @@ class WebSocketServer:
                         if data.get("type") == "text-input":
                             user_input = data.get("text")
                         else:
-                            user_input: np.ndarray | str = received_data_buffer
+                            user_input: np.ndarray | str = received_audio.take()
 
-                        received_data_buffer = np.array([])
+                        received_audio.clear()
 
                         async def _run_conversation():
                             try:
@@ -267,8 +312,7 @@ class WebSocketServer:
                                         }
                                     )
                                 )
-                                await asyncio.to_thread(
-                                    open_llm_vtuber.conversation_chain,
+                                await open_llm_vtuber.aconversation_chain(
                                     user_input=user_input,
                                 )
                                 await websocket.send_text(
@@ -414,18 +458,34 @@ def load_config_with_env(path) -> dict:
 class ModelCache:
     def __init__(self):
         self._cache: Dict[str, Any] = {}
+        self._lock = threading.Lock()
 
     def get(self, key: str) -> Any:
-        return self._cache.get(key)
+        with self._lock:
+            return self._cache.get(key)
 
     def set(self, key: str, model: Any) -> None:
-        self._cache[key] = model
+        with self._lock:
+            old_model = self._cache.get(key)
+            self._cache[key] = model
+        self._release(old_model)
 
     def remove(self, key: str) -> None:
-        self._cache.pop(key, None)
+        with self._lock:
+            old_model = self._cache.pop(key, None)
+        self._release(old_model)
 
     def clear(self) -> None:
-        self._cache.clear()
+        with self._lock:
+            old_models = list(self._cache.values())
+            self._cache.clear()
+        for model in old_models:
+            self._release(model)
+
+    @staticmethod
+    def _release(model: Any) -> None:
+        if isinstance(model, model_registry.SharedModel):
+            model.release()
 
 
 class ModelManager:
@@ -441,18 +501,12 @@ class ModelManager:
             self._init_tts()
 
     def _init_asr(self) -> None:
-        from asr.asr_factory import ASRFactory
-        asr_model = self.config.get("ASR_MODEL")
-        asr_config = self.config.get(asr_model, {})
-        self.cache.set("asr", ASRFactory.get_asr_system(asr_model, **asr_config))
-        logger.info(f"ASR model {asr_model} loaded successfully")
+        self.cache.set("asr", model_registry.acquire_asr(self.config))
+        logger.info(f"ASR model {self.config.get('ASR_MODEL')} loaded successfully")
 
     def _init_tts(self) -> None:
-        from tts.tts_factory import TTSFactory
-        tts_model = self.config.get("TTS_MODEL")
-        tts_config = self.config.get(tts_model, {})
-        self.cache.set("tts", TTSFactory.get_tts_engine(tts_model, **tts_config))
-        logger.info(f"TTS model {tts_model} loaded successfully")
+        self.cache.set("tts", model_registry.acquire_tts(self.config))
+        logger.info(f"TTS model {self.config.get('TTS_MODEL')} loaded successfully")
 
     def update_models(self, new_config: Dict) -> None:
         if self._should_reinit_asr(new_config):
@@ -516,12 +570,10 @@ class ModelManager:
             self.cache.remove("tts")
 
 
-GIFT_COOLDOWN_SECONDS = 20
-MAX_NORMAL_QUEUE_SIZE = 50
 IDLE_CHECK_INTERVAL = 0.1
 
-SHORT_MESSAGE_EXPIRY_SECONDS = 30  # Expiry for short normal messages (≤10 chars)
-LONG_MESSAGE_EXPIRY_SECONDS = 120   # Expiry for long normal messages (>10 chars)
+SHORT_MESSAGE_EXPIRY_SECONDS = 30  # Expiry for short normal messages (≤15 chars)
+LONG_MESSAGE_EXPIRY_SECONDS = 120   # Expiry for long normal messages (>15 chars)
 GIFT_MESSAGE_AGE_THRESHOLD = 60
 IDLE_THRESHOLD = 30
 
@@ -530,13 +582,13 @@ class MyBiliHandler(blivedm.BaseHandler):
         super().__init__()
         self.vtuber_instance = vtuber_instance
 
-        # Three queues:
-        self.must_answer_queue = asyncio.Queue()
-        self.gift_queue = asyncio.Queue()
-        self.message_queue = asyncio.Queue()
-
-        self.last_gift_times: Dict[str, float] = {}
-        self.last_processed_time = time.time()
+        # The last message is answered even if it has expired
+        self.scheduler = DanmakuScheduler.from_config(
+            self._process_message,
+            vtuber_instance.config.get("DANMAKU_SCHEDULER", {}),
+            handle_digest=self._process_digest,
+            answer_last_expired=True,
+        )
 
         self.idle_prompts = [
             "兔孜放歌",
@@ -545,152 +597,106 @@ class MyBiliHandler(blivedm.BaseHandler):
         ]
 
         # Start consumer
-        asyncio.create_task(self._consumer_task())
+        asyncio.create_task(self.scheduler.run())
+        asyncio.create_task(self._idle_task())
 
-    async def _consumer_task(self):
+    async def _idle_task(self):
         while True:
-            # 1) Must-answer queue first
-            if not self.must_answer_queue.empty():
-                timestamp, user_input_str, is_gift = await self.must_answer_queue.get()
-                await self._process_message(timestamp, user_input_str, is_gift=False, must_answer=True)
-                self.must_answer_queue.task_done()
-                self.last_processed_time = time.time()
-
-            # 2) Gift queue second
-            elif not self.gift_queue.empty():
-                timestamp, user_input_str, is_gift = await self.gift_queue.get()
-                await self._process_message(timestamp, user_input_str, is_gift=True, must_answer=False)
-                self.gift_queue.task_done()
-                self.last_processed_time = time.time()
-
-            # 3) Normal queue third
-            elif not self.message_queue.empty():
-                timestamp, user_input_str, is_gift = await self.message_queue.get()
-                await self._process_message(timestamp, user_input_str, is_gift=False, must_answer=False)
-                self.message_queue.task_done()
-                self.last_processed_time = time.time()
-            else:
-                # All queues are empty
-                if time.time() - self.last_processed_time > IDLE_THRESHOLD:
-                    await self._add_idle_message(IDLE_THRESHOLD)
-                    self.last_processed_time = time.time()
-                await asyncio.sleep(IDLE_CHECK_INTERVAL)
-
-    async def _process_message(self, timestamp: float, user_input_str: str,
-                               is_gift: bool, must_answer: bool):
+            await asyncio.sleep(IDLE_CHECK_INTERVAL)
+            if (
+                self.scheduler.is_idle()
+                and time.monotonic() - self.scheduler.last_processed_time > IDLE_THRESHOLD
+            ):
+                self._add_idle_message(IDLE_THRESHOLD)
+
+    async def _process_message(self, message: ViewerMessage):
         """
-        Main logic for deciding whether to skip or handle the message.
-        If this message is literally the LAST one in all queues,
-        do NOT skip it even if it has expired.
+        Called by the scheduler for the next message to answer.
+        An old gift, guard buy or super chat only gets a short thank you
+        if other messages are waiting.
         """
-        age = time.time() - timestamp
-
-        # Check if all queues are empty now (besides this one message we just got).
-        # If so, it's effectively the "last" message.
-        queues_are_empty = (
-            self.must_answer_queue.empty() and
-            self.gift_queue.empty() and
-            self.message_queue.empty()
-        )
-
-        # Must-answer messages are never skipped
-        if must_answer:
-            pass
-        elif is_gift:
-            # Gift message might append thank you if older than threshold
-            if (age > GIFT_MESSAGE_AGE_THRESHOLD) and (not queues_are_empty):
-                # If it's old AND not the last message, append a short thank you
-                user_input_str += " {一句话感谢我}"
-        else:
-            # Normal message logic
-            msg_len = len(user_input_str)
-            expiry = LONG_MESSAGE_EXPIRY_SECONDS if msg_len > 15 else SHORT_MESSAGE_EXPIRY_SECONDS
+        user_input_str = message.text
+        if message.priority == Priority.DANMAKU and message.uname:
+            user_input_str = f"{message.uname}: {user_input_str}"
+        elif (
+            message.priority in (Priority.GIFT, Priority.GUARD_BUY, Priority.SUPER_CHAT)
+            and message.age() > GIFT_MESSAGE_AGE_THRESHOLD
+            and self.scheduler.backlog_size() > 0
+        ):
+            user_input_str += " {一句话感谢我}"
 
-            # If older than expiry and not the last message, discard
-            if (age > expiry) and (not queues_are_empty):
-                print(f"Discarding normal message due to age > {expiry}s: {user_input_str}")
-                return
-
-        # If we get here, we do handle the message
         await self._handle_message(user_input_str)
 
-    async def _handle_message(self, user_input_str: str):
-        response = await asyncio.to_thread(self.vtuber_instance.conversation_chain, user_input_str)
-        print(f"Bilibili AI Response: {response}")
+    async def _process_digest(self, messages: list[ViewerMessage]):
+        """Called by the scheduler to answer several danmaku in one turn."""
+        await self._handle_message(
+            [{"name": message.uname, "content": message.text} for message in messages]
+        )
 
-    def _should_skip_gift(self, uname: str) -> bool:
-        now = time.time()
-        last_time = self.last_gift_times.get(uname, 0)
-        if now - last_time < GIFT_COOLDOWN_SECONDS:
-            return True
-        self.last_gift_times[uname] = now
-        return False
+    async def _handle_message(self, user_input_str: str | list[dict]):
+        try:
+            response = await self.vtuber_instance.aconversation_chain(user_input_str)
+        except InterruptedError as e:
+            print(f"Conversation was interrupted. {e}")
+            return
+        print(f"Bilibili AI Response: {response}")
 
-    async def _add_message_to_queue(self, user_input_str: str, is_gift: bool):
+    def _add_message_to_queue(self, uname: str, user_input_str: str, priority: Priority):
         """
-        If message starts with '#', it becomes must-answer; otherwise gift or normal queue.
+        If message starts with '#', it becomes a command, answered before gifts and danmaku.
         """
-        timestamp = time.time()
         trimmed_input = user_input_str.strip()
+        ttl = None
         if trimmed_input.startswith("#"):
             trimmed_input = trimmed_input[1:].strip()
-            await self.must_answer_queue.put((timestamp, trimmed_input, False))
-            print(f"Added must-answer message: {trimmed_input}")
-            return
+            priority = Priority.COMMAND
+            print(f"Added command: {trimmed_input}")
+        elif priority == Priority.DANMAKU:
+            ttl = (
+                LONG_MESSAGE_EXPIRY_SECONDS
+                if len(trimmed_input) > 15
+                else SHORT_MESSAGE_EXPIRY_SECONDS
+            )
 
-        if is_gift:
-            await self.gift_queue.put((timestamp, trimmed_input, True))
-        else:
-            if self.message_queue.qsize() < MAX_NORMAL_QUEUE_SIZE:
-                await self.message_queue.put((timestamp, trimmed_input, False))
-            else:
-                print("Message queue full, skipping non-gift message")
-
-    async def _add_idle_message(self, threshold):
-        if self.message_queue.qsize() < MAX_NORMAL_QUEUE_SIZE:
-            idle_message = random.choice(self.idle_prompts)
-            print(f"No messages for >{threshold}s, adding idle prompt: {idle_message}")
-            timestamp = time.time()
-            await self.message_queue.put((timestamp, idle_message, False))
-        else:
-            print("Message queue full, cannot add idle prompt.")
+        if not self.scheduler.submit(ViewerMessage(priority, uname, trimmed_input, ttl=ttl)):
+            print(f"Skipping message from {uname}: {trimmed_input}")
+
+    def _add_idle_message(self, threshold):
+        idle_message = random.choice(self.idle_prompts)
+        print(f"No messages for >{threshold}s, adding idle prompt: {idle_message}")
+        self.scheduler.submit(ViewerMessage(Priority.DANMAKU, "", idle_message))
+        self.scheduler.last_processed_time = time.monotonic()
 
     def _on_heartbeat(self, client: blivedm.BLiveClient, message: web_models.HeartbeatMessage):
         print(f'[{client.room_id}] 心跳')
 
     def _on_danmaku(self, client: blivedm.BLiveClient, message: web_models.DanmakuMessage):
         print(f'[{client.room_id}] {message.uname}: {message.msg}')
-        asyncio.create_task(self._add_message_to_queue(f'{message.uname}: {message.msg}', False))
+        self._add_message_to_queue(message.uname, message.msg, Priority.DANMAKU)
 
     def _on_gift(self, client: blivedm.BLiveClient, message: web_models.GiftMessage):
         print(f'[{client.room_id}] {message.uname} 赠送 {message.gift_name}x{message.num}')
-        if self._should_skip_gift(message.uname):
-            print(f"Skipping gift from {message.uname} due to cooldown.")
-            return
-        asyncio.create_task(self._add_message_to_queue(
+        self._add_message_to_queue(
+            message.uname,
             f'{message.uname} 赠送 {message.gift_name}x{message.num} [真的礼物]',
-            True
-        ))
+            Priority.GIFT,
+        )
 
     def _on_buy_guard(self, client: blivedm.BLiveClient, message: web_models.GuardBuyMessage):
         print(f'[{client.room_id}] {message.username} 购买 {message.gift_name}')
-        if self._should_skip_gift(message.username):
-            print(f"Skipping guard buy from {message.username} due to cooldown.")
-            return
-        asyncio.create_task(self._add_message_to_queue(
+        self._add_message_to_queue(
+            message.username,
             f'{message.username} 购买 {message.gift_name} [真的礼物]',
-            True
-        ))
+            Priority.GUARD_BUY,
+        )
 
     def _on_super_chat(self, client: blivedm.BLiveClient, message: web_models.SuperChatMessage):
         print(f'[{client.room_id}] 醒目留言 ¥{message.price} {message.uname}: {message.message}')
-        if self._should_skip_gift(message.uname):
-            print(f"Skipping super chat from {message.uname} due to cooldown.")
-            return
-        asyncio.create_task(self._add_message_to_queue(
+        self._add_message_to_queue(
+            message.uname,
             f'醒目留言 ¥{message.price} {message.uname}: {message.message} [真的礼物]',
-            True
-        ))
+            Priority.SUPER_CHAT,
+        )
 
 
 if __name__ == "__main__":
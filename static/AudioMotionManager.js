@@ -992,7 +992,7 @@ class AudioMotionManager {
   }
 
   /**
-   * Main API: Play audio from Base64, do lip-sync
+   * Main API: Play audio from Base64 (or a Blob of the binary protocol), do lip-sync
    */
   playAudioLipSync2(
     audio_base64,
@@ -1026,11 +1026,13 @@ class AudioMotionManager {
     // ================
     //  Async decode
     // ================
-    const dataUrl = `data:audio/wav;base64,${audio_base64.replace(/^data:.*;base64,/, "")}`;
-
     // Convert base64 -> blob asynchronously via fetch
-    fetch(dataUrl)
-      .then(response => response.blob())
+    const blobPromise = audio_base64 instanceof Blob
+      ? Promise.resolve(audio_base64)
+      : fetch(`data:audio/wav;base64,${audio_base64.replace(/^data:.*;base64,/, "")}`)
+          .then(response => response.blob());
+
+    blobPromise
       .then(blob => {
         const audioUrl = URL.createObjectURL(blob);
         this.currentAudio = new Audio(audioUrl);
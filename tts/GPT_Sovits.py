@@ -2,10 +2,17 @@ import os
 import re
 import time
 import random
+import threading
 import requests
 from tts.tts_interface import TTSInterface
+from tts.audio_buffer import WavStreamDecoder
 
 class TTSEngine(TTSInterface):
+
+    supports_concurrent_requests = True
+    # a reference audio is picked at random among the variants of the emotion
+    has_random_variants = True
+
     def __init__(
         self,
         api_url: str = "http://127.0.0.1:9880/tts",
@@ -57,76 +64,115 @@ class TTSEngine(TTSInterface):
         self.last_emotion = None
         self.last_variant = None
         self.last_emotion_chosen_time = 0.0
+        # sentences may be synthesized from several threads at once
+        self._emotion_lock = threading.Lock()
 
-    def set_emotion(self, emotion: str):
+    def set_emotion(self, emotion: str) -> dict:
         """
         Update ref_audio_path and prompt_text based on the provided emotion.
         If emotion is default or no previous emotion chosen, or if 20 seconds passed,
         choose a new variant at random.
         If the same emotion is chosen within 20 seconds, use the same variant.
+
+        Returns:
+            dict: The chosen variant with `ref_audio_path` and `prompt_text`.
         """
         # If emotion does not exist, fallback to default
         variants = self.emotion_variants.get(emotion, self.emotion_variants["default"])
 
-        current_time = time.time()
-        if emotion == "default":
-            # Always use default settings without timing logic
-            chosen = variants[0]
-        else:
-            # For non-default emotions, apply the lock logic
-            if self.last_emotion == emotion:
-                # Same emotion as last time
-                if (current_time - self.last_emotion_chosen_time) < self.lock_duration:
-                    # Within lock duration, use same variant
-                    chosen = self.last_variant
+        with self._emotion_lock:
+            current_time = time.time()
+            if emotion == "default":
+                # Always use default settings without timing logic
+                chosen = variants[0]
+            else:
+                # For non-default emotions, apply the lock logic
+                if self.last_emotion == emotion:
+                    # Same emotion as last time
+                    if (current_time - self.last_emotion_chosen_time) < self.lock_duration:
+                        # Within lock duration, use same variant
+                        chosen = self.last_variant
+                    else:
+                        # More than 20 seconds passed, choose a new variant
+                        chosen = random.choice(variants)
+                        self.last_emotion_chosen_time = current_time
+                        self.last_variant = chosen
                 else:
-                    # More than 20 seconds passed, choose a new variant
+                    # Different emotion from last time or first time
                     chosen = random.choice(variants)
                     self.last_emotion_chosen_time = current_time
                     self.last_variant = chosen
-            else:
-                # Different emotion from last time or first time
-                chosen = random.choice(variants)
-                self.last_emotion_chosen_time = current_time
-                self.last_variant = chosen
 
-        # Update last_emotion
-        self.last_emotion = emotion
+            # Update last_emotion
+            self.last_emotion = emotion
 
-        # Set the chosen variant
-        self.ref_audio_path = chosen["ref_audio_path"]
-        self.prompt_text = chosen["prompt_text"]
+            # Set the chosen variant
+            self.ref_audio_path = chosen["ref_audio_path"]
+            self.prompt_text = chosen["prompt_text"]
+            return chosen
 
     def generate_audio(self, text, file_name_no_ext=None, emotion=None):
+        audio = self.generate_audio_bytes(text, emotion=emotion)
+        if audio is None:
+            return None
+        file_name = self.generate_cache_file_name(file_name_no_ext, self.media_type)
+        with open(file_name, "wb") as audio_file:
+            audio_file.write(audio)
+        return file_name
+
+    def generate_audio_bytes(self, text, emotion=None):
+        params = self._request_params(text, emotion)
+
+        # Note: The original code uses GET. If your TTS server expects POST, switch this to requests.post()
+        response = requests.get(self.api_url, params=params, timeout=120)
+
+        if response.status_code == 200:
+            return response.content
+        else:
+            print(f"Error: Failed to generate audio. Status code: {response.status_code}")
+            return None
+
+    def stream_pcm(self, text, emotion=None):
+        """Yield the PCM chunks of the streamed response as they arrive (wav only)."""
+        if self.media_type != "wav":
+            yield from super().stream_pcm(text, emotion=emotion)
+            return
+
+        params = self._request_params(text, emotion)
+        with requests.get(self.api_url, params=params, timeout=120, stream=True) as response:
+            if response.status_code != 200:
+                print(f"Error: Failed to generate audio. Status code: {response.status_code}")
+                return
+            decoder = WavStreamDecoder()
+            for data in response.iter_content(chunk_size=4096):
+                samples = decoder.feed(data)
+                if samples is not None:
+                    yield samples, decoder.sample_rate
+
+    def _request_params(self, text, emotion=None) -> dict:
         # If an emotion is provided, update the paths/text
+        # Keep the chosen reference in locals, other threads may change the emotion meanwhile
         if emotion:
-            self.set_emotion(emotion)
+            chosen = self.set_emotion(emotion)
             print("情绪更新："+emotion)
+        else:
+            with self._emotion_lock:
+                chosen = {
+                    "ref_audio_path": self.ref_audio_path,
+                    "prompt_text": self.prompt_text,
+                }
 
-
-        file_name = self.generate_cache_file_name(file_name_no_ext, self.media_type)
         cleaned_text = re.sub(r'\[.*?\]', '', text)
 
-        data = {
+        params = {
             "text": cleaned_text,
             "text_lang": self.text_lang,
-            "ref_audio_path": self.ref_audio_path,
+            "ref_audio_path": chosen["ref_audio_path"],
             "prompt_lang": self.prompt_lang,
-            "prompt_text": self.prompt_text,
+            "prompt_text": chosen["prompt_text"],
             "text_split_method": self.text_split_method,
             "batch_size": self.batch_size,
             "media_type": self.media_type,
             "streaming_mode": self.streaming_mode,
         }
-        print("\n"+data.get("ref_audio_path"))
-
-        # Note: The original code uses GET. If your TTS server expects POST, switch this to requests.post()
-        response = requests.get(self.api_url, params=data, timeout=120)
-
-        if response.status_code == 200:
-            with open(file_name, "wb") as audio_file:
-                audio_file.write(response.content)
-            return file_name
-        else:
-            print(f"Error: Failed to generate audio. Status code: {response.status_code}")
-            return None
+        return params
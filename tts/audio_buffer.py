@@ -0,0 +1,264 @@
+"""
+Helpers for audio kept in memory as numpy PCM buffers.
+
+A PCM buffer is a tuple `(samples, sample_rate)`. `samples` is an int16 array
+of shape (frames,) for mono audio or (frames, channels) otherwise.
+"""
+
+import io
+import wave
+from dataclasses import dataclass
+import numpy as np
+
+_WAVE_FORMAT_PCM = 1
+_WAVE_FORMAT_IEEE_FLOAT = 3
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+@dataclass
+class WavFormat:
+    """The fmt chunk of a WAV file and where its data chunk starts."""
+
+    audio_format: int
+    channels: int
+    sample_rate: int
+    sample_width: int
+    data_offset: int
+    data_size: int
+
+
+def parse_wav_header(data: bytes | bytearray | memoryview) -> WavFormat | None:
+    """
+    Parse the RIFF header of a WAV file up to the start of its data chunk.
+
+    Returns:
+        WavFormat | None: The format, or None if `data` ends before the data chunk starts.
+
+    Raises:
+        ValueError: If `data` is not a WAV file this module can decode.
+    """
+    if len(data) < 12:
+        return None
+    if bytes(data[:4]) != b"RIFF" or bytes(data[8:12]) != b"WAVE":
+        raise ValueError("The audio is not a WAV file.")
+    offset = 12
+    fmt = None
+    while True:
+        if len(data) < offset + 8:
+            return None
+        chunk_id = bytes(data[offset : offset + 4])
+        chunk_size = int.from_bytes(data[offset + 4 : offset + 8], "little")
+        if chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("The WAV file has no fmt chunk before its data.")
+            fmt.data_offset = offset + 8
+            fmt.data_size = chunk_size
+            return fmt
+        if len(data) < offset + 8 + chunk_size:
+            return None
+        if chunk_id == b"fmt ":
+            body = data[offset + 8 : offset + 8 + chunk_size]
+            audio_format = int.from_bytes(body[0:2], "little")
+            sample_width = int.from_bytes(body[14:16], "little") // 8
+            if audio_format == _WAVE_FORMAT_EXTENSIBLE and chunk_size >= 26:
+                audio_format = int.from_bytes(body[24:26], "little")
+            if audio_format == _WAVE_FORMAT_PCM and sample_width not in (1, 2, 4):
+                raise ValueError(f"Unsupported sample width {sample_width}.")
+            if audio_format == _WAVE_FORMAT_IEEE_FLOAT and sample_width != 4:
+                raise ValueError(f"Unsupported float sample width {sample_width}.")
+            if audio_format not in (_WAVE_FORMAT_PCM, _WAVE_FORMAT_IEEE_FLOAT):
+                raise ValueError(f"Unsupported WAV format {audio_format}.")
+            fmt = WavFormat(
+                audio_format=audio_format,
+                channels=int.from_bytes(body[2:4], "little"),
+                sample_rate=int.from_bytes(body[4:8], "little"),
+                sample_width=sample_width,
+                data_offset=0,
+                data_size=0,
+            )
+        offset += 8 + chunk_size + chunk_size % 2
+
+
+def _frames_to_int16(frames, fmt: WavFormat) -> np.ndarray:
+    """Interpret raw WAV frames as int16 samples. 16-bit PCM is not copied."""
+    frame_size = fmt.sample_width * fmt.channels
+    frames = frames[: len(frames) - len(frames) % frame_size]
+    if fmt.audio_format == _WAVE_FORMAT_IEEE_FLOAT:
+        samples = to_int16(np.frombuffer(frames, dtype="<f4"))
+    elif fmt.sample_width == 2:
+        samples = np.frombuffer(frames, dtype="<i2")
+    elif fmt.sample_width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.int16) - 128) << 8
+    else:
+        samples = (np.frombuffer(frames, dtype="<i4") >> 16).astype(np.int16)
+    if fmt.channels > 1:
+        samples = samples.reshape(-1, fmt.channels)
+    return samples
+
+
+def decode_wav_bytes(data: bytes) -> tuple[np.ndarray, int]:
+    """
+    Decode a WAV file in memory without copying 16-bit samples.
+    Streamed WAV files often carry a wrong data size, so the data chunk
+    is read up to the end of `data` in that case.
+
+    Raises:
+        ValueError: If `data` is not a supported WAV file.
+    """
+    fmt = parse_wav_header(data)
+    if fmt is None:
+        raise ValueError("The WAV file ends before its data chunk.")
+    end = len(data)
+    if 0 < fmt.data_size <= end - fmt.data_offset:
+        end = fmt.data_offset + fmt.data_size
+    frames = memoryview(data)[fmt.data_offset : end]
+    return _frames_to_int16(frames, fmt), fmt.sample_rate
+
+
+def decode_audio_bytes(data: bytes) -> tuple[np.ndarray, int]:
+    """
+    Decode an encoded audio file (wav, mp3, ogg, ...) into a PCM buffer.
+    WAV is decoded with numpy only. Other formats use soundfile, or
+    pydub (ffmpeg) as the last resort.
+
+    Parameters:
+        data (bytes): The content of the audio file.
+
+    Returns:
+        tuple[np.ndarray, int]: The int16 samples and the sample rate.
+    """
+    if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        try:
+            samples, sample_rate = decode_wav_bytes(data)
+            if len(samples):
+                return samples, sample_rate
+        except ValueError:
+            pass
+
+    try:
+        import soundfile
+
+        samples, sample_rate = soundfile.read(io.BytesIO(data), dtype="int16")
+        return samples, sample_rate
+    except Exception:
+        pass
+
+    from pydub import AudioSegment
+
+    audio = AudioSegment.from_file(io.BytesIO(data)).set_sample_width(2)
+    samples = np.frombuffer(audio.raw_data, dtype=np.int16)
+    if audio.channels > 1:
+        samples = samples.reshape(-1, audio.channels)
+    return samples, audio.frame_rate
+
+
+def to_int16(samples: np.ndarray) -> np.ndarray:
+    """Convert float samples in [-1, 1] to int16. int16 samples are returned as they are."""
+    if samples.dtype == np.int16:
+        return samples
+    if np.issubdtype(samples.dtype, np.floating):
+        return (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+    return samples.astype(np.int16)
+
+
+def encode_wav(samples: np.ndarray, sample_rate: int) -> bytes:
+    """Encode a PCM buffer as a 16-bit WAV file in memory."""
+    samples = to_int16(samples)
+    channels = 1 if samples.ndim == 1 else samples.shape[1]
+    output = io.BytesIO()
+    with wave.open(output, "wb") as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(samples.astype("<i2", copy=False).tobytes())
+    return output.getvalue()
+
+
+def rms_envelope(
+    samples: np.ndarray, chunk_frames: int, block_chunks: int = 4096
+) -> np.ndarray:
+    """
+    The RMS of every `chunk_frames` frames of `samples`, over all channels,
+    like `pydub.AudioSegment.rms` of each slice from `make_chunks`.
+    The last chunk may be shorter.
+
+    The full chunks are reshaped into a (chunks, chunk_frames * channels) view
+    and reduced in blocks of `block_chunks` rows, so the float copy stays small
+    even for long songs.
+
+    Returns:
+        np.ndarray: One float64 RMS value per chunk.
+    """
+    if samples.ndim == 1:
+        samples = samples[:, np.newaxis]
+    frames, channels = samples.shape
+    chunk_frames = max(1, int(chunk_frames))
+    full_chunks = frames // chunk_frames
+    envelope = np.empty(full_chunks + (1 if frames % chunk_frames else 0))
+
+    rows = samples[: full_chunks * chunk_frames].reshape(
+        full_chunks, chunk_frames * channels
+    )
+    for start in range(0, full_chunks, block_chunks):
+        block = rows[start : start + block_chunks].astype(np.float32)
+        envelope[start : start + len(block)] = np.sqrt(
+            np.einsum("ij,ij->i", block, block, dtype=np.float64)
+            / block.shape[1]
+        )
+    if frames % chunk_frames:
+        tail = samples[full_chunks * chunk_frames :].astype(np.float64)
+        envelope[-1] = np.sqrt(np.mean(tail * tail))
+    return envelope
+
+
+def guess_extension(data: bytes) -> str:
+    """Guess the file extension of encoded audio from its first bytes."""
+    if data[:4] == b"RIFF":
+        return ".wav"
+    if data[:4] == b"OggS":
+        return ".ogg"
+    if data[:4] == b"fLaC":
+        return ".flac"
+    if data[:3] == b"ID3" or data[:2] in (b"\xff\xfb", b"\xff\xf3", b"\xff\xf2"):
+        return ".mp3"
+    if data[:2] in (b"\xff\xf1", b"\xff\xf9"):
+        return ".aac"
+    return ".wav"
+
+
+class WavStreamDecoder:
+    """
+    Decode a WAV file that arrives in pieces, e.g. from a streaming HTTP response.
+
+    The header is parsed once it is complete. Everything after the start of the
+    "data" chunk is treated as PCM, because streaming servers do not know the
+    length of the audio when they send the header.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._format: WavFormat | None = None
+        self.sample_rate: int | None = None
+
+    def feed(self, data: bytes) -> np.ndarray | None:
+        """
+        Add the next piece of the file.
+
+        Returns:
+            np.ndarray | None: The complete int16 frames decoded so far, or None if there are none yet.
+        """
+        self._buffer.extend(data)
+        if self._format is None:
+            self._format = parse_wav_header(self._buffer)
+            if self._format is None:
+                return None
+            self.sample_rate = self._format.sample_rate
+            del self._buffer[: self._format.data_offset]
+
+        frame_size = self._format.sample_width * self._format.channels
+        usable = len(self._buffer) - len(self._buffer) % frame_size
+        if usable == 0:
+            return None
+        frames = bytes(self._buffer[:usable])
+        del self._buffer[:usable]
+        return _frames_to_int16(frames, self._format)
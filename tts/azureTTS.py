@@ -12,6 +12,7 @@ class TTSEngine(TTSInterface):
     temp_audio_file = "temp"
     file_extension = "wav"
     new_audio_dir = "cache"
+    supports_concurrent_requests = True
 
     def __init__(self, api_key, region, voice, pitch=0, rate=1.0):
         """
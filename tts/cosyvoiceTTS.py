@@ -4,6 +4,8 @@ from .tts_interface import TTSInterface
 
 class TTSEngine(TTSInterface):
 
+    supports_concurrent_requests = True
+
     def __init__(
         self,
         client_url="http://127.0.0.1:50000/",
@@ -15,6 +15,8 @@ sys.path.append(current_dir)
 
 class TTSEngine(TTSInterface):
 
+    supports_concurrent_requests = True
+
     def __init__(self, voice="en-US-AvaMultilingualNeural"):
         self.voice = voice
 
@@ -0,0 +1,75 @@
+import time
+import unicodedata
+from typing import Iterator
+import numpy as np
+
+from .audio_buffer import encode_wav
+from .tts_interface import TTSInterface
+
+
+# A stand-in engine for benchmarks and load tests. It needs no model, GPU or network:
+# it waits like a real engine would and returns a tone as long as the sentence would take to say.
+
+
+def speech_seconds(text: str) -> float:
+    """About how long the text takes to say: 4.5 CJK characters or 15 other characters a second."""
+    seconds = sum(
+        0.22 if unicodedata.east_asian_width(char) in ("W", "F") else 0.067
+        for char in text
+        if not char.isspace()
+    )
+    return max(0.3, seconds)
+
+
+class TTSEngine(TTSInterface):
+
+    supports_concurrent_requests = True
+
+    def __init__(
+        self,
+        latency_ms: float = 150,
+        rtf: float = 0.2,
+        sample_rate: int = 24000,
+        chunk_ms: float = 250,
+    ):
+        """
+        latency_ms: float
+            the time until the first audio, like the time to first byte of a TTS server
+        rtf: float
+            the real-time factor of the synthesis after that
+        sample_rate: int
+            the sample rate of the generated audio
+        chunk_ms: float
+            the length of the chunks of `stream_pcm`
+        """
+        self.latency = latency_ms / 1000
+        self.rtf = rtf
+        self.sample_rate = sample_rate
+        self.chunk_seconds = chunk_ms / 1000
+
+    def tone(self, seconds: float) -> np.ndarray:
+        t = np.arange(int(seconds * self.sample_rate), dtype=np.float32) / self.sample_rate
+        return (0.3 * 32767 * np.sin(2 * np.pi * 220 * t)).astype(np.int16)
+
+    def generate_pcm(self, text: str, **kwargs) -> tuple[np.ndarray, int] | None:
+        seconds = speech_seconds(text)
+        time.sleep(self.latency + self.rtf * seconds)
+        return self.tone(seconds), self.sample_rate
+
+    def stream_pcm(self, text: str, **kwargs) -> Iterator[tuple[np.ndarray, int]]:
+        remaining = speech_seconds(text)
+        time.sleep(self.latency)
+        while remaining > 0:
+            seconds = min(self.chunk_seconds, remaining)
+            time.sleep(self.rtf * seconds)
+            remaining -= seconds
+            yield self.tone(seconds), self.sample_rate
+
+    def generate_audio_bytes(self, text: str, **kwargs) -> bytes | None:
+        return encode_wav(*self.generate_pcm(text))
+
+    def generate_audio(self, text, file_name_no_ext=None):
+        file_name = self.generate_cache_file_name(file_name_no_ext, "wav")
+        with open(file_name, "wb") as audio_file:
+            audio_file.write(self.generate_audio_bytes(text))
+        return file_name
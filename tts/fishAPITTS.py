@@ -1,6 +1,7 @@
 from typing import Literal
 from fish_audio_sdk import Session, TTSRequest
 from .tts_interface import TTSInterface
+from .audio_buffer import WavStreamDecoder
 
 
 class TTSEngine(TTSInterface):
@@ -9,6 +10,7 @@ class TTSEngine(TTSInterface):
     """
 
     file_extension: str = "wav"
+    supports_concurrent_requests: bool = True
 
     def __init__(
         self,
@@ -39,19 +41,44 @@ class TTSEngine(TTSInterface):
         self.session = Session(apikey=api_key, base_url=base_url)
 
     def generate_audio(self, text, file_name_no_ext=None):
+        audio = self.generate_audio_bytes(text)
+        if audio is None:
+            return None
         file_name = self.generate_cache_file_name(file_name_no_ext, self.file_extension)
+        with open(file_name, "wb") as f:
+            f.write(audio)
+        return file_name
 
+    def generate_audio_bytes(self, text, **kwargs):
         try:
-            with open(file_name, "wb") as f:
-                for chunk in self.session.tts(
+            return b"".join(
+                self.session.tts(
                     TTSRequest(
-                        text=text, reference_id=self.reference_id, latency=self.latency
+                        text=text,
+                        reference_id=self.reference_id,
+                        latency=self.latency,
+                        format="wav",
                     )
-                ):
-                    f.write(chunk)
-
+                )
+            )
         except Exception as e:
             print(f"\nError: Fish TTS API fail to generate audio: {e}")
             return None
 
-        return file_name
+    def stream_pcm(self, text, **kwargs):
+        """Yield PCM chunks while the API streams the wav response."""
+        decoder = WavStreamDecoder()
+        try:
+            for chunk in self.session.tts(
+                TTSRequest(
+                    text=text,
+                    reference_id=self.reference_id,
+                    latency=self.latency,
+                    format="wav",
+                )
+            ):
+                samples = decoder.feed(chunk)
+                if samples is not None:
+                    yield samples, decoder.sample_rate
+        except Exception as e:
+            print(f"\nError: Fish TTS API fail to stream audio: {e}")
@@ -1,6 +1,13 @@
 import base64
-from pydub import AudioSegment
-from pydub.utils import make_chunks
+import numpy as np
+
+from .audio_buffer import (
+    decode_audio_bytes,
+    decode_wav_bytes,
+    encode_wav,
+    rms_envelope,
+    to_int16,
+)
 
 
 class AudioPayloadPreparer:
@@ -17,55 +24,88 @@ class AudioPayloadPreparer:
         """
         self.chunk_length_ms: int = chunk_length_ms
 
-    def __get_volume_by_chunks(self, audio):
+    def __get_volume_by_chunks(self, samples: np.ndarray, sample_rate: int) -> list:
         """
         Private method to divide the audio into chunks and calculate the normalized volume (RMS) for each chunk.
 
         Parameters:
-            audio (AudioSegment): The audio segment to process.
+            samples (np.ndarray): The int16 samples of the audio.
+            sample_rate (int): The sample rate of the audio.
 
         Returns:
             list: Normalized volumes for each chunk.
         """
-        chunks = make_chunks(audio, self.chunk_length_ms)
-        volumes = [chunk.rms for chunk in chunks]
-        max_volume = max(volumes)
+        chunk_frames = round(sample_rate * self.chunk_length_ms / 1000)
+        volumes = rms_envelope(samples, chunk_frames)
+        max_volume = volumes.max() if len(volumes) else 0
         if max_volume == 0:
             raise ValueError("Audio is empty or all zero.")
-        return [volume / max_volume for volume in volumes]
+        return (volumes / max_volume).tolist()
 
     def prepare_audio_payload(
-        self, audio_path, display_text=None, expression_list=None
+        self,
+        audio_path=None,
+        display_text=None,
+        expression_list=None,
+        audio=None,
+        binary=False,
     ):
         """
         Prepares the audio payload for sending to a broadcast endpoint.
 
+        WAV files are sent as they are and only decoded into a numpy view for
+        the volumes. Other formats are decoded once and encoded as WAV.
+
         Parameters:
-            audio_path (str): The path to the audio file to be processed.
+            audio_path (str, optional): The path to the audio file to be processed.
             display_text (str, optional): Text to be displayed with the audio.
             expression_list (list, optional): List of expressions associated with the audio.
+            audio (tuple, optional): A PCM buffer `(samples, sample_rate)` to use instead of
+                `audio_path`. It is encoded in memory, without ffmpeg.
+            binary (bool): Put the raw WAV bytes in the payload instead of base64,
+                for clients of the binary WebSocket protocol.
 
         Returns:
             tuple: A tuple containing the prepared payload (dict) and the audio duration (float).
         """
-        if not audio_path:
+        if audio is not None:
+            samples, sample_rate = audio
+            samples = to_int16(np.asarray(samples))
+            audio_bytes = encode_wav(samples, sample_rate)
+        elif not audio_path:
             raise ValueError("audio_path cannot be None or empty.")
-
-        audio = AudioSegment.from_file(audio_path)
-        audio_bytes = audio.export(format="wav").read()
-        audio_base64 = base64.b64encode(audio_bytes).decode("utf-8")
-        volumes = self.__get_volume_by_chunks(audio)
+        else:
+            with open(audio_path, "rb") as audio_file:
+                audio_bytes = audio_file.read()
+            samples, sample_rate = self.__decode(audio_bytes)
+            if samples is None:
+                samples, sample_rate = decode_audio_bytes(audio_bytes)
+                audio_bytes = encode_wav(samples, sample_rate)
+        if not binary:
+            audio_bytes = base64.b64encode(audio_bytes).decode("utf-8")
+        volumes = self.__get_volume_by_chunks(samples, sample_rate)
 
         payload = {
             "type": "audio",
-            "audio": audio_base64,
+            "audio": audio_bytes,
             "volumes": volumes,
             "slice_length": self.chunk_length_ms,
             "text": display_text,
             "expressions": expression_list,
         }
 
-        return payload, audio.duration_seconds
+        return payload, len(samples) / float(sample_rate)
+
+    @staticmethod
+    def __decode(audio_bytes: bytes):
+        """Decode a WAV file the browser can play as it is. Returns (None, None) otherwise."""
+        if audio_bytes[:4] != b"RIFF" or audio_bytes[8:12] != b"WAVE":
+            return None, None
+        try:
+            samples, sample_rate = decode_wav_bytes(audio_bytes)
+        except ValueError:
+            return None, None
+        return samples, sample_rate
 
 
 # Example usage:
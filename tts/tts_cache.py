@@ -0,0 +1,317 @@
+"""
+Content-addressed cache for synthesized speech.
+
+`CachedTTS` wraps any engine from `TTSFactory`. The cache key is a hash of the
+engine name, the engine configuration (voice, reference audio, ...), the
+emotion and the normalized text, so a line the persona repeats is only
+synthesized once.
+
+There are two tiers:
+- an in-memory LRU of audio bytes, bounded in bytes
+- a directory of audio files, bounded in bytes, evicting the least recently used
+
+Identical requests that arrive while the first one is still synthesizing wait
+for it instead of synthesizing again (single-flight).
+
+The consumers of `generate_audio` remove the returned file after playing it,
+so every call returns a fresh copy of the cached audio in ./cache.
+`generate_audio_bytes` and `generate_pcm` are served from the cache without
+touching ./cache.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Iterator
+import numpy as np
+from loguru import logger
+
+from .audio_buffer import decode_audio_bytes, encode_wav, guess_extension
+from .tts_interface import TTSInterface
+
+
+def normalize_text(text: str) -> str:
+    """Normalize the text so that equivalent sentences share a cache entry."""
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class CachedTTS(TTSInterface):
+    """A TTS engine that looks up the audio in the cache before calling the wrapped engine."""
+
+    def __init__(
+        self,
+        engine: TTSInterface,
+        engine_name: str,
+        engine_config: dict | None = None,
+        memory_max_bytes: int = 64 * 1024 * 1024,
+        disk_dir: str = "./tts_cache",
+        disk_max_bytes: int = 1024 * 1024 * 1024,
+    ):
+        """
+        Parameters:
+            engine (TTSInterface): The engine to wrap.
+            engine_name (str): The TTS_MODEL name of the engine.
+            engine_config (dict, optional): The configuration of the engine. Everything in it,
+                like the voice or the reference audio, is part of the cache key.
+            memory_max_bytes (int): The size of the in-memory tier. 0 disables it.
+            disk_dir (str): The directory of the disk tier. Must not be ./cache,
+                which is wiped on exit.
+            disk_max_bytes (int): The size of the disk tier. 0 disables it.
+        """
+        self.engine = engine
+        self.engine_name = engine_name
+        self.supports_concurrent_requests = engine.supports_concurrent_requests
+        self._engine_fingerprint = json.dumps(
+            engine_config or {}, sort_keys=True, ensure_ascii=False, default=str
+        )
+
+        self.memory_max_bytes = memory_max_bytes
+        self._memory: OrderedDict[str, tuple[bytes, str]] = OrderedDict()
+        self._memory_bytes = 0
+
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        # key -> (file name in disk_dir, size), least recently used first
+        self._disk_index: OrderedDict[str, tuple[str, int]] = OrderedDict()
+        self._disk_bytes = 0
+        if self.disk_max_bytes > 0:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            files = []
+            for entry in os.scandir(self.disk_dir):
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, entry.name, stat.st_size))
+            for _, file_name, size in sorted(files):
+                key = os.path.splitext(file_name)[0]
+                self._disk_index[key] = (file_name, size)
+                self._disk_bytes += size
+
+        self._lock = threading.Lock()
+        self._in_flight: dict[str, Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name):
+        # Engine specific attributes, like `set_emotion` of GPT_Sovits
+        if name == "engine":
+            raise AttributeError(name)
+        return getattr(self.engine, name)
+
+    def cache_key(self, text: str, **kwargs) -> str:
+        """The content address of the audio for `text` and the generation arguments."""
+        key_source = json.dumps(
+            [
+                self.engine_name,
+                self._engine_fingerprint,
+                sorted((k, str(v)) for k, v in kwargs.items() if v is not None),
+                normalize_text(text),
+            ],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+
+    def generate_audio(self, text: str, file_name_no_ext=None, **kwargs) -> str | None:
+        """
+        Return the path to a new audio file for `text`, from the cache if possible.
+        Extra keyword arguments, like `emotion`, are passed to the engine and are part of the key.
+        """
+        entry = self._get_audio(text, kwargs)
+        if entry is None:
+            return None
+        return self._write_copy(*entry, file_name_no_ext)
+
+    def generate_audio_bytes(self, text: str, **kwargs) -> bytes | None:
+        """Return the encoded audio for `text`, from the cache if possible."""
+        entry = self._get_audio(text, kwargs)
+        return None if entry is None else entry[0]
+
+    def stream_pcm(self, text: str, **kwargs) -> Iterator[tuple[np.ndarray, int]]:
+        """
+        Yield the cached audio as one chunk, or stream it from the engine and
+        cache it once the stream is complete.
+        """
+        key = self.cache_key(text, **kwargs)
+
+        cached = self._lookup(key)
+        if cached is not None:
+            self._count(hit=True)
+            yield decode_audio_bytes(cached[0])
+            return
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[key] = future
+
+        if not owner:
+            try:
+                entry = future.result()
+            except Exception:
+                entry = None
+            if entry is not None:
+                self._count(hit=True)
+                yield decode_audio_bytes(entry[0])
+            else:
+                # The other stream failed or was abandoned, stream our own copy
+                yield from self.engine.stream_pcm(text, **kwargs)
+            return
+
+        self._count(hit=False)
+        entry = None
+        try:
+            parts = []
+            sample_rate = None
+            for samples, sample_rate in self.engine.stream_pcm(text, **kwargs):
+                parts.append(samples)
+                yield samples, sample_rate
+            if parts:
+                audio = encode_wav(np.concatenate(parts), sample_rate)
+                entry = (audio, ".wav")
+                self._store(key, *entry)
+        finally:
+            # also reached when the consumer stops early, then nothing is cached
+            future.set_result(entry)
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def _get_audio(self, text: str, kwargs: dict) -> tuple[bytes, str] | None:
+        """Return the cached (audio, extension), or synthesize it once for all waiting callers."""
+        key = self.cache_key(text, **kwargs)
+
+        cached = self._lookup(key)
+        if cached is not None:
+            self._count(hit=True)
+            return cached
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[key] = future
+
+        if not owner:
+            # The same audio is being synthesized by another thread right now
+            self._count(hit=True)
+            return future.result()
+
+        self._count(hit=False)
+        try:
+            audio = self.engine.generate_audio_bytes(text, **kwargs)
+            entry = None if audio is None else (audio, guess_extension(audio))
+            if entry is not None:
+                self._store(key, *entry)
+            future.set_result(entry)
+            return entry
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def _count(self, hit: bool) -> None:
+        # the cache is used by several TTS worker threads at once
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _lookup(self, key: str) -> tuple[bytes, str] | None:
+        """Find the audio in memory, then on disk. A disk hit is promoted to memory."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+            disk_entry = self._disk_index.get(key)
+            if disk_entry is None:
+                return None
+            self._disk_index.move_to_end(key)
+
+        file_name = disk_entry[0]
+        path = os.path.join(self.disk_dir, file_name)
+        try:
+            with open(path, "rb") as audio_file:
+                audio = audio_file.read()
+            os.utime(path)  # mark as recently used, for the order after a restart
+        except OSError:
+            with self._lock:
+                if self._disk_index.get(key) == disk_entry:
+                    self._forget_disk_entry(key)
+            return None
+        entry = (audio, os.path.splitext(file_name)[1])
+        self._store_in_memory(key, entry)
+        return entry
+
+    def _store(self, key: str, audio: bytes, extension: str) -> None:
+        self._store_in_memory(key, (audio, extension))
+        if self.disk_max_bytes <= 0 or len(audio) > self.disk_max_bytes:
+            return
+        path = os.path.join(self.disk_dir, key + extension)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, "wb") as audio_file:
+                audio_file.write(audio)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write TTS cache file {path}: {e}")
+            return
+        with self._lock:
+            if key in self._disk_index:
+                self._forget_disk_entry(key)
+            self._disk_index[key] = (key + extension, len(audio))
+            self._disk_bytes += len(audio)
+            self._evict_disk()
+
+    def _store_in_memory(self, key: str, entry: tuple[bytes, str]) -> None:
+        size = len(entry[0])
+        if size > self.memory_max_bytes:
+            return
+        with self._lock:
+            old_entry = self._memory.pop(key, None)
+            if old_entry is not None:
+                self._memory_bytes -= len(old_entry[0])
+            self._memory[key] = entry
+            self._memory_bytes += size
+            while self._memory_bytes > self.memory_max_bytes:
+                _, (evicted_audio, _) = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted_audio)
+
+    def _forget_disk_entry(self, key: str) -> tuple[str, int]:
+        """Remove the key from the disk index. Called with the lock held."""
+        file_name, size = self._disk_index.pop(key)
+        self._disk_bytes -= size
+        return file_name, size
+
+    def _evict_disk(self) -> None:
+        """
+        Remove the least recently used files until the directory fits in `disk_max_bytes`.
+        Called with the lock held.
+        """
+        while self._disk_bytes > self.disk_max_bytes and self._disk_index:
+            key = next(iter(self._disk_index))
+            file_name, _ = self._forget_disk_entry(key)
+            try:
+                os.remove(os.path.join(self.disk_dir, file_name))
+            except OSError as e:
+                logger.warning(f"Failed to remove TTS cache file {file_name}: {e}")
+
+    def _write_copy(self, audio: bytes, extension: str, file_name_no_ext=None) -> str:
+        """Write the cached audio to a new file in ./cache, which the caller may remove."""
+        if file_name_no_ext is None:
+            file_name_no_ext = str(uuid.uuid4())
+        path = self.generate_cache_file_name(file_name_no_ext, extension.lstrip("."))
+        with open(path, "wb") as audio_file:
+            audio_file.write(audio)
+        return path
@@ -1,4 +1,5 @@
 from typing import Type
+from loguru import logger
 from .tts_interface import TTSInterface
 
 
@@ -98,10 +99,50 @@ class TTSFactory:
                 latency=kwargs.get("latency"),
                 base_url=kwargs.get("base_url"),
             )
-            
+
+        elif engine_type == "fakeTTS":
+            from .fakeTTS import TTSEngine as FakeTTSEngine
+
+            return FakeTTSEngine(
+                latency_ms=kwargs.get("latency_ms", 150),
+                rtf=kwargs.get("rtf", 0.2),
+                sample_rate=kwargs.get("sample_rate", 24000),
+                chunk_ms=kwargs.get("chunk_ms", 250),
+            )
+
         else:
             raise ValueError(f"Unknown TTS engine type: {engine_type}")
 
+    @staticmethod
+    def get_cached_tts_engine(
+        engine_type, cache_config: dict | None = None, **kwargs
+    ) -> Type[TTSInterface]:
+        """
+        Same as `get_tts_engine`, but wrap the engine in a `CachedTTS`
+        if the TTS_CACHE section of the config is enabled.
+        Engines with random variants are only cached with CACHE_RANDOM_VARIANTS.
+        """
+        engine = TTSFactory.get_tts_engine(engine_type, **kwargs)
+        cache_config = cache_config or {}
+        if not cache_config.get("ENABLED", False):
+            return engine
+        if getattr(engine, "has_random_variants", False) and not cache_config.get(
+            "CACHE_RANDOM_VARIANTS", False
+        ):
+            logger.info(f"Not caching {engine_type}, its audio varies at random")
+            return engine
+
+        from .tts_cache import CachedTTS
+
+        return CachedTTS(
+            engine,
+            engine_name=engine_type,
+            engine_config=kwargs,
+            memory_max_bytes=int(cache_config.get("MEMORY_MAX_MB", 64) * 1024 * 1024),
+            disk_dir=cache_config.get("DISK_DIR", "./tts_cache"),
+            disk_max_bytes=int(cache_config.get("DISK_MAX_MB", 1024) * 1024 * 1024),
+        )
+
 
 # Example usage:
 # tts_engine = TTSFactory.get_tts_engine("azure", api_key="your_api_key", region="your_region", voice="your_voice")
@@ -1,10 +1,25 @@
 import abc
 import os
+import uuid
+from typing import Iterator
+import numpy as np
 from playsound3 import playsound
 
+from .audio_buffer import decode_audio_bytes
+
 
 class TTSInterface(metaclass=abc.ABCMeta):
 
+    # Whether `generate_audio` may be called from several threads at once.
+    # Engines that only wait on a remote server should set this to True so
+    # several sentences can be synthesized in parallel.
+    supports_concurrent_requests: bool = False
+
+    # Whether the same text and arguments may give different audio on purpose,
+    # e.g. a reference voice picked at random. The TTS cache would always replay
+    # the first result, so such engines are not cached unless TTS_CACHE asks for it.
+    has_random_variants: bool = False
+
     @abc.abstractmethod
     def generate_audio(self, text: str, file_name_no_ext=None) -> str:
         """
@@ -20,6 +35,67 @@ class TTSInterface(metaclass=abc.ABCMeta):
         """
         raise NotImplementedError
 
+    def generate_audio_bytes(self, text: str, **kwargs) -> bytes | None:
+        """
+        Generate speech audio using TTS and return the encoded audio file in memory.
+        The default implementation calls `generate_audio` and reads the file back.
+        Engines that receive the audio over the network should override it to skip the file.
+
+        text: str
+            the text to speak
+        **kwargs:
+            passed to `generate_audio`, e.g. `emotion`
+
+        Returns:
+        bytes | None: the content of the audio file, or None if the generation failed
+        """
+        audio_path = self.generate_audio(
+            text, file_name_no_ext=str(uuid.uuid4()), **kwargs
+        )
+        if not audio_path:
+            return None
+        try:
+            with open(audio_path, "rb") as audio_file:
+                return audio_file.read()
+        finally:
+            self.remove_file(audio_path, verbose=False)
+
+    def generate_pcm(self, text: str, **kwargs) -> tuple[np.ndarray, int] | None:
+        """
+        Generate speech audio using TTS and return it as a PCM buffer.
+
+        text: str
+            the text to speak
+        **kwargs:
+            passed to `generate_audio_bytes`, e.g. `emotion`
+
+        Returns:
+        tuple[np.ndarray, int] | None: int16 samples and the sample rate,
+        or None if the generation failed
+        """
+        audio = self.generate_audio_bytes(text, **kwargs)
+        if not audio:
+            return None
+        return decode_audio_bytes(audio)
+
+    def stream_pcm(self, text: str, **kwargs) -> Iterator[tuple[np.ndarray, int]]:
+        """
+        Generate speech audio using TTS and yield it in PCM chunks as it arrives.
+        The default implementation yields the whole sentence as one chunk.
+        Engines that receive the audio in pieces should override it.
+
+        text: str
+            the text to speak
+        **kwargs:
+            passed to `generate_pcm`, e.g. `emotion`
+
+        Yields:
+        tuple[np.ndarray, int]: int16 samples and the sample rate of the next chunk
+        """
+        audio = self.generate_pcm(text, **kwargs)
+        if audio is not None:
+            yield audio
+
     def remove_file(self, filepath: str, verbose: bool = True) -> None:
         """
         Remove a file from the file system.
@@ -47,7 +123,20 @@ class TTSInterface(metaclass=abc.ABCMeta):
             the path to the audio file
         """
         playsound(audio_file_path)
-        
+
+    def play_pcm_local(self, samples: np.ndarray, sample_rate: int) -> None:
+        """
+        Play a PCM buffer locally on this device, without writing it to a file.
+
+        samples: np.ndarray
+            the int16 or float32 samples
+        sample_rate: int
+            the sample rate of the samples
+        """
+        import sounddevice as sd
+
+        sd.play(samples, sample_rate)
+        sd.wait()
 
     def generate_cache_file_name(self, file_name_no_ext=None, file_extension="wav"):
         """
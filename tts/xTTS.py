@@ -4,6 +4,9 @@ from tts.tts_interface import TTSInterface
 
 
 class TTSEngine(TTSInterface):
+
+    supports_concurrent_requests = True
+
     def __init__(
         self,
         api_url: str = "http://127.0.0.1:8020/tts_to_audio",
@@ -17,8 +20,15 @@ class TTSEngine(TTSInterface):
         self.file_extension = "wav"
 
     def generate_audio(self, text, file_name_no_ext=None):
+        audio = self.generate_audio_bytes(text)
+        if audio is None:
+            return None
         file_name = self.generate_cache_file_name(file_name_no_ext, self.file_extension)
+        with open(file_name, "wb") as audio_file:
+            audio_file.write(audio)
+        return file_name
 
+    def generate_audio_bytes(self, text, **kwargs):
         # Prepare the data for the POST request
         data = {
             "text": text,
@@ -31,10 +41,7 @@ class TTSEngine(TTSInterface):
 
         # Check if the request was successful
         if response.status_code == 200:
-            # Save the audio content to a file
-            with open(file_name, "wb") as audio_file:
-                audio_file.write(response.content)
-            return file_name
+            return response.content
         else:
             # Handle errors or unsuccessful requests
             print(
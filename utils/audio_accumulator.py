@@ -0,0 +1,95 @@
+"""
+Accumulates the microphone audio of one utterance as it arrives over the WebSocket.
+"""
+
+import numpy as np
+from loguru import logger
+
+
+class AudioAccumulator:
+    """
+    A growable float32 buffer for the audio of one utterance.
+
+    Appends copy only the new samples. The buffer doubles when it is full,
+    so appends are amortized O(1). `take` hands the utterance to the ASR as a
+    view of the buffer, without copying it. Audio beyond `max_seconds` is discarded.
+    """
+
+    def __init__(
+        self,
+        max_seconds: float = 60.0,
+        sample_rate: int = 16000,
+        initial_seconds: float = 5.0,
+    ) -> None:
+        """
+        Parameters:
+            max_seconds (float): The maximum length of one utterance. 0 means no limit.
+            sample_rate (int): The sample rate of the audio.
+            initial_seconds (float): The length the buffer is first allocated for.
+        """
+        self.sample_rate = sample_rate
+        self.max_frames = int(max_seconds * sample_rate) if max_seconds else None
+        self._initial_frames = max(1, int(initial_seconds * sample_rate))
+        if self.max_frames:
+            self._initial_frames = min(self._initial_frames, self.max_frames)
+        self._buffer: np.ndarray | None = None
+        self._length = 0
+        self.truncated = False
+
+    def __len__(self) -> int:
+        return self._length
+
+    def append(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Add the next chunk of samples. Samples beyond `max_seconds` are discarded.
+
+        Returns:
+            np.ndarray: The samples that were kept.
+        """
+        samples = np.asarray(samples, dtype=np.float32).reshape(-1)
+        if self.max_frames is not None:
+            room = self.max_frames - self._length
+            if len(samples) > room:
+                if not self.truncated:
+                    logger.warning(
+                        f"Utterance is longer than {self.max_frames / self.sample_rate:.0f}s, "
+                        "discarding the rest of it."
+                    )
+                    self.truncated = True
+                samples = samples[:room]
+        if len(samples) == 0:
+            return samples
+
+        needed = self._length + len(samples)
+        if self._buffer is None or needed > len(self._buffer):
+            capacity = len(self._buffer) if self._buffer is not None else self._initial_frames
+            while capacity < needed:
+                capacity *= 2
+            if self.max_frames is not None:
+                capacity = min(capacity, self.max_frames)
+            buffer = np.empty(capacity, dtype=np.float32)
+            if self._buffer is not None:
+                buffer[: self._length] = self._buffer[: self._length]
+            self._buffer = buffer
+        self._buffer[self._length : needed] = samples
+        self._length = needed
+        return samples
+
+    def take(self) -> np.ndarray:
+        """
+        Return the utterance and start a new one.
+        The returned array is a view of the old buffer, which is not reused,
+        so it stays valid while the ASR is still reading it.
+        """
+        if self._buffer is None:
+            utterance = np.empty(0, dtype=np.float32)
+        else:
+            utterance = self._buffer[: self._length]
+        self.clear()
+        return utterance
+
+    def clear(self) -> None:
+        """Discard the current utterance."""
+        self._buffer = None
+        self._length = 0
+        self.truncated = False
@@ -0,0 +1,186 @@
+"""
+Latency metrics for the conversation pipeline.
+
+A small, dependency-free implementation of Prometheus histograms. The
+histograms below are observed by the pipeline stages and the server, and
+`render_metrics()` returns them in the Prometheus text exposition format for
+the `/metrics` endpoint of the WebSocket server.
+"""
+
+import asyncio
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Sequence
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+RATIO_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 5.0)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 200)
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Histogram:
+    """
+    A Prometheus style histogram with labels.
+    `observe` is thread-safe, so it can be called from the worker threads of the pipeline.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # label values -> [bucket counts..., sum, count]
+        self._series: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        """
+        Record one value.
+
+        Parameters:
+            value (float): The observed value.
+            **labels: A value for every label name of the histogram.
+        """
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [0] * len(self.buckets) + [0.0, 0]
+                self._series[key] = series
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the wall time spent in the `with` block, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list[str]:
+        """Return the lines of this histogram in the Prometheus text format."""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            series_items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in series_items:
+            labels = [
+                f'{name}="{_escape_label_value(value)}"'
+                for name, value in zip(self.label_names, key)
+            ]
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, series):
+                cumulative += bucket_count
+                bucket_labels = ",".join(labels + [f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            bucket_labels = ",".join(labels + ['le="+Inf"'])
+            lines.append(f"{self.name}_bucket{{{bucket_labels}}} {series[-1]}")
+            label_str = "{" + ",".join(labels) + "}" if labels else ""
+            lines.append(f"{self.name}_sum{label_str} {series[-2]}")
+            lines.append(f"{self.name}_count{label_str} {series[-1]}")
+        return lines
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+ASR_TRANSCRIBE_SECONDS = Histogram(
+    "vtuber_asr_transcribe_seconds",
+    "Time spent in ASR transcribe_np.",
+    ["asr_model"],
+)
+LLM_TIME_TO_FIRST_TOKEN_SECONDS = Histogram(
+    "vtuber_llm_time_to_first_token_seconds",
+    "Time from sending the prompt to the LLM until its first token.",
+    ["llm_provider"],
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    "vtuber_llm_tokens_per_second",
+    "LLM streaming speed after the first token, in tokens per second.",
+    ["llm_provider"],
+    buckets=RATE_BUCKETS,
+)
+SEGMENTER_WAIT_SECONDS = Histogram(
+    "vtuber_segmenter_wait_seconds",
+    "Time from the first token of a sentence until the sentence is complete.",
+)
+TTS_SENTENCE_SECONDS = Histogram(
+    "vtuber_tts_sentence_seconds",
+    "Time to synthesize one sentence.",
+    ["tts_model"],
+)
+TTS_REAL_TIME_FACTOR = Histogram(
+    "vtuber_tts_real_time_factor",
+    "Synthesis time divided by the duration of the synthesized audio.",
+    ["tts_model"],
+    buckets=RATIO_BUCKETS,
+)
+AUDIO_PAYLOAD_PREPARE_SECONDS = Histogram(
+    "vtuber_audio_payload_prepare_seconds",
+    "Time spent in AudioPayloadPreparer.prepare_audio_payload.",
+)
+WEBSOCKET_SEND_SECONDS = Histogram(
+    "vtuber_websocket_send_seconds",
+    "Time to send one audio payload to the client.",
+)
+TIME_TO_FIRST_AUDIO_SECONDS = Histogram(
+    "vtuber_time_to_first_audio_seconds",
+    "Time from sending the prompt to the LLM until the first audio of the reply is played.",
+    ["llm_provider", "tts_model"],
+)
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "vtuber_event_loop_lag_seconds",
+    "How much later than scheduled the event loop of the server wakes up a sleeping task.",
+    buckets=LAG_BUCKETS,
+)
+
+ALL_HISTOGRAMS = [
+    ASR_TRANSCRIBE_SECONDS,
+    LLM_TIME_TO_FIRST_TOKEN_SECONDS,
+    LLM_TOKENS_PER_SECOND,
+    SEGMENTER_WAIT_SECONDS,
+    TTS_SENTENCE_SECONDS,
+    TTS_REAL_TIME_FACTOR,
+    AUDIO_PAYLOAD_PREPARE_SECONDS,
+    WEBSOCKET_SEND_SECONDS,
+    TIME_TO_FIRST_AUDIO_SECONDS,
+    EVENT_LOOP_LAG_SECONDS,
+]
+
+
+def render_metrics() -> str:
+    """Return all histograms in the Prometheus text exposition format."""
+    lines = []
+    for histogram in ALL_HISTOGRAMS:
+        lines.extend(histogram.render())
+    return "\n".join(lines) + "\n"
+
+
+async def monitor_event_loop_lag(interval: float = 0.1) -> None:
+    """
+    Observe the lag of the running event loop every `interval` seconds, until cancelled.
+    Blocking calls in coroutines delay every session of the server and show up here.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - start - interval))
@@ -0,0 +1,437 @@
+"""
+Process-wide registry of the ASR and TTS models shared by all WebSocket sessions.
+
+Without it, every `/client-ws` connection builds its own `OpenLLMVTuberMain`,
+which loads its own copy of the models: a second browser tab doubles the RAM
+and waits for the models to load again.
+
+`ModelRegistry.acquire` returns a `SharedModel` handle for a model, keyed by
+the engine kind, the engine name and a hash of its configuration. Sessions that
+ask for the same model get the same instance, and a model is loaded only once
+even when several sessions ask for it at the same time (single-flight). Every
+handle counts its references. A model nobody uses stays resident within a
+memory budget (RESIDENT_MAX_MB), so switching back to a recent config profile
+does not reload it; beyond the budget the least recently used idle models are
+unloaded.
+
+A shared model runs at most `max_concurrency` inference calls at a time.
+Other sessions queue for it instead of loading a duplicate.
+"""
+
+import functools
+import gc
+import hashlib
+import inspect
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Iterator
+from loguru import logger
+
+from .startup import StartupTimer, warm_up_asr, warm_up_tts
+
+# The inference methods of the engines, which take a slot of the model.
+# Everything else, like `remove_file` or playing audio locally, is passed through.
+GUARDED_METHODS = {
+    "asr": {"transcribe_np", "transcribe_segments_np"},
+    "tts": {"generate_audio", "generate_audio_bytes", "generate_pcm", "stream_pcm"},
+}
+# Methods returning a session object whose methods run inference on the model
+SESSION_FACTORIES = {
+    "asr": {"create_streaming_session"},
+}
+
+
+def config_hash(config: Any) -> str:
+    """A stable hash of an engine configuration."""
+    source = json.dumps(config, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+
+
+class _SessionProxy:
+    """Takes a slot of the model for every call of a session object of the model."""
+
+    def __init__(self, session, slots: threading.BoundedSemaphore):
+        self._session = session
+        self._slots = slots
+
+    def __getattr__(self, name):
+        if name in ("_session", "_slots"):
+            raise AttributeError(name)
+        attribute = getattr(self._session, name)
+        if not callable(attribute) or name.startswith("_"):
+            return attribute
+        return _guard(attribute, self._slots)
+
+
+def _guard(method: Callable, slots: threading.BoundedSemaphore) -> Callable:
+    """Wrap the method so that it holds one of the slots while it runs."""
+    if inspect.isgeneratorfunction(method):
+
+        @functools.wraps(method)
+        def guarded_generator(*args, **kwargs) -> Iterator:
+            # a streaming synthesis keeps its slot until the stream is finished or closed
+            with slots:
+                yield from method(*args, **kwargs)
+
+        return guarded_generator
+
+    @functools.wraps(method)
+    def guarded(*args, **kwargs):
+        with slots:
+            return method(*args, **kwargs)
+
+    return guarded
+
+
+class SharedModel:
+    """
+    A handle to a model of the `ModelRegistry`. It can be used wherever the model is:
+    attribute access is delegated to the model, and its inference methods wait for
+    a free slot of the model first.
+    """
+
+    def __init__(self, registry: "ModelRegistry", key: tuple, model: Any, max_concurrency: int):
+        self.registry = registry
+        self.key = key
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.ref_count = 0
+        # the approximate memory of the model, see `ModelRegistry`
+        self.size_bytes = 0
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._guarded = GUARDED_METHODS.get(key[0], set())
+        self._session_factories = SESSION_FACTORIES.get(key[0], set())
+
+    def __getattr__(self, name):
+        if name in ("model", "_slots", "_guarded", "_session_factories"):
+            raise AttributeError(name)
+        attribute = getattr(self.model, name)
+        if name in self._guarded:
+            return _guard(attribute, self._slots)
+        if name in self._session_factories:
+            return lambda *args, **kwargs: _SessionProxy(
+                attribute(*args, **kwargs), self._slots
+            )
+        return attribute
+
+    def release(self) -> None:
+        """Give up this reference. The model is dropped when no session uses it any more."""
+        self.registry.release(self)
+
+
+def _rss_bytes() -> int | None:
+    """The resident memory of this process, or None if it cannot be measured."""
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm", "r") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class _Measurement:
+    """The memory growth of loads that overlap in time."""
+
+    def __init__(self, rss_before: int | None):
+        self.rss_before = rss_before
+        self.running = 0
+        self.loads: list[tuple[SharedModel, int]] = []
+
+
+class ModelRegistry:
+    """
+    Hands out shared, reference-counted models, loading each one only once.
+
+    A model nobody uses any more is kept resident while all resident models fit in
+    `max_resident_bytes`, so switching back to a recent configuration is instant.
+    Beyond that, the least recently used idle models are unloaded. The size of a
+    model is estimated by the growth of the process memory while it is loaded,
+    before it is warmed up. Models loading at the same time, like the ASR and the
+    TTS at startup, share the growth of their overlapping loads in proportion to
+    their own measurements, and are warmed up once all of them are loaded.
+    """
+
+    def __init__(self, max_resident_bytes: int = 0):
+        """
+        Parameters:
+            max_resident_bytes (int): The memory budget of all resident models.
+                0 unloads a model as soon as nobody uses it.
+        """
+        self.max_resident_bytes = max_resident_bytes
+        self._lock = threading.Lock()
+        # the loads overlapping in time, see `_begin_measure`
+        self._measurement: _Measurement | None = None
+        self._measured = threading.Condition(self._lock)
+        self._models: dict[tuple, SharedModel] = {}
+        # models without references, least recently used first
+        self._idle: OrderedDict[tuple, SharedModel] = OrderedDict()
+        self._loading: dict[tuple, Future] = {}
+
+    def acquire(
+        self,
+        kind: str,
+        name: str,
+        config: dict,
+        factory: Callable[[], Any],
+        max_concurrency: int | Callable[[Any], int] = 1,
+        warm_up: Callable[[Any], None] | None = None,
+    ) -> SharedModel:
+        """
+        Return a new reference to the model, loading it with `factory` if it is not resident.
+
+        Parameters:
+            kind (str): "asr" or "tts". Decides which methods are inference calls.
+            name (str): The ASR_MODEL or TTS_MODEL name.
+            config (dict): Everything the model is created from. Models with different
+                configurations are different models.
+            factory (Callable[[], Any]): Loads the model.
+            max_concurrency (int | Callable): How many inference calls may run at the same time,
+                or a function of the loaded model returning it.
+            warm_up (Callable, optional): Called with a newly loaded model, after its size
+                has been measured. The other sessions asking for it wait for the warm-up.
+
+        Returns:
+            SharedModel: The handle. Call `release` when the session is done with it.
+        """
+        key = (kind, name, config_hash(config))
+        with self._lock:
+            handle = self._models.get(key)
+            if handle is None and key in self._idle:
+                handle = self._idle.pop(key)
+                self._models[key] = handle
+                logger.info(f"Reusing resident {kind} model {name}")
+            if handle is not None:
+                handle.ref_count += 1
+                return handle
+            future = self._loading.get(key)
+            loader = future is None
+            if loader:
+                future = Future()
+                self._loading[key] = future
+
+        if not loader:
+            # someone else is loading the model, wait for it and take it like the others
+            future.result()
+            return self.acquire(kind, name, config, factory, max_concurrency, warm_up)
+
+        try:
+            logger.info(f"Loading shared {kind} model {name}")
+            measurement, rss_before = self._begin_measure()
+            try:
+                model = factory()
+            except BaseException:
+                self._end_measure(measurement, rss_before, None)
+                raise
+            if callable(max_concurrency):
+                max_concurrency = max_concurrency(model)
+            handle = SharedModel(self, key, model, max(1, int(max_concurrency)))
+            self._end_measure(measurement, rss_before, handle)
+            if warm_up is not None:
+                # the warm-up would be counted in the size of the models still loading
+                with self._lock:
+                    self._measured.wait_for(lambda: measurement.running == 0)
+                warm_up(model)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            handle.ref_count += 1
+            self._models[key] = handle
+            del self._loading[key]
+            evicted = self._take_evicted()
+        future.set_result(handle)
+        self._unload(evicted)
+        return handle
+
+    def _begin_measure(self) -> tuple["_Measurement", int | None]:
+        """Start measuring a load, joining the measurement of the loads still running."""
+        rss = _rss_bytes()
+        with self._lock:
+            if self._measurement is None:
+                self._measurement = _Measurement(rss)
+            measurement = self._measurement
+            measurement.running += 1
+        return measurement, rss
+
+    def _end_measure(
+        self, measurement: "_Measurement", rss_before: int | None, handle: SharedModel | None
+    ) -> None:
+        """
+        Finish measuring a load. `handle` is None if the load failed.
+        When the last of the overlapping loads finishes, the growth of the process memory
+        over all of them is split between the models in proportion to their own growth.
+        """
+        rss_after = _rss_bytes()
+        with self._lock:
+            measurement.running -= 1
+            if handle is not None and rss_before is not None and rss_after is not None:
+                growth = max(0, rss_after - rss_before)
+                handle.size_bytes = growth
+                measurement.loads.append((handle, growth))
+            if measurement.running > 0:
+                return
+            self._measurement = None
+            self._measured.notify_all()
+            if measurement.rss_before is None or rss_after is None or not measurement.loads:
+                return
+            total = max(0, rss_after - measurement.rss_before)
+            measured = sum(growth for _, growth in measurement.loads)
+            for loaded, growth in measurement.loads:
+                loaded.size_bytes = (
+                    total * growth // measured if measured else total // len(measurement.loads)
+                )
+
+    def release(self, handle: SharedModel) -> None:
+        """Drop one reference of the handle. Without references the model becomes idle."""
+        with self._lock:
+            if handle.ref_count <= 0:
+                return
+            handle.ref_count -= 1
+            if handle.ref_count > 0 or self._models.get(handle.key) is not handle:
+                return
+            del self._models[handle.key]
+            self._idle[handle.key] = handle
+            evicted = self._take_evicted()
+        self._unload(evicted)
+
+    def models(self) -> list[SharedModel]:
+        """The resident models, in use or idle."""
+        with self._lock:
+            return list(self._models.values()) + list(self._idle.values())
+
+    @property
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return self._resident_bytes()
+
+    def _resident_bytes(self) -> int:
+        return sum(handle.size_bytes for handle in self._models.values()) + sum(
+            handle.size_bytes for handle in self._idle.values()
+        )
+
+    def _take_evicted(self) -> list[SharedModel]:
+        """
+        Remove the least recently used idle models until the resident models fit in the budget.
+        Models in use are never evicted. Called with the lock held.
+        """
+        evicted = []
+        resident = self._resident_bytes()
+        while self._idle and (
+            self.max_resident_bytes <= 0 or resident > self.max_resident_bytes
+        ):
+            _, handle = self._idle.popitem(last=False)
+            resident -= handle.size_bytes
+            evicted.append(handle)
+        return evicted
+
+    def _unload(self, handles: list[SharedModel]) -> None:
+        if not handles:
+            return
+        while handles:
+            handle = handles.pop()
+            # e.g. stop the worker thread of an ASR batcher, which keeps the model alive
+            close = getattr(handle.model, "close", None)
+            if callable(close):
+                close()
+            logger.info(
+                f"Unloaded shared {handle.key[0]} model {handle.key[1]}"
+                f" (~{handle.size_bytes / 1024 / 1024:.0f} MB)"
+            )
+        # models of torch and onnxruntime often sit in reference cycles
+        gc.collect()
+
+
+registry = ModelRegistry()
+
+
+def _configure(config: dict) -> None:
+    registry.max_resident_bytes = int(
+        config.get("MODEL_REGISTRY", {}).get("RESIDENT_MAX_MB", 0) * 1024 * 1024
+    )
+
+
+def acquire_asr(config: dict, timer: StartupTimer | None = None) -> SharedModel:
+    """
+    Acquire the ASR_MODEL of the config from the process-wide registry.
+    With ASR_BATCHING, the utterances of concurrent sessions are decoded in batches,
+    so as many sessions as fit in a batch may call the model at the same time.
+    A newly loaded model is warmed up if WARM_UP is enabled.
+    """
+    from asr.asr_batcher import BatchedASR
+    from asr.asr_factory import ASRFactory
+
+    _configure(config)
+    asr_model = config.get("ASR_MODEL")
+    asr_config = config.get(asr_model, {})
+    batching_config = config.get("ASR_BATCHING", {})
+    max_concurrency = config.get("MODEL_REGISTRY", {}).get("ASR_MAX_CONCURRENCY", 1)
+
+    steps = timer or StartupTimer()
+
+    def load():
+        with steps.measure("ASR load"):
+            return BatchedASR.from_config(
+                ASRFactory.get_asr_system(asr_model, **asr_config), batching_config
+            )
+
+    def warm_up(asr):
+        with steps.measure("ASR warm-up"):
+            warm_up_asr(asr, asr.SAMPLE_RATE)
+
+    return registry.acquire(
+        "asr",
+        asr_model,
+        {"engine": asr_config, "batching": batching_config},
+        load,
+        max_concurrency=lambda asr: (
+            asr.max_batch if isinstance(asr, BatchedASR) else max_concurrency
+        ),
+        warm_up=warm_up if config.get("WARM_UP", {}).get("ENABLED", True) else None,
+    )
+
+
+def acquire_tts(config: dict, timer: StartupTimer | None = None) -> SharedModel:
+    """
+    Acquire the TTS_MODEL of the config from the process-wide registry.
+    Engines without `supports_concurrent_requests` synthesize one sentence at a time.
+    A newly loaded engine is warmed up if WARM_UP is enabled.
+    """
+    from tts.tts_factory import TTSFactory
+
+    _configure(config)
+    tts_model = config.get("TTS_MODEL", "pyttsx3TTS")
+    tts_config = config.get(tts_model, {})
+    cache_config = config.get("TTS_CACHE")
+    max_concurrency = config.get("MODEL_REGISTRY", {}).get("TTS_MAX_CONCURRENCY", 4)
+    warm_up_config = config.get("WARM_UP", {})
+
+    steps = timer or StartupTimer()
+
+    def load():
+        with steps.measure("TTS load"):
+            return TTSFactory.get_cached_tts_engine(tts_model, cache_config, **tts_config)
+
+    def warm_up(tts):
+        with steps.measure("TTS warm-up"):
+            warm_up_tts(tts, warm_up_config.get("TTS_TEXT", "Hello."))
+
+    return registry.acquire(
+        "tts",
+        tts_model,
+        {"engine": tts_config, "cache": cache_config},
+        load,
+        max_concurrency=lambda engine: (
+            max_concurrency if getattr(engine, "supports_concurrent_requests", False) else 1
+        ),
+        warm_up=warm_up if warm_up_config.get("ENABLED", True) else None,
+    )
@@ -0,0 +1,119 @@
+"""
+Recording of the messages a client sends to /client-ws, for replaying them later.
+
+With SESSION_RECORDING enabled, every session writes the messages it receives to
+a JSON lines file in the recording directory, one message per line:
+
+    {"t": 1.25, "text": "{\"type\": \"text-input\", \"text\": \"Hi\"}"}
+    {"t": 3.5, "bytes": "<base64 of a binary frame>"}
+
+`t` is the time in seconds since the session was accepted. The messages are
+stored as they were sent, so a replay (see benchmarks/ws_load.py) sends the
+server exactly the same text input, mic audio, interrupts and config switches.
+"""
+
+import base64
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from loguru import logger
+
+# Tells the writer thread to finish
+_CLOSE = object()
+
+
+class SessionRecorder:
+    """
+    Writes the messages of one WebSocket session to a JSON lines file.
+    `record` only queues the message; a writer thread encodes and writes it,
+    so the event loop never waits for the disk.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Parameters:
+            path (str): The file to write. Its directory is created if needed.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._file = open(path, "w", encoding="utf-8")
+        self._started = time.perf_counter()
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        # set when the writer thread has stopped, then nothing is queued any more
+        self._stopped = threading.Event()
+        self._writer = threading.Thread(
+            target=self._write_entries, name="session-recorder", daemon=True
+        )
+        self._writer.start()
+
+    @classmethod
+    def from_config(cls, config: dict) -> "SessionRecorder | None":
+        """A recorder as configured in the SESSION_RECORDING section, or None if it is off."""
+        recording_config = config.get("SESSION_RECORDING", {}) or {}
+        if not recording_config.get("ENABLED", False):
+            return None
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.jsonl"
+        path = os.path.join(recording_config.get("DIR", "./recordings"), name)
+        logger.info(f"Recording the session to {path}")
+        return cls(path)
+
+    def record(self, message: dict) -> None:
+        """
+        Record one message as returned by `WebSocket.receive`.
+        Disconnect messages are not recorded.
+        """
+        if self._stopped.is_set():
+            return
+        if message.get("bytes") is None and message.get("text") is None:
+            return
+        self._queue.put((time.perf_counter() - self._started, message))
+
+    def close(self) -> None:
+        """Write the messages still queued and close the file. Blocks until they are written."""
+        self._queue.put(_CLOSE)
+        self._writer.join()
+
+    def _write_entries(self) -> None:
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _CLOSE:
+                    return
+                elapsed, message = item
+                entry = {"t": round(elapsed, 4)}
+                if message.get("bytes") is not None:
+                    entry["bytes"] = base64.b64encode(message["bytes"]).decode("ascii")
+                else:
+                    entry["text"] = message["text"]
+                self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                # flush once the queue is drained, so the recording survives a crash of the server
+                if self._queue.empty():
+                    self._file.flush()
+        except Exception as e:
+            logger.error(f"Failed to write the session recording {self.path}: {e}")
+        finally:
+            self._stopped.set()
+            self._file.close()
+
+
+def load_session(path: str) -> list[dict]:
+    """
+    Read a recorded session.
+
+    Returns:
+        list[dict]: The messages in order, each with the time `t` and either `text`
+        or the decoded `bytes`.
+    """
+    messages = []
+    with open(path, "r", encoding="utf-8") as recording:
+        for line in recording:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if "bytes" in entry:
+                entry["bytes"] = base64.b64decode(entry["bytes"])
+            messages.append(entry)
+    return messages
@@ -0,0 +1,73 @@
+"""
+Startup of the models: timing of every step and a synthetic warm-up inference.
+
+The first inference of most models pays for lazy initialization, JIT
+compilation and graph optimization. Running one on silent audio (ASR) or a
+short phrase (TTS) right after loading moves that cost from the first user
+request to startup.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+import numpy as np
+from loguru import logger
+
+
+class StartupTimer:
+    """Records how long each startup step took. Steps may run in parallel threads."""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.finished: float | None = None
+        self._lock = threading.Lock()
+        self.timings: dict[str, float] = {}
+
+    @contextmanager
+    def measure(self, step: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.timings[step] = time.perf_counter() - start
+
+    def finish(self) -> float:
+        """Mark startup as done and return its total wall-clock time."""
+        self.finished = time.perf_counter()
+        return self.finished - self.started
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            timings = dict(self.timings)
+        total = (self.finished or time.perf_counter()) - self.started
+        return {"total_seconds": round(total, 3), "steps": {k: round(v, 3) for k, v in timings.items()}}
+
+    def log_report(self, title: str = "Startup") -> None:
+        """Log the time of every step. Parallel steps add up to more than the total."""
+        report = self.to_dict()
+        lines = [f"{title} took {report['total_seconds']:.2f}s"]
+        for step, seconds in sorted(report["steps"].items(), key=lambda item: -item[1]):
+            lines.append(f"  {step:<24} {seconds:8.2f}s")
+        logger.info("\n".join(lines))
+
+
+def warm_up_asr(asr: Any, sample_rate: int = 16000) -> None:
+    """Transcribe one second of silence."""
+    try:
+        asr.transcribe_np(np.zeros(sample_rate, dtype=np.float32))
+    except Exception as e:
+        # some models return no result at all for silence
+        logger.warning(f"ASR warm-up failed: {e}")
+
+
+def warm_up_tts(tts: Any, text: str) -> None:
+    """Synthesize a short phrase with the engine, bypassing the TTS cache."""
+    from tts.tts_cache import CachedTTS
+
+    engine = tts.engine if isinstance(tts, CachedTTS) else tts
+    try:
+        engine.generate_pcm(text)
+    except Exception as e:
+        logger.warning(f"TTS warm-up failed: {e}")
@@ -0,0 +1,180 @@
+"""
+Binary frame protocol of /client-ws.
+
+The JSON protocol sends microphone audio as objects of floats keyed "0", "1", ...
+and TTS audio as base64 WAV inside JSON, which inflates the traffic and costs a
+lot of parsing. Clients that send `{"type": "hello", "binary_audio": 1}` use
+binary WebSocket messages for audio instead. Every other message stays JSON
+text, and clients that never send the hello keep the JSON protocol.
+
+A binary message is one frame:
+
+    offset  size  field
+    0       2     magic b"LV"
+    2       1     protocol version (1)
+    3       1     frame kind
+    4       4     length of the JSON header, little-endian uint32
+    8       4     length of the payload, little-endian uint32
+    12      ...   JSON header (UTF-8), then the payload
+
+Frame kinds:
+- MIC_INT16 / MIC_FLOAT32 (client -> server): little-endian mono PCM.
+  Header: {"sample_rate": 16000}. The sample rate defaults to 16000.
+- MIC_OPUS (client -> server): one Opus packet. Header: {"sample_rate": 16000}.
+  Decoding needs the optional `opuslib` package.
+- AUDIO (server -> client): a WAV file. The header is the JSON audio payload
+  without its "audio" field (volumes, slice_length, text, expressions).
+"""
+
+import json
+import struct
+from enum import IntEnum
+import numpy as np
+
+PROTOCOL_VERSION = 1
+MAGIC = b"LV"
+ASR_SAMPLE_RATE = 16000
+
+_FRAME_HEADER = struct.Struct("<2sBBII")
+
+
+class FrameKind(IntEnum):
+    MIC_INT16 = 1
+    MIC_FLOAT32 = 2
+    MIC_OPUS = 3
+    AUDIO = 16
+
+
+class ProtocolError(ValueError):
+    """A binary message that is not a valid frame."""
+
+
+def encode_frame(kind: FrameKind, header: dict | None, payload: bytes = b"") -> bytes:
+    """Build one binary frame."""
+    header_bytes = (
+        json.dumps(header, ensure_ascii=False).encode("utf-8") if header else b""
+    )
+    return b"".join(
+        (
+            _FRAME_HEADER.pack(
+                MAGIC, PROTOCOL_VERSION, kind, len(header_bytes), len(payload)
+            ),
+            header_bytes,
+            payload,
+        )
+    )
+
+
+def decode_frame(message: bytes) -> tuple[FrameKind, dict, memoryview]:
+    """
+    Split a binary message into its kind, JSON header and payload.
+    The payload is a view of `message`, it is not copied.
+
+    Raises:
+        ProtocolError: If the message is not a frame of a supported version.
+    """
+    if len(message) < _FRAME_HEADER.size:
+        raise ProtocolError("The frame is shorter than its header.")
+    magic, version, kind, header_length, payload_length = _FRAME_HEADER.unpack_from(
+        message
+    )
+    if magic != MAGIC:
+        raise ProtocolError("The frame does not start with the protocol magic.")
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"Unsupported protocol version {version}.")
+    try:
+        kind = FrameKind(kind)
+    except ValueError:
+        raise ProtocolError(f"Unknown frame kind {kind}.") from None
+    header_end = _FRAME_HEADER.size + header_length
+    if header_end + payload_length != len(message):
+        raise ProtocolError("The frame length does not match its header.")
+    view = memoryview(message)
+    header = {}
+    if header_length:
+        try:
+            header = json.loads(bytes(view[_FRAME_HEADER.size : header_end]).decode("utf-8"))
+        except (ValueError, UnicodeDecodeError):
+            raise ProtocolError("The frame header is not valid UTF-8 JSON.") from None
+        if not isinstance(header, dict):
+            raise ProtocolError("The frame header is not a JSON object.")
+    return kind, header, view[header_end:]
+
+
+def encode_audio_frame(payload: dict) -> bytes:
+    """
+    Turn the JSON audio payload of `AudioPayloadPreparer` into an AUDIO frame.
+    `payload["audio"]` must hold the raw WAV bytes, not base64.
+    """
+    header = {key: value for key, value in payload.items() if key != "audio"}
+    return encode_frame(FrameKind.AUDIO, header, payload["audio"])
+
+
+def decode_json_audio(audio) -> np.ndarray:
+    """
+    Decode the "audio" field of a JSON mic-audio-data message.
+    A Float32Array passed to JSON.stringify becomes an object keyed "0", "1", ...
+    """
+    if isinstance(audio, dict):
+        return np.fromiter(audio.values(), dtype=np.float32, count=len(audio))
+    return np.asarray(audio, dtype=np.float32)
+
+
+class MicAudioDecoder:
+    """
+    Decode the microphone frames of one connection into float32 samples in [-1, 1]
+    at the sample rate of the ASR.
+    """
+
+    def __init__(self, target_sample_rate: int = ASR_SAMPLE_RATE) -> None:
+        self.target_sample_rate = target_sample_rate
+        self._opus_decoder = None
+
+    def decode(self, kind: FrameKind, header: dict, payload: memoryview) -> np.ndarray:
+        """
+        Raises:
+            ProtocolError: If the frame is not a microphone frame or cannot be decoded.
+        """
+        sample_rate = header.get("sample_rate", ASR_SAMPLE_RATE)
+        if isinstance(sample_rate, bool) or not isinstance(sample_rate, int) or sample_rate <= 0:
+            raise ProtocolError(f"Invalid sample rate {sample_rate!r}.")
+        if kind == FrameKind.MIC_INT16:
+            if len(payload) % 2:
+                raise ProtocolError("Int16 payload has an odd length.")
+            samples = np.frombuffer(payload, dtype="<i2").astype(np.float32) / 32768.0
+        elif kind == FrameKind.MIC_FLOAT32:
+            if len(payload) % 4:
+                raise ProtocolError("Float32 payload length is not a multiple of 4.")
+            samples = np.frombuffer(payload, dtype="<f4").astype(np.float32)
+        elif kind == FrameKind.MIC_OPUS:
+            samples = self._decode_opus(bytes(payload), header)
+            sample_rate = self.target_sample_rate
+        else:
+            raise ProtocolError(f"{kind.name} is not a microphone frame.")
+        return self._resample(samples, sample_rate)
+
+    def _decode_opus(self, packet: bytes, header: dict) -> np.ndarray:
+        if self._opus_decoder is None:
+            try:
+                import opuslib
+            except ImportError:
+                raise ProtocolError(
+                    "Opus microphone audio needs the opuslib package."
+                ) from None
+            self._opus_decoder = opuslib.Decoder(self.target_sample_rate, 1)
+        # 120 ms is the longest Opus frame
+        max_frames = self.target_sample_rate * 120 // 1000
+        try:
+            pcm = self._opus_decoder.decode(packet, max_frames)
+        except Exception as e:
+            raise ProtocolError(f"Failed to decode Opus packet: {e}") from e
+        return np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+
+    def _resample(self, samples: np.ndarray, sample_rate: int) -> np.ndarray:
+        if sample_rate == self.target_sample_rate or len(samples) == 0:
+            return samples
+        frames = int(round(len(samples) * self.target_sample_rate / sample_rate))
+        positions = np.arange(frames) * (sample_rate / self.target_sample_rate)
+        return np.interp(positions, np.arange(len(samples)), samples).astype(
+            np.float32
+        )